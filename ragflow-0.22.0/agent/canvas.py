@@ -16,9 +16,10 @@
 import base64
 import json
 import logging
+import os
 import re
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from copy import deepcopy
 from functools import partial
 from typing import Any, Union, Tuple
@@ -32,6 +33,8 @@ from common.exceptions import TaskCanceledException
 from rag.prompts.generator import chunks_format
 from rag.utils.redis_conn import REDIS_CONN
 
+CANVAS_MAX_WORKERS = int(os.environ.get("CANVAS_MAX_WORKERS", 5))
+
 class Graph:
     """
         dsl = {
@@ -239,6 +242,7 @@ class Canvas(Graph):
             "sys.conversation_turns": 0,
             "sys.files": []
         }
+        self._executor = None
         super().__init__(dsl, tenant_id, task_id)
 
     def load(self):
@@ -284,6 +288,12 @@ class Canvas(Graph):
                 else:
                     self.globals[k] = None
 
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Kept for the lifetime of the canvas, so that runs don't pay for a new pool per step.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=CANVAS_MAX_WORKERS, thread_name_prefix="canvas")
+        return self._executor
+
     def run(self, **kwargs):
         st = time.perf_counter()
         self.message_id = get_uuid()
@@ -333,32 +343,6 @@ class Canvas(Graph):
         yield decorate("workflow_started", {"inputs": kwargs.get("inputs")})
         self.retrieval.append({"chunks": {}, "doc_aggs": {}})
 
-        def _run_batch(f, t):
-            if self.is_canceled():
-                msg = f"Task {self.task_id} has been canceled during batch execution."
-                logging.info(msg)
-                raise TaskCanceledException(msg)
-
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                thr = []
-                i = f
-                while i < t:
-                    cpn = self.get_component_obj(self.path[i])
-                    if cpn.component_name.lower() in ["begin", "userfillup"]:
-                        thr.append(executor.submit(cpn.invoke, inputs=kwargs.get("inputs", {})))
-                        i += 1
-                    else:
-                        for _, ele in cpn.get_input_elements().items():
-                            if isinstance(ele, dict) and ele.get("_cpn_id") and ele.get("_cpn_id") not in self.path[:i] and self.path[0].lower().find("userfillup") < 0:
-                                self.path.pop(i)
-                                t -= 1
-                                break
-                        else:
-                            thr.append(executor.submit(cpn.invoke, **cpn.get_input()))
-                            i += 1
-                for t in thr:
-                    t.result()
-
         def _node_finished(cpn_obj):
             return decorate("node_finished",{
                            "inputs": cpn_obj.get_input_values(),
@@ -374,120 +358,192 @@ class Canvas(Graph):
         self.error = ""
         idx = len(self.path) - 1
         partials = []
-        while idx < len(self.path):
-            to = len(self.path)
-            for i in range(idx, to):
-                yield decorate("node_started", {
-                    "inputs": None, "created_at": int(time.time()),
-                    "component_id": self.path[i],
-                    "component_name": self.get_component_name(self.path[i]),
-                    "component_type": self.get_component_type(self.path[i]),
-                    "thoughts": self.get_component_thoughts(self.path[i])
-                })
-            _run_batch(idx, to)
-            to = len(self.path)
-            # post processing of components invocation
-            for i in range(idx, to):
-                cpn = self.get_component(self.path[i])
+        # Positions of self.path from idx on: "running", "finished" or "dropped" once started.
+        state = {}
+        running = {}
+        waiting = []
+        seen = idx
+        referred = {}
+        failed_at = None
+        fill_up = False
+
+        def _waiting():
+            nonlocal seen
+            waiting.extend(range(seen, len(self.path)))
+            seen = len(self.path)
+            return waiting
+
+        def _referred_cpn_ids(i):
+            if i not in referred:
                 cpn_obj = self.get_component_obj(self.path[i])
-                if cpn_obj.component_name.lower() == "message":
-                    if isinstance(cpn_obj.output("content"), partial):
-                        _m = ""
-                        for m in cpn_obj.output("content")():
-                            if not m:
-                                continue
-                            if m == "<think>":
-                                yield decorate("message", {"content": "", "start_to_think": True})
-                            elif m == "</think>":
-                                yield decorate("message", {"content": "", "end_to_think": True})
-                            else:
-                                yield decorate("message", {"content": m})
-                                _m += m
-                        cpn_obj.set_output("content", _m)
-                        cite = re.search(r"\[ID:[ 0-9]+\]", _m)
-                    else:
-                        yield decorate("message", {"content": cpn_obj.output("content")})
-                        cite = re.search(r"\[ID:[ 0-9]+\]",  cpn_obj.output("content"))
-                    yield decorate("message_end", {"reference": self.get_reference() if cite else None})
-
-                    while partials:
-                        _cpn_obj = self.get_component_obj(partials[0])
-                        if isinstance(_cpn_obj.output("content"), partial):
-                            break
-                        yield _node_finished(_cpn_obj)
-                        partials.pop(0)
-
-                other_branch = False
-                if cpn_obj.error():
-                    ex = cpn_obj.exception_handler()
-                    if ex and ex["goto"]:
-                        self.path.extend(ex["goto"])
-                        other_branch = True
-                    elif ex and ex["default_value"]:
-                        yield decorate("message", {"content": ex["default_value"]})
-                        yield decorate("message_end", {})
-                    else:
-                        self.error = cpn_obj.error()
+                referred[i] = set([ele["_cpn_id"] for ele in cpn_obj.get_input_elements().values() if isinstance(ele, dict) and ele.get("_cpn_id")])
+            return referred[i]
+
+        def _is_ready(i):
+            cpn_id = self.path[i]
+            deps = set(self.get_component(cpn_id).get("upstream", [])) | {cpn_id}
+            if self.get_component_obj(cpn_id).component_name.lower() not in ["begin", "userfillup"]:
+                deps |= _referred_cpn_ids(i)
+            return not any([j < i and self.path[j] in deps for j in waiting + list(running.values())])
+
+        def _is_dropped(i):
+            if self.path[0].lower().find("userfillup") >= 0:
+                return False
+            executed = set([self.path[j] for j in range(i) if state.get(j) != "dropped"])
+            return any([c not in executed for c in _referred_cpn_ids(i)])
+
+        def _start_ready():
+            nonlocal fill_up
+            if self.is_canceled():
+                msg = f"Task {self.task_id} has been canceled during canvas execution."
+                logging.info(msg)
+                raise TaskCanceledException(msg)
+            if self.error:
+                return
+            if any([i > idx and self.get_component_obj(self.path[i]).component_name.lower() == "userfillup" for i in _waiting()]):
+                fill_up = True
+            if fill_up:
+                return
 
-                if cpn_obj.component_name.lower() != "iteration":
-                    if isinstance(cpn_obj.output("content"), partial):
-                        if self.error:
-                            cpn_obj.set_output("content", None)
-                            yield _node_finished(cpn_obj)
-                        else:
-                            partials.append(self.path[i])
+            started = True
+            while started:
+                started = False
+                for i in list(waiting):
+                    if not _is_ready(i):
+                        continue
+                    waiting.remove(i)
+                    started = True
+                    cpn = self.get_component_obj(self.path[i])
+                    if cpn.component_name.lower() in ["begin", "userfillup"]:
+                        fut = self._get_executor().submit(cpn.invoke, inputs=kwargs.get("inputs", {}))
+                    elif _is_dropped(i):
+                        state[i] = "dropped"
+                        continue
                     else:
-                        yield _node_finished(cpn_obj)
-
-                def _append_path(cpn_id):
-                    nonlocal other_branch
-                    if other_branch:
-                        return
-                    if self.path[-1] == cpn_id:
-                        return
-                    self.path.append(cpn_id)
-
-                def _extend_path(cpn_ids):
-                    nonlocal other_branch
-                    if other_branch:
-                        return
-                    for cpn_id in cpn_ids:
-                        _append_path(cpn_id)
-
-                if cpn_obj.component_name.lower() == "iterationitem" and cpn_obj.end():
-                    iter = cpn_obj.get_parent()
-                    yield _node_finished(iter)
-                    _extend_path(self.get_component(cpn["parent_id"])["downstream"])
-                elif cpn_obj.component_name.lower() in ["categorize", "switch"]:
-                    _extend_path(cpn_obj.output("_next"))
-                elif cpn_obj.component_name.lower() == "iteration":
-                    _append_path(cpn_obj.get_start())
-                elif not cpn["downstream"] and cpn_obj.get_parent():
-                    _append_path(cpn_obj.get_parent().get_start())
+                        fut = self._get_executor().submit(cpn.invoke, **cpn.get_input())
+                    yield decorate("node_started", {
+                        "inputs": None, "created_at": int(time.time()),
+                        "component_id": self.path[i],
+                        "component_name": self.get_component_name(self.path[i]),
+                        "component_type": self.get_component_type(self.path[i]),
+                        "thoughts": self.get_component_thoughts(self.path[i])
+                    })
+                    state[i] = "running"
+                    running[fut] = i
+
+        def _append_path(cpn_id):
+            if self.path[-1] == cpn_id:
+                return
+            # Several finished upstreams lead to the same component: it runs once they are all done.
+            if any([self.path[j] == cpn_id for j in _waiting()]):
+                return
+            self.path.append(cpn_id)
+
+        def _post_process(i):
+            nonlocal failed_at
+            cpn = self.get_component(self.path[i])
+            cpn_obj = self.get_component_obj(self.path[i])
+            if cpn_obj.component_name.lower() == "message":
+                if isinstance(cpn_obj.output("content"), partial):
+                    _m = ""
+                    for m in cpn_obj.output("content")():
+                        if not m:
+                            continue
+                        if m == "<think>":
+                            yield decorate("message", {"content": "", "start_to_think": True})
+                        elif m == "</think>":
+                            yield decorate("message", {"content": "", "end_to_think": True})
+                        else:
+                            yield decorate("message", {"content": m})
+                            _m += m
+                    cpn_obj.set_output("content", _m)
+                    cite = re.search(r"\[ID:[ 0-9]+\]", _m)
+                else:
+                    yield decorate("message", {"content": cpn_obj.output("content")})
+                    cite = re.search(r"\[ID:[ 0-9]+\]",  cpn_obj.output("content"))
+                yield decorate("message_end", {"reference": self.get_reference() if cite else None})
+
+                while partials:
+                    _cpn_obj = self.get_component_obj(partials[0])
+                    if isinstance(_cpn_obj.output("content"), partial):
+                        break
+                    yield _node_finished(_cpn_obj)
+                    partials.pop(0)
+
+            other_branch = False
+            if cpn_obj.error():
+                ex = cpn_obj.exception_handler()
+                if ex and ex["goto"]:
+                    self.path.extend(ex["goto"])
+                    other_branch = True
+                elif ex and ex["default_value"]:
+                    yield decorate("message", {"content": ex["default_value"]})
+                    yield decorate("message_end", {})
                 else:
-                    _extend_path(cpn["downstream"])
+                    self.error = cpn_obj.error()
+                    failed_at = i if failed_at is None else min(failed_at, i)
 
-            if self.error:
-                logging.error(f"Runtime Error: {self.error}")
-                break
-            idx = to
-
-            if any([self.get_component_obj(c).component_name.lower() == "userfillup" for c in self.path[idx:]]):
-                path = [c for c in self.path[idx:] if self.get_component(c)["obj"].component_name.lower() == "userfillup"]
-                path.extend([c for c in self.path[idx:] if self.get_component(c)["obj"].component_name.lower() != "userfillup"])
-                another_inputs = {}
-                tips = ""
-                for c in path:
-                    o = self.get_component_obj(c)
-                    if o.component_name.lower() == "userfillup":
-                        o.invoke()
-                        another_inputs.update(o.get_input_elements())
-                        if o.get_param("enable_tips"):
-                            tips = o.output("tips")
-                self.path = path
-                yield decorate("user_inputs", {"inputs": another_inputs, "tips": tips})
-                return
-        self.path = self.path[:idx]
+            if cpn_obj.component_name.lower() != "iteration":
+                if isinstance(cpn_obj.output("content"), partial):
+                    if self.error:
+                        cpn_obj.set_output("content", None)
+                        yield _node_finished(cpn_obj)
+                    else:
+                        partials.append(self.path[i])
+                else:
+                    yield _node_finished(cpn_obj)
+
+            def _extend_path(cpn_ids):
+                if other_branch:
+                    return
+                for cpn_id in cpn_ids:
+                    _append_path(cpn_id)
+
+            if cpn_obj.component_name.lower() == "iterationitem" and cpn_obj.end():
+                iter = cpn_obj.get_parent()
+                yield _node_finished(iter)
+                _extend_path(self.get_component(cpn["parent_id"])["downstream"])
+            elif cpn_obj.component_name.lower() in ["categorize", "switch"]:
+                _extend_path(cpn_obj.output("_next"))
+            elif cpn_obj.component_name.lower() == "iteration":
+                _extend_path([cpn_obj.get_start()])
+            elif not cpn["downstream"] and cpn_obj.get_parent():
+                _extend_path([cpn_obj.get_parent().get_start()])
+            else:
+                _extend_path(cpn["downstream"])
+
+        # A component starts as soon as the components it depends on, earlier in the path, are done,
+        # instead of waiting for every component of the previous step.
+        yield from _start_ready()
+        while running:
+            done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+            for fut in sorted(done, key=lambda f: running[f]):
+                i = running.pop(fut)
+                fut.result()
+                state[i] = "finished"
+                yield from _post_process(i)
+            yield from _start_ready()
+
+        if self.error:
+            logging.error(f"Runtime Error: {self.error}")
+        elif fill_up:
+            pending = [self.path[i] for i in _waiting()]
+            path = [c for c in pending if self.get_component(c)["obj"].component_name.lower() == "userfillup"]
+            path.extend([c for c in pending if self.get_component(c)["obj"].component_name.lower() != "userfillup"])
+            another_inputs = {}
+            tips = ""
+            for c in path:
+                o = self.get_component_obj(c)
+                if o.component_name.lower() == "userfillup":
+                    o.invoke()
+                    another_inputs.update(o.get_input_elements())
+                    if o.get_param("enable_tips"):
+                        tips = o.output("tips")
+            self.path = path
+            yield decorate("user_inputs", {"inputs": another_inputs, "tips": tips})
+            return
+        end = len(self.path) if failed_at is None else failed_at
+        self.path = self.path[:idx] + [self.path[i] for i in range(idx, end) if state.get(i) == "finished"]
         if not self.error:
             yield decorate("workflow_finished",
                        {
@@ -561,25 +617,29 @@ class Canvas(Graph):
             threads.append(exe.submit(FileService.parse, file["name"], FileService.get_blob(file["created_by"], file["id"]), True, file["created_by"]))
         return [th.result() for th in threads]
 
-    def tool_use_callback(self, agent_id: str, func_name: str, params: dict, result: Any, elapsed_time=None):
+    def tool_use_callback(self, agent_id: str, func_name: str, params: dict, result: Any, elapsed_time=None, cached=False):
         agent_ids = agent_id.split("-->")
         agent_name = self.get_component_name(agent_ids[0])
         path = agent_name if len(agent_ids) < 2 else agent_name+"-->"+"-->".join(agent_ids[1:])
+        trace = {"path": path, "tool_name": func_name, "arguments": params, "result": result, "elapsed_time": elapsed_time}
+        if cached:
+            # The result of an earlier identical call of the tool.
+            trace["cached"] = True
         try:
             bin = REDIS_CONN.get(f"{self.task_id}-{self.message_id}-logs")
             if bin:
                 obj = json.loads(bin.encode("utf-8"))
                 if obj[-1]["component_id"] == agent_ids[0]:
-                    obj[-1]["trace"].append({"path": path, "tool_name": func_name, "arguments": params, "result": result, "elapsed_time": elapsed_time})
+                    obj[-1]["trace"].append(trace)
                 else:
                     obj.append({
                     "component_id": agent_ids[0],
-                    "trace": [{"path": path, "tool_name": func_name, "arguments": params, "result": result, "elapsed_time": elapsed_time}]
+                    "trace": [trace]
                 })
             else:
                 obj = [{
                     "component_id": agent_ids[0],
-                    "trace": [{"path": path, "tool_name": func_name, "arguments": params, "result": result, "elapsed_time": elapsed_time}]
+                    "trace": [trace]
                 }]
             REDIS_CONN.set_obj(f"{self.task_id}-{self.message_id}-logs", obj, 60*10)
         except Exception as e:
@@ -13,9 +13,11 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
+import json
 import logging
 import os
 import re
+import threading
 from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from functools import partial
@@ -83,9 +85,13 @@ class Agent(LLM, ToolBase):
     def __init__(self, canvas, id, param: LLMParam):
         LLM.__init__(self, canvas, id, param)
         self.tools = {}
+        # Tools whose calls are deduplicated within an invocation.
+        self.idempotent_tools = set()
         for cpn in self._param.tools:
             cpn = self._load_tool_obj(cpn)
             self.tools[cpn.get_meta()["function"]["name"]] = cpn
+            if getattr(cpn, "idempotent", False):
+                self.idempotent_tools.add(cpn.get_meta()["function"]["name"])
 
         self.chat_mdl = LLMBundle(self._canvas.get_tenant_id(), TenantLLMService.llm_id2llm_type(self._param.llm_id), self._param.llm_id,
                                   max_retries=self._param.max_retries,
@@ -101,6 +107,9 @@ class Agent(LLM, ToolBase):
             for tnm, meta in mcp["tools"].items():
                 self.tool_meta.append(mcp_tool_metadata_to_openai_tool(meta))
                 self.tools[tnm] = tool_call_session
+                annotations = meta.get("annotations") or {}
+                if annotations.get("readOnlyHint") or annotations.get("idempotentHint"):
+                    self.idempotent_tools.add(tnm)
         self.callback = partial(self._canvas.tool_use_callback, id)
         self.toolcall_session = LLMToolPluginCallSession(self.tools, self.callback)
         #self.chat_mdl.bind_tools(self.toolcall_session, self.tool_metas)
@@ -295,45 +304,94 @@ class Agent(LLM, ToolBase):
             else:
                 hist.append({"role": "user", "content": content})
 
-        st = timer()
-        task_desc = analyze_task(self.chat_mdl, prompt, user_request, tool_metas, user_defined_prompt)
-        self.callback("analyze_task", {}, task_desc, elapsed_time=timer()-st)
-        for _ in range(self._param.max_rounds + 1):
-            if self.check_if_canceled("Agent streaming"):
-                return
-            response, tk = next_step(self.chat_mdl, hist, tool_metas, task_desc, user_defined_prompt)
-            # self.callback("next_step", {}, str(response)[:256]+"...")
-            token_count += tk
-            hist.append({"role": "assistant", "content": response})
-            try:
-                functions = json_repair.loads(re.sub(r"```.*", "", response))
-                if not isinstance(functions, list):
-                    raise TypeError(f"List should be returned, but `{functions}`")
-                for f in functions:
-                    if not isinstance(f, dict):
-                        raise TypeError(f"An object type should be returned, but `{f}`")
-                with ThreadPoolExecutor(max_workers=5) as executor:
+        def tool_failed(name, tool_response):
+            tool = self.toolcall_session.get_tool_obj(name)
+            if isinstance(tool, MCPToolCallSession):
+                return isinstance(tool_response, str) and re.match(r"(Error|Timeout) calling tool|Error: Session is closed", tool_response) is not None
+            return bool(tool.error())
+
+        # One executor for all the rounds, and the successful calls of idempotent tools made so far
+        # by (name, canonical arguments): a repeated call gets the future of the first one.
+        executor = ThreadPoolExecutor(max_workers=5)
+        tool_calls = {}
+        tool_calls_lock = threading.Lock()
+
+        def call_tool(name, args):
+            if name not in self.idempotent_tools:
+                return executor.submit(use_tool, name, args), False
+            key = (name, json.dumps(args, sort_keys=True, ensure_ascii=False, default=str))
+
+            def use_tool_once():
+                # Failures (timeouts, network errors...) are forgotten before the future is done,
+                # so that the same call made again is actually retried.
+                def forget():
+                    with tool_calls_lock:
+                        tool_calls.pop(key, None)
+
+                try:
+                    name_, tool_response = use_tool(name, args)
+                except Exception:
+                    forget()
+                    raise
+                if tool_failed(name, tool_response):
+                    forget()
+                return name_, tool_response
+
+            with tool_calls_lock:
+                if key in tool_calls:
+                    return tool_calls[key], True
+                tool_calls[key] = executor.submit(use_tool_once)
+                return tool_calls[key], False
+
+        try:
+            st = timer()
+            task_desc = analyze_task(self.chat_mdl, prompt, user_request, tool_metas, user_defined_prompt)
+            self.callback("analyze_task", {}, task_desc, elapsed_time=timer()-st)
+            for _ in range(self._param.max_rounds + 1):
+                if self.check_if_canceled("Agent streaming"):
+                    return
+                response, tk = next_step(self.chat_mdl, hist, tool_metas, task_desc, user_defined_prompt)
+                # self.callback("next_step", {}, str(response)[:256]+"...")
+                token_count += tk
+                hist.append({"role": "assistant", "content": response})
+                try:
+                    functions = json_repair.loads(re.sub(r"```.*", "", response))
+                    if not isinstance(functions, list):
+                        raise TypeError(f"List should be returned, but `{functions}`")
+                    for f in functions:
+                        if not isinstance(f, dict):
+                            raise TypeError(f"An object type should be returned, but `{f}`")
                     thr = []
                     for func in functions:
                         name = func["name"]
                         args = func["arguments"]
                         if name == COMPLETE_TASK:
+                            executor.shutdown()
                             append_user_content(hist, f"Respond with a formal answer. FORGET(DO NOT mention) about `{COMPLETE_TASK}`. The language for the response MUST be as the same as the first user request.\n")
                             for txt, tkcnt in complete():
                                 yield txt, tkcnt
                             return
 
-                        thr.append(executor.submit(use_tool, name, args))
+                        thr.append((name, args, *call_tool(name, args)))
+
+                    results = []
+                    for name, args, th, cached in thr:
+                        results.append(th.result())
+                        if cached:
+                            use_tools.append({"name": name, "arguments": args, "results": results[-1][1]})
+                            self.callback(name, args, results[-1][1], elapsed_time=0, cached=True)
 
                     st = timer()
-                    reflection = reflect(self.chat_mdl, hist, [th.result() for th in thr], user_defined_prompt)
+                    reflection = reflect(self.chat_mdl, hist, results, user_defined_prompt)
                     append_user_content(hist, reflection)
                     self.callback("reflection", {}, str(reflection), elapsed_time=timer()-st)
 
-            except Exception as e:
-                logging.exception(msg=f"Wrong JSON argument format in LLM ReAct response: {e}")
-                e = f"\nTool call error, please correct the input parameter of response format and call it again.\n *** Exception ***\n{e}"
-                append_user_content(hist, str(e))
+                except Exception as e:
+                    logging.exception(msg=f"Wrong JSON argument format in LLM ReAct response: {e}")
+                    e = f"\nTool call error, please correct the input parameter of response format and call it again.\n *** Exception ***\n{e}"
+                    append_user_content(hist, str(e))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
         logging.warning( f"Exceed max rounds: {self._param.max_rounds}")
         final_instruction = f"""
@@ -60,6 +60,7 @@ class ArXivParam(ToolParamBase):
 
 class ArXiv(ToolBase, ABC):
     component_name = "ArXiv"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 12)))
     def _invoke(self, **kwargs):
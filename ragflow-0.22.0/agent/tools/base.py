@@ -113,6 +113,9 @@ class ToolParamBase(ComponentParamBase):
 
 
 class ToolBase(ComponentBase):
+    # Same arguments, same result: an agent may reuse the result of an earlier identical call.
+    idempotent = False
+
     def __init__(self, canvas, id, param: ComponentParamBase):
         from agent.canvas import Canvas  # Local import to avoid cyclic dependency
         assert isinstance(canvas, Canvas), "canvas must be an instance of Canvas"
@@ -36,6 +36,7 @@ class CrawlerParam(ToolParamBase):
 
 class Crawler(ToolBase, ABC):
     component_name = "Crawler"
+    idempotent = True
 
     def _run(self, history, **kwargs):
         from api.utils.web_utils import is_valid_url
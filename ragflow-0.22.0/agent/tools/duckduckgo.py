@@ -72,6 +72,7 @@ class DuckDuckGoParam(ToolParamBase):
 
 class DuckDuckGo(ToolBase, ABC):
     component_name = "DuckDuckGo"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 12)))
     def _invoke(self, **kwargs):
@@ -56,6 +56,7 @@ class GitHubParam(ToolParamBase):
 
 class GitHub(ToolBase, ABC):
     component_name = "GitHub"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 12)))
     def _invoke(self, **kwargs):
@@ -115,6 +115,7 @@ class GoogleParam(ToolParamBase):
 
 class Google(ToolBase, ABC):
     component_name = "Google"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 12)))
     def _invoke(self, **kwargs):
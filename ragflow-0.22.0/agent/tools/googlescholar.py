@@ -62,6 +62,7 @@ class GoogleScholarParam(ToolParamBase):
 
 class GoogleScholar(ToolBase, ABC):
     component_name = "GoogleScholar"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 12)))
     def _invoke(self, **kwargs):
@@ -68,6 +68,7 @@ In addition to MEDLINE, PubMed provides access to:
 
 class PubMed(ToolBase, ABC):
     component_name = "PubMed"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 12)))
     def _invoke(self, **kwargs):
@@ -79,6 +79,7 @@ class RetrievalParam(ToolParamBase):
 
 class Retrieval(ToolBase, ABC):
     component_name = "Retrieval"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 12)))
     def _invoke(self, **kwargs):
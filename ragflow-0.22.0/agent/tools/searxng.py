@@ -76,6 +76,7 @@ class SearXNGParam(ToolParamBase):
 
 class SearXNG(ToolBase, ABC):
     component_name = "SearXNG"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 12)))
     def _invoke(self, **kwargs):
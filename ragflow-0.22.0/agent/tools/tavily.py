@@ -100,6 +100,7 @@ When searching:
 
 class TavilySearch(ToolBase, ABC):
     component_name = "TavilySearch"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 12)))
     def _invoke(self, **kwargs):
@@ -210,6 +211,7 @@ class TavilyExtractParam(ToolParamBase):
 
 class TavilyExtract(ToolBase, ABC):
     component_name = "TavilyExtract"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 10*60)))
     def _invoke(self, **kwargs):
@@ -67,6 +67,7 @@ fund selection platform: through AI technology, is committed to providing excell
 
 class WenCai(ToolBase, ABC):
     component_name = "WenCai"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 12)))
     def _invoke(self, **kwargs):
@@ -63,6 +63,7 @@ class WikipediaParam(ToolParamBase):
 
 class Wikipedia(ToolBase, ABC):
     component_name = "Wikipedia"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 60)))
     def _invoke(self, **kwargs):
@@ -71,6 +71,7 @@ class YahooFinanceParam(ToolParamBase):
 
 class YahooFinance(ToolBase, ABC):
     component_name = "YahooFinance"
+    idempotent = True
 
     @timeout(int(os.environ.get("COMPONENT_EXEC_TIMEOUT", 60)))
     def _invoke(self, **kwargs):
@@ -43,6 +43,7 @@ import time
 
 from api.utils.file_utils import filename_type, read_potential_broken_pdf
 from rag.flow.pipeline import Pipeline
+from rag.flow.pipeline_log import fold_logs, pipeline_log_key
 from rag.nlp import search
 from rag.utils.redis_conn import REDIS_CONN
 from common import settings
@@ -548,6 +549,10 @@ def trace():
     cvs_id = request.args.get("canvas_id")
     msg_id = request.args.get("message_id")
     try:
+        events = REDIS_CONN.lrange_obj(pipeline_log_key(cvs_id, msg_id))
+        if events:
+            return get_json_result(data=fold_logs(events))
+
         binary = REDIS_CONN.get(f"{cvs_id}-{msg_id}-logs")
         if not binary:
             return get_json_result(data={})
@@ -31,6 +31,7 @@ from api.utils.api_utils import get_data_error_result, get_json_result, server_e
 from rag.app.qa import beAdoc, rmPrefix
 from rag.app.tag import label_question
 from rag.nlp import rag_tokenizer, search
+from rag.nlp.tag_feature import bump_tag_kb_version
 from rag.prompts.generator import gen_meta_filter, cross_languages, keyword_extraction
 from common.string_utils import remove_redundant_spaces
 from common.constants import RetCode, LLMType, ParserType, PAGERANK_FLD
@@ -170,6 +171,8 @@ def set():
         v = 0.1 * v[0] + 0.9 * v[1] if doc.parser_id != ParserType.QA else v[1]
         d["q_%d_vec" % len(v)] = v.tolist()
         settings.docStoreConn.update({"id": req["chunk_id"]}, d, search.index_name(tenant_id), doc.kb_id)
+        if doc.parser_id == ParserType.TAG:
+            bump_tag_kb_version(doc.kb_id)
         return get_json_result(data=True)
     except Exception as e:
         return server_error_response(e)
@@ -211,6 +214,8 @@ def rm():
         deleted_chunk_ids = req["chunk_ids"]
         chunk_number = len(deleted_chunk_ids)
         DocumentService.decrement_chunk_num(doc.id, doc.kb_id, 1, chunk_number, 0)
+        if doc.parser_id == ParserType.TAG:
+            bump_tag_kb_version(doc.kb_id)
         for cid in deleted_chunk_ids:
             if settings.STORAGE_IMPL.obj_exist(doc.kb_id, cid):
                 settings.STORAGE_IMPL.rm(doc.kb_id, cid)
@@ -272,6 +277,8 @@ def create():
 
         DocumentService.increment_chunk_num(
             doc.id, doc.kb_id, c, 1, 0)
+        if doc.parser_id == ParserType.TAG:
+            bump_tag_kb_version(doc.kb_id)
         return get_json_result(data={"chunk_id": chunck_id})
     except Exception as e:
         return server_error_response(e)
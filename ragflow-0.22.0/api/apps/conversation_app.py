@@ -27,6 +27,7 @@ from api.db.services.search_service import SearchService
 from api.db.services.tenant_llm_service import TenantLLMService
 from api.db.services.user_service import TenantService, UserTenantService
 from api.utils.api_utils import get_data_error_result, get_json_result, server_error_response, validate_request
+from api.utils.stream_utils import sse_answers, stream_mode_of
 from rag.prompts.template import load_prompt
 from rag.prompts.generator import chunks_format
 from common.constants import RetCode, LLMType
@@ -81,7 +82,10 @@ def set_conversation():
 def get():
     conv_id = request.args["conversation_id"]
     try:
-        e, conv = ConversationService.get_by_id(conv_id)
+        # Optional paging of long conversations: messages offset to offset + limit and their references.
+        offset = int(request.args.get("offset", 0))
+        limit = int(request.args.get("limit", 0))
+        e, conv, message_total = ConversationService.get_page(conv_id, offset, limit or None)
         if not e:
             return get_data_error_result(message="Conversation not found!")
         tenants = UserTenantService.query(user_id=current_user.id)
@@ -101,6 +105,7 @@ def get():
 
         conv = conv.to_dict()
         conv["avatar"] = avatar
+        conv["message_total"] = message_total
         return get_json_result(data=conv)
     except Exception as e:
         return server_error_response(e)
@@ -219,9 +224,9 @@ def completion():
         def stream():
             nonlocal dia, msg, req, conv
             try:
-                for ans in chat(dia, msg, True, **req):
-                    ans = structure_answer(conv, ans, message_id, conv.id)
-                    yield "data:" + json.dumps({"code": 0, "message": "", "data": ans}, ensure_ascii=False) + "\n\n"
+                yield from sse_answers(chat(dia, msg, True, **req),
+                                       lambda ans: structure_answer(conv, ans, message_id, conv.id),
+                                       stream_mode_of(req), message_id, conv.id)
                 if not is_embedded:
                     ConversationService.update_by_id(conv.id, conv.to_dict())
             except Exception as e:
@@ -17,6 +17,7 @@ import datetime
 import logging
 import pathlib
 import re
+import time
 from io import BytesIO
 
 import xxhash
@@ -45,6 +46,8 @@ from common.constants import RetCode, LLMType, ParserType, TaskStatus, FileSourc
 from common import settings
 
 MAXIMUM_OF_UPLOADING_FILES = 256
+MAXIMUM_STATUS_WAIT = 30
+STATUS_POLL_INTERVAL = 0.5
 
 
 class Chunk(BaseModel):
@@ -583,6 +586,99 @@ def list_docs(dataset_id, tenant_id):
 
     return get_result(data={"total": total, "docs": output_docs})
 
+@manager.route("/datasets/<dataset_id>/documents/status", methods=["POST"])  # noqa: F821
+@token_required
+def docs_status(dataset_id, tenant_id):
+    """
+    Get the parsing status of documents in one query.
+    ---
+    tags:
+      - Documents
+    security:
+      - ApiKeyAuth: []
+    parameters:
+      - in: path
+        name: dataset_id
+        type: string
+        required: true
+        description: ID of the dataset.
+      - in: header
+        name: Authorization
+        type: string
+        required: true
+        description: Bearer token for authentication.
+      - in: body
+        name: body
+        description: Documents to report on.
+        required: true
+        schema:
+          type: object
+          properties:
+            ids:
+              type: array
+              items:
+                type: string
+              description: IDs of the documents.
+            wait:
+              type: number
+              description: Seconds (up to 30) to wait for a document to change, unless one is already done. 0 returns at once.
+    responses:
+      200:
+        description: Status of the documents found in the dataset.
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id:
+                type: string
+                description: Document ID.
+              run:
+                type: string
+                description: Processing status.
+              progress:
+                type: number
+                description: Parsing progress.
+              chunk_count:
+                type: integer
+                description: Number of chunks.
+              token_count:
+                type: integer
+                description: Number of tokens.
+    """
+    if not KnowledgebaseService.accessible(kb_id=dataset_id, user_id=tenant_id):
+        return get_error_data_result(message=f"You don't own the dataset {dataset_id}. ")
+    req = request.json or {}
+    doc_ids = req.get("ids")
+    if not doc_ids or not isinstance(doc_ids, list):
+        return get_error_data_result(message="`ids` is required and must be a list.")
+    try:
+        wait = min(max(float(req.get("wait", 0)), 0), MAXIMUM_STATUS_WAIT)
+    except (TypeError, ValueError):
+        return get_error_data_result(message="`wait` must be a number.")
+
+    def finished(d):
+        return str(d["run"]) in [TaskStatus.DONE.value, TaskStatus.FAIL.value, TaskStatus.CANCEL.value] or (d["progress"] or 0) >= 1
+
+    docs = DocumentService.get_status(dataset_id, doc_ids)
+    deadline = time.monotonic() + wait
+    while not any([finished(d) for d in docs]) and time.monotonic() + STATUS_POLL_INTERVAL < deadline:
+        time.sleep(STATUS_POLL_INTERVAL)
+        latest = DocumentService.get_status(dataset_id, doc_ids)
+        if latest != docs:
+            docs = latest
+            break
+
+    run_status_numeric_to_text = {"0": "UNSTART", "1": "RUNNING", "2": "CANCEL", "3": "DONE", "4": "FAIL"}
+    return get_result(data=[{
+        "id": d["id"],
+        "run": run_status_numeric_to_text.get(str(d["run"]), d["run"]),
+        "progress": d["progress"],
+        "chunk_count": d["chunk_num"],
+        "token_count": d["token_num"],
+    } for d in docs])
+
+
 @manager.route("/datasets/<dataset_id>/documents", methods=["DELETE"])  # noqa: F821
 @token_required
 def delete(tenant_id, dataset_id):
@@ -880,11 +880,28 @@ class Conversation(DataBaseModel):
     message = JSONField(null=True)
     reference = JSONField(null=True, default=[])
     user_id = CharField(max_length=255, null=True, help_text="user_id", index=True)
+    message_in_json = BooleanField(null=False, default=False, help_text="messages that can't be moved to conversation_message", index=True)
 
     class Meta:
         db_table = "conversation"
 
 
+class ConversationMessage(DataBaseModel):
+    conv_id = CharField(max_length=32, null=False, index=True)
+    seq = IntegerField(null=False, help_text="position of the message in the conversation")
+    role = CharField(max_length=16, null=False, default="")
+    content = LongTextField(null=True)
+    extra = JSONField(null=True, default={}, help_text="other message fields: id, thumbup, feedback...")
+    ref_index = IntegerField(null=True, help_text="position of `reference` in the conversation references")
+    reference = JSONField(null=True, default={})
+    created_at = FloatField(null=True)
+    digest = CharField(max_length=32, null=False, help_text="md5 of the row, only changed rows are rewritten")
+
+    class Meta:
+        db_table = "conversation_message"
+        primary_key = CompositeKey("conv_id", "seq")
+
+
 class APIToken(DataBaseModel):
     tenant_id = CharField(max_length=32, null=False, index=True)
     token = CharField(max_length=255, null=False, index=True)
@@ -1112,6 +1129,29 @@ class SyncLogs(DataBaseModel):
         db_table = "sync_logs"
 
 
+class ConnectorDocDigest(DataBaseModel):
+    id = CharField(max_length=32, primary_key=True, help_text="md5 of connector_id, kb_id and the source document id")
+    connector_id = CharField(max_length=32, null=False, index=True)
+    kb_id = CharField(max_length=32, null=False, index=True)
+    doc_id = CharField(max_length=32, null=False, help_text="document id", index=True)
+    digest = CharField(max_length=64, null=False, help_text="sha256 of the synchronized content", index=False)
+
+    class Meta:
+        db_table = "connector_doc_digest"
+
+
+class ParseCache(DataBaseModel):
+    id = CharField(max_length=64, primary_key=True, help_text="sha256 of the file digest, parser and parsing related settings")
+    tenant_id = CharField(max_length=32, null=False, index=True)
+    parser_id = CharField(max_length=32, null=False, help_text="default parser ID", index=True)
+    file_digest = CharField(max_length=64, null=False, help_text="sha256 of the file content", index=True)
+    chunk_num = IntegerField(default=0, index=False)
+    size = BigIntegerField(default=0, help_text="bytes of the cached chunks in object storage", index=False)
+
+    class Meta:
+        db_table = "parse_cache"
+
+
 def migrate_db():
     logging.disable(logging.ERROR)
     migrator = DatabaseMigrator[settings.DATABASE_TYPE.upper()].value(DB)
@@ -1292,4 +1332,8 @@ def migrate_db():
         migrate(migrator.add_column("llm_factories", "rank", IntegerField(default=0, index=False)))
     except Exception:
         pass
+    try:
+        migrate(migrator.add_column("conversation", "message_in_json", BooleanField(null=False, default=False, help_text="messages that can't be moved to conversation_message", index=True)))
+    except Exception:
+        pass
     logging.disable(logging.NOTSET)
@@ -24,6 +24,7 @@ from api.db import UserTenantRole
 from api.db.db_models import init_database_tables as init_web_db, LLMFactories, LLM, TenantLLM
 from api.db.services import UserService
 from api.db.services.canvas_service import CanvasTemplateService
+from api.db.services.conversation_service import ConversationService
 from api.db.services.document_service import DocumentService
 from api.db.services.knowledgebase_service import KnowledgebaseService
 from api.db.services.tenant_llm_service import LLMFactoriesService, TenantLLMService
@@ -166,6 +167,10 @@ def init_web_data():
     #    init_superuser()
 
     add_graph_templates()
+    try:
+        ConversationService.split_message_blobs()
+    except Exception:
+        logging.exception("Split conversation messages error: ")
     logging.info("init web data success:{}".format(time.time() - start_time))
 
 
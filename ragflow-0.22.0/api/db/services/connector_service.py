@@ -13,6 +13,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
+import hashlib
 import logging
 from datetime import datetime
 from typing import Tuple, List
@@ -21,7 +22,7 @@ from anthropic import BaseModel
 from peewee import SQL, fn
 
 from api.db import InputType
-from api.db.db_models import Connector, SyncLogs, Connector2Kb, Knowledgebase
+from api.db.db_models import DB, Connector, SyncLogs, Connector2Kb, ConnectorDocDigest, Document, Knowledgebase
 from api.db.services.common_service import CommonService
 from api.db.services.document_service import DocumentService
 from api.db.services.file_service import FileService
@@ -72,6 +73,7 @@ class ConnectorService(CommonService):
         if not e:
             return
         SyncLogsService.filter_delete([SyncLogs.connector_id==connector_id, SyncLogs.kb_id==kb_id])
+        ConnectorDocDigestService.filter_delete([ConnectorDocDigest.connector_id==connector_id, ConnectorDocDigest.kb_id==kb_id])
         docs = DocumentService.query(source_type=f"{conn.source}/{conn.id}", kb_id=kb_id)
         err = FileService.delete_docs([d.id for d in docs], tenant_id)
         SyncLogsService.schedule(connector_id, kb_id, reindex=True)
@@ -224,6 +226,51 @@ class SyncLogsService(CommonService):
         ).order_by(cls.model.update_time.desc()).first()
 
 
+class ConnectorDocDigestService(CommonService):
+    """Content-hash index of synchronized documents.
+
+    A source document whose content digest is unchanged since its last
+    synchronization, and whose RAGFlow document still exists, is skipped
+    instead of being uploaded and parsed again.
+    """
+    model = ConnectorDocDigest
+
+    @staticmethod
+    def digest_key(connector_id, kb_id, source_doc_id):
+        return hashlib.md5(f"{connector_id}:{kb_id}:{source_doc_id}".encode("utf-8")).hexdigest()
+
+    @classmethod
+    @DB.connection_context()
+    def filter_changed(cls, connector_id, kb_id, docs):
+        """Return the docs (dicts with `id` and `digest`) that are new or changed."""
+        if not docs:
+            return []
+        keys = {cls.digest_key(connector_id, kb_id, d["id"]): d for d in docs}
+        rows = cls.model.select(cls.model.id, cls.model.digest)\
+            .join(Document, on=(cls.model.doc_id == Document.id))\
+            .where(cls.model.id.in_(list(keys.keys())))
+        unchanged = set([r.id for r in rows if r.digest == keys[r.id]["digest"]])
+        return [d for k, d in keys.items() if k not in unchanged]
+
+    @classmethod
+    @DB.connection_context()
+    def record(cls, connector_id, kb_id, docs, doc_ids):
+        rows = []
+        for d, doc_id in zip(docs, doc_ids):
+            rows.append({
+                "id": cls.digest_key(connector_id, kb_id, d["id"]),
+                "connector_id": connector_id,
+                "kb_id": kb_id,
+                "doc_id": doc_id,
+                "digest": d["digest"]
+            })
+        if not rows:
+            return
+        with DB.atomic():
+            cls.model.delete().where(cls.model.id.in_([r["id"] for r in rows])).execute()
+            cls.insert_many(rows)
+
+
 class Connector2KbService(CommonService):
     model = Connector2Kb
 
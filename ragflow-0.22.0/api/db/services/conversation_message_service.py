@@ -0,0 +1,144 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import hashlib
+import json
+
+from api.db.db_models import DB, ConversationMessage
+from api.db.services.common_service import CommonService
+
+# Value of Conversation.message once its messages live in the conversation_message table.
+MESSAGE_TABLE = {"stored_in": "conversation_message"}
+_MESSAGE_FIELDS = ("role", "content", "created_at")
+
+
+def is_stored_in_table(message) -> bool:
+    return isinstance(message, dict) and message.get("stored_in") == MESSAGE_TABLE["stored_in"]
+
+
+class ConversationMessageService(CommonService):
+    """
+    One row per message of a conversation, so that a turn appends a couple of rows instead
+    of rewriting the whole message and reference JSON of the conversation.
+
+    The i-th reference of a conversation belongs to its i-th answer after the opening
+    prologue, which is the order `completion` appends them in, and is stored on that row.
+    """
+    model = ConversationMessage
+
+    @staticmethod
+    def to_rows(conv_id, messages, references):
+        """The rows of a conversation, or None if its references can't be paired with its answers."""
+        if not isinstance(messages, list) or not isinstance(references, list):
+            return None
+        if any([not isinstance(m, dict) for m in messages]) or any([r is None for r in references]):
+            return None
+        rows, k = [], 0
+        for seq, m in enumerate(messages):
+            ref_index = None
+            if seq > 0 and m.get("role") == "assistant" and k < len(references):
+                ref_index, k = k, k + 1
+            row = {
+                "conv_id": conv_id,
+                "seq": seq,
+                "role": m.get("role", ""),
+                "content": m.get("content"),
+                "extra": {f: v for f, v in m.items() if f not in _MESSAGE_FIELDS},
+                "ref_index": ref_index,
+                "reference": references[ref_index] if ref_index is not None else {},
+                "created_at": m.get("created_at"),
+            }
+            row["digest"] = hashlib.md5(json.dumps(row, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+            rows.append(row)
+        if k < len(references):
+            return None
+        return rows
+
+    @staticmethod
+    def to_message(row: dict) -> dict:
+        m = {"role": row["role"], "content": row["content"]}
+        if row["created_at"] is not None:
+            m["created_at"] = row["created_at"]
+        m.update(row["extra"] or {})
+        return m
+
+    @staticmethod
+    def slice_messages(messages, references, offset=0, limit=None):
+        """Messages `offset` to `offset + limit` of a conversation kept as JSON and their references."""
+        def is_answer(seq, m):
+            return seq > 0 and isinstance(m, dict) and m.get("role") == "assistant"
+
+        k = len([m for seq, m in enumerate(messages[:offset]) if is_answer(seq, m)])
+        page = messages[offset:offset + limit] if limit else messages[offset:]
+        n = len([m for seq, m in enumerate(page, offset) if is_answer(seq, m)])
+        return page, references[k:k + n]
+
+    @classmethod
+    @DB.connection_context()
+    def save_messages(cls, conv_id, messages, references) -> bool:
+        """
+        Store the messages and references of a conversation, only writing the rows that changed.
+        Returns False, writing nothing, when the conversation has to keep its JSON columns.
+        """
+        rows = cls.to_rows(conv_id, messages, references)
+        if rows is None:
+            return False
+        stored = {r["seq"]: r["digest"] for r in
+                  cls.model.select(cls.model.seq, cls.model.digest).where(cls.model.conv_id == conv_id).dicts()}
+        changed = [r for r in rows if stored.get(r["seq"]) != r["digest"]]
+        with DB.atomic():
+            stale = [r["seq"] for r in changed if r["seq"] in stored]
+            cls.model.delete().where((cls.model.conv_id == conv_id) & (
+                (cls.model.seq >= len(rows)) | (cls.model.seq.in_(stale or [-1])))).execute()
+            if changed:
+                cls.insert_many(changed)
+        return True
+
+    @classmethod
+    @DB.connection_context()
+    def get_messages(cls, conv_id, offset=0, limit=None):
+        """Messages `offset` to `offset + limit` of a conversation and their references."""
+        rows = cls.model.select().where(cls.model.conv_id == conv_id).order_by(cls.model.seq)
+        if offset:
+            rows = rows.offset(offset)
+        if limit:
+            rows = rows.limit(limit)
+        rows = list(rows.dicts())
+        return [cls.to_message(r) for r in rows], [r["reference"] for r in rows if r["ref_index"] is not None]
+
+    @classmethod
+    @DB.connection_context()
+    def count_messages(cls, conv_id) -> int:
+        return cls.model.select().where(cls.model.conv_id == conv_id).count()
+
+    @classmethod
+    @DB.connection_context()
+    def get_conversations(cls, conv_ids) -> dict:
+        """conv_id -> (messages, references) for several conversations, in one query."""
+        res = {cid: ([], []) for cid in conv_ids}
+        if not conv_ids:
+            return res
+        rows = cls.model.select().where(cls.model.conv_id.in_(list(conv_ids))).order_by(cls.model.conv_id, cls.model.seq)
+        for r in rows.dicts():
+            messages, references = res[r["conv_id"]]
+            messages.append(cls.to_message(r))
+            if r["ref_index"] is not None:
+                references.append(r["reference"])
+        return res
+
+    @classmethod
+    @DB.connection_context()
+    def delete_by_conv_ids(cls, conv_ids):
+        return cls.model.delete().where(cls.model.conv_id.in_(list(conv_ids))).execute()
@@ -13,13 +13,16 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
+import logging
 import time
 from uuid import uuid4
 from common.constants import StatusEnum
 from api.db.db_models import Conversation, DB
 from api.db.services.api_service import API4ConversationService
 from api.db.services.common_service import CommonService
+from api.db.services.conversation_message_service import MESSAGE_TABLE, ConversationMessageService, is_stored_in_table
 from api.db.services.dialog_service import DialogService, chat
+from api.utils.stream_utils import sse_answers, stream_mode_of
 from common.misc_utils import get_uuid
 import json
 
@@ -27,8 +30,134 @@ from rag.prompts.generator import chunks_format
 
 
 class ConversationService(CommonService):
+    """
+    Messages and references of a conversation are kept in the conversation_message table,
+    one row per message. They are assembled into `message` and `reference` when
+    conversations are read, and only the rows that changed are written back by `save`
+    and `update_by_id`.
+    """
     model = Conversation
 
+    @classmethod
+    def _assemble(cls, convs):
+        convs = list(convs)
+        ids = [c["id"] if isinstance(c, dict) else c.id for c in convs
+               if is_stored_in_table(c["message"] if isinstance(c, dict) else c.message)]
+        if not ids:
+            return convs
+        stored = ConversationMessageService.get_conversations(ids)
+        for c in convs:
+            cid = c["id"] if isinstance(c, dict) else c.id
+            if cid not in stored:
+                continue
+            if isinstance(c, dict):
+                c["message"], c["reference"] = stored[cid]
+            else:
+                c.message, c.reference = stored[cid]
+        return convs
+
+    @classmethod
+    def _store_messages(cls, conv_id, data):
+        if "message" not in data:
+            return data
+        data = dict(data)
+        if "reference" not in data:
+            e, conv = cls.get_by_id(conv_id)
+            data["reference"] = conv.reference if e else []
+        if ConversationMessageService.save_messages(conv_id, data["message"], data["reference"] or []):
+            data["message"], data["reference"] = MESSAGE_TABLE, []
+            data["message_in_json"] = False
+        else:
+            data["message_in_json"] = True
+        return data
+
+    @classmethod
+    @DB.connection_context()
+    def save(cls, **kwargs):
+        with DB.atomic():
+            kwargs = cls._store_messages(kwargs.get("id"), kwargs)
+            return super().save(**kwargs)
+
+    @classmethod
+    @DB.connection_context()
+    def update_by_id(cls, pid, data):
+        with DB.atomic():
+            data = cls._store_messages(pid, data)
+            return super().update_by_id(pid, data)
+
+    @classmethod
+    @DB.connection_context()
+    def get_by_id(cls, pid):
+        e, conv = super().get_by_id(pid)
+        if e:
+            cls._assemble([conv])
+        return e, conv
+
+    @classmethod
+    @DB.connection_context()
+    def get_page(cls, pid, offset=0, limit=None):
+        """
+        A conversation with only its messages `offset` to `offset + limit` and their references,
+        and the number of messages of the whole conversation.
+        """
+        e, conv = super().get_by_id(pid)
+        if not e:
+            return e, conv, 0
+        if is_stored_in_table(conv.message):
+            conv.message, conv.reference = ConversationMessageService.get_messages(pid, offset, limit)
+            total = ConversationMessageService.count_messages(pid) if limit else offset + len(conv.message)
+            return e, conv, total
+
+        messages = conv.message or []
+        conv.message, conv.reference = ConversationMessageService.slice_messages(messages, conv.reference or [], offset, limit)
+        return e, conv, len(messages)
+
+    @classmethod
+    @DB.connection_context()
+    def query(cls, cols=None, reverse=None, order_by=None, **kwargs):
+        return cls._assemble(super().query(cols=cols, reverse=reverse, order_by=order_by, **kwargs))
+
+    @classmethod
+    @DB.connection_context()
+    def delete_by_id(cls, pid):
+        with DB.atomic():
+            ConversationMessageService.delete_by_conv_ids([pid])
+            return super().delete_by_id(pid)
+
+    @classmethod
+    @DB.connection_context()
+    def delete_by_ids(cls, pids):
+        with DB.atomic():
+            ConversationMessageService.delete_by_conv_ids(pids)
+            return super().delete_by_ids(pids)
+
+    @classmethod
+    @DB.connection_context()
+    def split_message_blobs(cls, batch_size=100):
+        """Move the messages of conversations still stored as JSON columns into conversation_message."""
+        last_id, moved, kept = "", 0, 0
+        while True:
+            convs = list(cls.model.select(cls.model.id, cls.model.message, cls.model.reference)
+                         .where((cls.model.id > last_id) & (cls.model.message != MESSAGE_TABLE) & ~cls.model.message_in_json)
+                         .order_by(cls.model.id).limit(batch_size))
+            if not convs:
+                break
+            for conv in convs:
+                last_id = conv.id
+                if not isinstance(conv.message, list):
+                    continue
+                with DB.atomic():
+                    data = cls._store_messages(conv.id, {"message": conv.message, "reference": conv.reference or []})
+                    if is_stored_in_table(data["message"]):
+                        super().update_by_id(conv.id, data)
+                        moved += 1
+                    else:
+                        # Not scanned again at the next start; its next write still moves it if it can.
+                        super().update_by_id(conv.id, {"message_in_json": True})
+                        kept += 1
+        if moved or kept:
+            logging.info(f"Moved the messages of {moved} conversations to conversation_message, {kept} kept as JSON.")
+
     @classmethod
     @DB.connection_context()
     def get_list(cls, dialog_id, page_number, items_per_page, orderby, desc, id, name, user_id=None):
@@ -46,7 +175,7 @@ class ConversationService(CommonService):
 
         sessions = sessions.paginate(page_number, items_per_page)
 
-        return list(sessions.dicts())
+        return cls._assemble(sessions.dicts())
 
     @classmethod
     @DB.connection_context()
@@ -148,9 +277,9 @@ def completion(tenant_id, chat_id, question, name="New session", session_id=None
 
     if stream:
         try:
-            for ans in chat(dia, msg, True, **kwargs):
-                ans = structure_answer(conv, ans, message_id, session_id)
-                yield "data:" + json.dumps({"code": 0, "data": ans}, ensure_ascii=False) + "\n\n"
+            yield from sse_answers(chat(dia, msg, True, **kwargs),
+                                   lambda ans: structure_answer(conv, ans, message_id, session_id),
+                                   stream_mode_of(kwargs), message_id, session_id)
             ConversationService.update_by_id(conv.id, conv.to_dict())
         except Exception as e:
             yield "data:" + json.dumps({"code": 500, "message": str(e),
@@ -222,10 +351,9 @@ def iframe_completion(dialog_id, question, session_id=None, stream=True, **kwarg
 
     if stream:
         try:
-            for ans in chat(dia, msg, True, **kwargs):
-                ans = structure_answer(conv, ans, message_id, session_id)
-                yield "data:" + json.dumps({"code": 0, "message": "", "data": ans},
-                                           ensure_ascii=False) + "\n\n"
+            yield from sse_answers(chat(dia, msg, True, **kwargs),
+                                   lambda ans: structure_answer(conv, ans, message_id, session_id),
+                                   stream_mode_of(kwargs), message_id, session_id)
             API4ConversationService.append_message(conv.id, conv.to_dict())
         except Exception as e:
             yield "data:" + json.dumps({"code": 500, "message": str(e),
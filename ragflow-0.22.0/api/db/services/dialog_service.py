@@ -33,6 +33,7 @@ from api.db.services.knowledgebase_service import KnowledgebaseService
 from api.db.services.langfuse_service import TenantLangfuseService
 from api.db.services.llm_service import LLMBundle
 from api.db.services.tenant_llm_service import TenantLLMService
+from api.utils.stream_utils import STREAM_MODE_DELTA, speak_segments, stream_mode_of
 from common.time_utils import current_timestamp, datetime_format
 from graphrag.general.mind_map_extractor import MindMapExtractor
 from rag.app.resume import forbidden_select_fields4resume
@@ -177,7 +178,7 @@ class DialogService(CommonService):
             offset += limit
         return res
 
-def chat_solo(dialog, messages, stream=True):
+def chat_solo(dialog, messages, stream=True, background_tts=False):
     if TenantLLMService.llm_id2llm_type(dialog.llm_id) == "image2text":
         chat_mdl = LLMBundle(dialog.tenant_id, LLMType.IMAGE2TEXT, dialog.llm_id)
     else:
@@ -189,18 +190,9 @@ def chat_solo(dialog, messages, stream=True):
         tts_mdl = LLMBundle(dialog.tenant_id, LLMType.TTS)
     msg = [{"role": m["role"], "content": re.sub(r"##\d+\$\$", "", m["content"])} for m in messages if m["role"] != "system"]
     if stream:
-        last_ans = ""
-        delta_ans = ""
-        for ans in chat_mdl.chat_streamly(prompt_config.get("system", ""), msg, dialog.llm_setting):
-            answer = ans
-            delta_ans = ans[len(last_ans):]
-            if num_tokens_from_string(delta_ans) < 16:
-                continue
-            last_ans = answer
-            yield {"answer": answer, "reference": {}, "audio_binary": tts(tts_mdl, delta_ans), "prompt": "", "created_at": time.time()}
-            delta_ans = ""
-        if delta_ans:
-            yield {"answer": answer, "reference": {}, "audio_binary": tts(tts_mdl, delta_ans), "prompt": "", "created_at": time.time()}
+        for answer, audio in speak_segments(chat_mdl.chat_streamly(prompt_config.get("system", ""), msg, dialog.llm_setting),
+                                            partial(tts, tts_mdl) if tts_mdl else None, background_tts):
+            yield {"answer": answer, "reference": {}, "audio_binary": audio, "prompt": "", "created_at": time.time()}
     else:
         answer = chat_mdl.chat(prompt_config.get("system", ""), msg, dialog.llm_setting)
         user_content = msg[-1].get("content", "[content not available]")
@@ -340,7 +332,7 @@ def meta_filter(metas: dict, filters: list[dict]):
 def chat(dialog, messages, stream=True, **kwargs):
     assert messages[-1]["role"] == "user", "The last content of this conversation is not from user."
     if not dialog.kb_ids and not dialog.prompt_config.get("tavily_api_key"):
-        for ans in chat_solo(dialog, messages, stream):
+        for ans in chat_solo(dialog, messages, stream, background_tts=stream_mode_of(kwargs) == STREAM_MODE_DELTA):
             yield ans
         return
 
@@ -604,20 +596,13 @@ def chat(dialog, messages, stream=True, **kwargs):
         )
 
     if stream:
-        last_ans = ""
         answer = ""
-        for ans in chat_mdl.chat_streamly(prompt + prompt4citation, msg[1:], gen_conf):
-            if thought:
-                ans = re.sub(r"^.*</think>", "", ans, flags=re.DOTALL)
-            answer = ans
-            delta_ans = ans[len(last_ans):]
-            if num_tokens_from_string(delta_ans) < 16:
-                continue
-            last_ans = answer
-            yield {"answer": thought + answer, "reference": {}, "audio_binary": tts(tts_mdl, delta_ans)}
-        delta_ans = answer[len(last_ans):]
-        if delta_ans:
-            yield {"answer": thought + answer, "reference": {}, "audio_binary": tts(tts_mdl, delta_ans)}
+        answers = chat_mdl.chat_streamly(prompt + prompt4citation, msg[1:], gen_conf)
+        if thought:
+            answers = (re.sub(r"^.*</think>", "", ans, flags=re.DOTALL) for ans in answers)
+        for answer, audio in speak_segments(answers, partial(tts, tts_mdl) if tts_mdl else None,
+                                            stream_mode_of(kwargs) == STREAM_MODE_DELTA):
+            yield {"answer": thought + answer, "reference": {}, "audio_binary": audio}
         yield decorate_answer(thought + answer)
     else:
         answer = chat_mdl.chat(prompt + prompt4citation, msg[1:], gen_conf)
@@ -37,6 +37,7 @@ from common.misc_utils import get_uuid
 from common.time_utils import current_timestamp, get_format_time
 from common.constants import LLMType, ParserType, StatusEnum, TaskStatus, SVR_CONSUMER_GROUP_NAME
 from rag.nlp import rag_tokenizer, search
+from rag.nlp.tag_feature import bump_tag_kb_version
 from rag.utils.redis_conn import REDIS_CONN
 from rag.utils.doc_store_conn import OrderByExpr
 from common import settings
@@ -321,6 +322,8 @@ class DocumentService(CommonService):
                 if settings.STORAGE_IMPL.obj_exist(doc.kb_id, doc.thumbnail):
                     settings.STORAGE_IMPL.rm(doc.kb_id, doc.thumbnail)
             settings.docStoreConn.delete({"doc_id": doc.id}, search.index_name(tenant_id), doc.kb_id)
+            if doc.parser_id == ParserType.TAG:
+                bump_tag_kb_version(doc.kb_id)
 
             graph_source = settings.docStoreConn.getFields(
                 settings.docStoreConn.search(["source_id"], [], {"kb_id": doc.kb_id, "knowledge_graph_kwd": ["graph"]}, [], OrderByExpr(), 0, 1, search.index_name(tenant_id), [doc.kb_id]), ["source_id"]
@@ -588,6 +591,13 @@ class DocumentService(CommonService):
         return list(cls.model.select(
             *fields).where(cls.model.id.in_(docids)).dicts())
 
+    @classmethod
+    @DB.connection_context()
+    def get_status(cls, kb_id, docids):
+        fields = [cls.model.id, cls.model.run, cls.model.progress, cls.model.chunk_num, cls.model.token_num]
+        return list(cls.model.select(
+            *fields).where(cls.model.kb_id == kb_id, cls.model.id.in_(docids)).order_by(cls.model.id).dicts())
+
     @classmethod
     @DB.connection_context()
     def update_parser_config(cls, id, config):
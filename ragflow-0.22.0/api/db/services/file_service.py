@@ -14,12 +14,14 @@
 #  limitations under the License.
 #
 import logging
+import os
 import re
 from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
 from flask_login import current_user
-from peewee import fn
+from peewee import Case, Value, fn
 
 from api.db import KNOWLEDGEBASE_FOLDER_NAME, FileType
 from api.db.db_models import DB, Document, File, File2Document, Knowledgebase, Task
@@ -28,6 +30,7 @@ from api.db.services.common_service import CommonService
 from api.db.services.document_service import DocumentService
 from api.db.services.file2document_service import File2DocumentService
 from common.misc_utils import get_uuid
+from common.time_utils import current_timestamp, datetime_format
 from common.constants import TaskStatus, FileSource, ParserType
 from api.db.services.knowledgebase_service import KnowledgebaseService
 from api.db.services.task_service import TaskService
@@ -35,6 +38,12 @@ from api.utils.file_utils import filename_type, read_potential_broken_pdf, thumb
 from rag.llm.cv_model import GptV4
 from common import settings
 
+UPLOAD_DOCUMENT_THREADS = int(os.environ.get("UPLOAD_DOCUMENT_THREADS", 8))
+THUMBNAIL_THREADS = int(os.environ.get("THUMBNAIL_THREADS", 2))
+
+upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_DOCUMENT_THREADS, thread_name_prefix="upload_document")
+thumbnail_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_THREADS, thread_name_prefix="thumbnail")
+
 
 class FileService(CommonService):
     # Service class for managing file operations and storage
@@ -129,7 +138,7 @@ class FileService(CommonService):
     @classmethod
     @DB.connection_context()
     def get_id_list_by_id(cls, id, name, count, res):
-        # Recursively get list of file IDs by traversing folder structure
+        # Get list of file IDs along a path of folder names
         # Args:
         #     id: Starting folder ID
         #     name: List of folder names to traverse
@@ -137,15 +146,30 @@ class FileService(CommonService):
         #     res: List to store results
         # Returns:
         #     List of file IDs
-        if count < len(name):
-            file = cls.get_by_pf_id_name(id, name[count])
-            if file:
-                res.append(file.id)
-                return cls.get_id_list_by_id(file.id, name, count + 1, res)
-            else:
-                return res
-        else:
+        if count >= len(name):
             return res
+        # One recursive query for the whole path: the files named name[depth] at each depth under id
+        base = cls.model.select(cls.model.id, cls.model.parent_id, Value(count)).where((cls.model.parent_id == id) & (cls.model.name == name[count]))
+        path = base.cte("path", recursive=True, columns=("id", "parent_id", "depth"))
+        names = [(path.c.depth + 1 == i, n) for i, n in enumerate(name) if i > count]
+        if names:
+            Child = cls.model.alias()
+            recursive = (
+                Child.select(Child.id, Child.parent_id, path.c.depth + 1)
+                .join(path, on=(Child.parent_id == path.c.id))
+                .where((Child.id != Child.parent_id) & (Child.name == Case(None, names)))
+            )
+            path = path.union_all(recursive)
+        # Among same-named siblings, follow the one with the smallest id, as the lookup per level did.
+        children = {}
+        for file_id, parent_id, depth in path.select_from(path.c.id, path.c.parent_id, path.c.depth).order_by(path.c.depth, path.c.id).tuples():
+            children.setdefault((parent_id, depth), file_id)
+        for depth in range(count, len(name)):
+            id = children.get((id, depth))
+            if not id:
+                break
+            res.append(id)
+        return res
 
     @classmethod
     @DB.connection_context()
@@ -156,14 +180,28 @@ class FileService(CommonService):
         #     result_ids: List to store results
         # Returns:
         #     List of file IDs
-        subfolders = cls.model.select().where(cls.model.parent_id == folder_id)
-        if subfolders.exists():
-            for subfolder in subfolders:
-                cls.get_all_innermost_file_ids(subfolder.id, result_ids)
-        else:
-            result_ids.append(folder_id)
+        subtree = cls._subtree(folder_id)
+        Child = cls.model.alias()
+        has_child = Child.select(Child.id).where((Child.parent_id == cls.model.id) & (Child.id != Child.parent_id))
+        leaves = cls.model.select(cls.model.id).join(subtree, on=(cls.model.id == subtree.c.id)).where(~fn.EXISTS(has_child)).with_cte(subtree)
+        file_ids = [file_id for file_id, in leaves.tuples()]
+        result_ids.extend(file_ids if file_ids else [folder_id])
         return result_ids
 
+    @classmethod
+    def _subtree(cls, folder_id, tenant_id=None):
+        # Recursive CTE of the ids of all the files under a folder, at any depth, the folder itself excluded.
+        # The root folder is its own parent, hence the id != parent_id guards.
+        Child = cls.model.alias()
+        base = cls.model.select(cls.model.id).where((cls.model.parent_id == folder_id) & (cls.model.id != folder_id))
+        recursive = Child.select(Child.id)
+        if tenant_id:
+            base = base.where(cls.model.tenant_id == tenant_id)
+            recursive = recursive.where(Child.tenant_id == tenant_id)
+        subtree = base.cte("subtree", recursive=True, columns=("id",))
+        recursive = recursive.join(subtree, on=(Child.parent_id == subtree.c.id)).where(Child.id != Child.parent_id)
+        return subtree.union(recursive)
+
     @classmethod
     @DB.connection_context()
     def get_all_file_ids_by_tenant_id(cls, tenant_id):
@@ -325,17 +363,12 @@ class FileService(CommonService):
         #     start_id: Starting file ID
         # Returns:
         #     List of parent folder objects
-        parent_folders = []
-        current_id = start_id
-        while current_id:
-            e, file = cls.get_by_id(current_id)
-            if file.parent_id != file.id and e:
-                parent_folders.append(file)
-                current_id = file.parent_id
-            else:
-                parent_folders.append(file)
-                break
-        return parent_folders
+        base = cls.model.select(cls.model.id, cls.model.parent_id, Value(0)).where(cls.model.id == start_id)
+        ancestors = base.cte("ancestors", recursive=True, columns=("id", "parent_id", "depth"))
+        Parent = cls.model.alias()
+        recursive = Parent.select(Parent.id, Parent.parent_id, ancestors.c.depth + 1).join(ancestors, on=(Parent.id == ancestors.c.parent_id)).where(ancestors.c.id != ancestors.c.parent_id)
+        ancestors = ancestors.union_all(recursive)
+        return list(cls.model.select().join(ancestors, on=(cls.model.id == ancestors.c.id)).with_cte(ancestors).order_by(ancestors.c.depth))
 
     @classmethod
     @DB.connection_context()
@@ -364,9 +397,10 @@ class FileService(CommonService):
     @DB.connection_context()
     def delete_folder_by_pf_id(cls, user_id, folder_id):
         try:
-            files = cls.model.select().where((cls.model.tenant_id == user_id) & (cls.model.parent_id == folder_id))
-            for file in files:
-                cls.delete_folder_by_pf_id(user_id, file.id)
+            subtree = cls._subtree(folder_id, tenant_id=user_id)
+            file_ids = [file_id for file_id, in subtree.select_from(subtree.c.id).tuples()]
+            for i in range(0, len(file_ids), 1000):
+                cls.model.delete().where((cls.model.tenant_id == user_id) & (cls.model.id.in_(file_ids[i : i + 1000]))).execute()
             return (cls.model.delete().where((cls.model.tenant_id == user_id) & (cls.model.id == folder_id)).execute(),)
         except Exception:
             logging.exception("delete_folder_by_pf_id")
@@ -375,23 +409,14 @@ class FileService(CommonService):
     @classmethod
     @DB.connection_context()
     def get_file_count(cls, tenant_id):
-        files = cls.model.select(cls.model.id).where(cls.model.tenant_id == tenant_id)
-        return len(files)
+        return cls.model.select(fn.COUNT(cls.model.id)).where(cls.model.tenant_id == tenant_id).scalar()
 
     @classmethod
     @DB.connection_context()
     def get_folder_size(cls, folder_id):
-        size = 0
-
-        def dfs(parent_id):
-            nonlocal size
-            for f in cls.model.select(*[cls.model.id, cls.model.size, cls.model.type]).where(cls.model.parent_id == parent_id, cls.model.id != parent_id):
-                size += f.size
-                if f.type == FileType.FOLDER.value:
-                    dfs(f.id)
-
-        dfs(folder_id)
-        return size
+        subtree = cls._subtree(folder_id)
+        size = cls.model.select(fn.SUM(cls.model.size)).join(subtree, on=(cls.model.id == subtree.c.id)).with_cte(subtree).scalar()
+        return int(size or 0)
 
     @classmethod
     @DB.connection_context()
@@ -430,32 +455,22 @@ class FileService(CommonService):
         kb_root_folder = self.get_kb_folder(user_id)
         kb_folder = self.new_a_file_from_kb(kb.tenant_id, kb.name, kb_root_folder["id"])
 
-        err, files = [], []
+        err, pending, taken = [], [], set()
+
+        def name_taken(**kwargs):
+            # Names given to earlier files of this batch aren't in the database yet.
+            return kwargs["name"] in taken or DocumentService.query(**kwargs)
+
         for file in file_objs:
             try:
                 DocumentService.check_doc_health(kb.tenant_id, file.filename)
-                filename = duplicate_name(DocumentService.query, name=file.filename, kb_id=kb.id)
+                filename = duplicate_name(name_taken, name=file.filename, kb_id=kb.id)
                 filetype = filename_type(filename)
                 if filetype == FileType.OTHER.value:
                     raise RuntimeError("This type of file has not been supported yet!")
-
-                location = filename
-                while settings.STORAGE_IMPL.obj_exist(kb.id, location):
-                    location += "_"
-
-                blob = file.read()
-                if filetype == FileType.PDF.value:
-                    blob = read_potential_broken_pdf(blob)
-                settings.STORAGE_IMPL.put(kb.id, location, blob)
+                taken.add(filename)
 
                 doc_id = get_uuid()
-
-                img = thumbnail_img(filename, blob)
-                thumbnail_location = ""
-                if img is not None:
-                    thumbnail_location = f"thumbnail_{doc_id}.png"
-                    settings.STORAGE_IMPL.put(kb.id, thumbnail_location, img)
-
                 doc = {
                     "id": doc_id,
                     "kb_id": kb.id,
@@ -467,19 +482,103 @@ class FileService(CommonService):
                     "name": filename,
                     "source_type": src,
                     "suffix": Path(filename).suffix.lstrip("."),
-                    "location": location,
-                    "size": len(blob),
-                    "thumbnail": thumbnail_location,
+                    # Unique by construction, no need to probe the storage for a free name.
+                    "location": doc_id + Path(filename).suffix,
+                    "size": 0,
+                    "thumbnail": "",
                 }
-                DocumentService.insert(doc)
+                pending.append((file, doc))
+            except Exception as e:
+                err.append(file.filename + ": " + str(e))
 
-                FileService.add_file_from_kb(doc, kb_folder["id"], kb.tenant_id)
-                files.append((doc, blob))
+        def store(file, doc):
+            blob = file.read()
+            if doc["type"] == FileType.PDF.value:
+                blob = read_potential_broken_pdf(blob)
+            settings.STORAGE_IMPL.put(kb.id, doc["location"], blob)
+            doc["size"] = len(blob)
+            return blob
+
+        files = []
+        futures = [(file, doc, upload_executor.submit(store, file, doc)) for file, doc in pending]
+        for file, doc, future in futures:
+            try:
+                files.append((doc, future.result()))
             except Exception as e:
                 err.append(file.filename + ": " + str(e))
 
+        try:
+            self.insert_docs_from_kb([doc for doc, _ in files], kb, kb_folder["id"])
+        except Exception as e:
+            logging.exception("upload_document")
+            err.extend([doc["name"] + ": " + str(e) for doc, _ in files])
+            # No row points to the stored blobs.
+            for doc, _ in files:
+                try:
+                    settings.STORAGE_IMPL.rm(kb.id, doc["location"])
+                except Exception:
+                    logging.exception(f"Fail to remove {kb.id}/{doc['location']}")
+            return err, []
+
+        for doc, _ in files:
+            thumbnail_executor.submit(self.store_thumbnail, doc)
         return err, files
 
+    @classmethod
+    @DB.connection_context()
+    def insert_docs_from_kb(cls, docs, kb, kb_folder_id):
+        # Insert the rows of new documents of a knowledge base, with their files in the knowledge base folder
+        # Args:
+        #     docs: Document data dictionaries
+        #     kb: Knowledge base object
+        #     kb_folder_id: Knowledge base folder ID
+        if not docs:
+            return
+        now = {"update_time": current_timestamp(), "update_date": datetime_format(datetime.now())}
+        files, file2documents = [], []
+        for doc in docs:
+            file_id = get_uuid()
+            files.append(
+                {
+                    "id": file_id,
+                    "parent_id": kb_folder_id,
+                    "tenant_id": kb.tenant_id,
+                    "created_by": kb.tenant_id,
+                    "name": doc["name"],
+                    "type": doc["type"],
+                    "size": doc["size"],
+                    "location": doc["location"],
+                    "source_type": FileSource.KNOWLEDGEBASE,
+                    **now,
+                }
+            )
+            file2documents.append({"id": get_uuid(), "file_id": file_id, "document_id": doc["id"], **now})
+        with DB.atomic():
+            DocumentService.insert_many([{**doc, **now} for doc in docs])
+            if not KnowledgebaseService.atomic_increase_doc_num_by_id(kb.id, len(docs)):
+                raise RuntimeError("Database error (Knowledgebase)!")
+            cls.insert_many(files)
+            File2DocumentService.insert_many(file2documents)
+
+    @staticmethod
+    def store_thumbnail(doc):
+        # Render and store the thumbnail of a newly uploaded document, off the upload request.
+        # The blob is read back from the storage so that queued documents don't hold it in memory.
+        try:
+            blob = settings.STORAGE_IMPL.get(doc["kb_id"], doc["location"])
+            if not blob:
+                return
+            img = thumbnail_img(doc["name"], blob)
+            if img is None:
+                return
+            thumbnail_location = f"thumbnail_{doc['id']}.png"
+            settings.STORAGE_IMPL.put(doc["kb_id"], thumbnail_location, img)
+            if not DocumentService.update_by_id(doc["id"], {"thumbnail": thumbnail_location}):
+                # The document was removed in the meantime.
+                settings.STORAGE_IMPL.rm(doc["kb_id"], thumbnail_location)
+        except Exception:
+            logging.exception(f"Fail to make the thumbnail of {doc['kb_id']}/{doc['name']}")
+
     @classmethod
     @DB.connection_context()
     def list_all_files_by_parent_id(cls, parent_id):
@@ -513,11 +513,11 @@ class KnowledgebaseService(CommonService):
 
     @classmethod
     @DB.connection_context()
-    def atomic_increase_doc_num_by_id(cls, kb_id):
+    def atomic_increase_doc_num_by_id(cls, kb_id, count=1):
         data = {}
         data["update_time"] = current_timestamp()
         data["update_date"] = datetime_format(datetime.now())
-        data["doc_num"] = cls.model.doc_num + 1
+        data["doc_num"] = cls.model.doc_num + count
         num = cls.model.update(data).where(cls.model.id == kb_id).execute()
         return num
 
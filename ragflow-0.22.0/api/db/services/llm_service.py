@@ -22,6 +22,7 @@ from typing import Generator
 from api.db.db_models import LLM
 from api.db.services.common_service import CommonService
 from api.db.services.tenant_llm_service import LLM4Tenant, TenantLLMService
+from common.llm_limiter import CircuitOpenError
 
 
 class LLMService(CommonService):
@@ -91,7 +92,8 @@ class LLMBundle(LLM4Tenant):
             else:
                 safe_texts.append(text)
                 
-        embeddings, used_tokens = self.mdl.encode(safe_texts)
+        with self.limiter.slot(sum([num_tokens_from_string(t) for t in safe_texts])):
+            embeddings, used_tokens = self.mdl.encode(safe_texts)
 
         llm_name = getattr(self, "llm_name", None)
         if not TenantLLMService.increase_usage(self.tenant_id, self.llm_type, used_tokens, llm_name):
@@ -107,7 +109,8 @@ class LLMBundle(LLM4Tenant):
         if self.langfuse:
             generation = self.langfuse.start_generation(trace_context=self.trace_context, name="encode_queries", model=self.llm_name, input={"query": query})
 
-        emd, used_tokens = self.mdl.encode_queries(query)
+        with self.limiter.slot(num_tokens_from_string(query)):
+            emd, used_tokens = self.mdl.encode_queries(query)
         llm_name = getattr(self, "llm_name", None)
         if not TenantLLMService.increase_usage(self.tenant_id, self.llm_type, used_tokens, llm_name):
             logging.error("LLMBundle.encode_queries can't update token usage for {}/EMBEDDING used_tokens: {}".format(self.tenant_id, used_tokens))
@@ -122,7 +125,8 @@ class LLMBundle(LLM4Tenant):
         if self.langfuse:
             generation = self.langfuse.start_generation(trace_context=self.trace_context, name="similarity", model=self.llm_name, input={"query": query, "texts": texts})
 
-        sim, used_tokens = self.mdl.similarity(query, texts)
+        with self.limiter.slot(num_tokens_from_string(query) * len(texts) + sum([num_tokens_from_string(t) for t in texts])):
+            sim, used_tokens = self.mdl.similarity(query, texts)
         if not TenantLLMService.increase_usage(self.tenant_id, self.llm_type, used_tokens):
             logging.error("LLMBundle.similarity can't update token usage for {}/RERANK used_tokens: {}".format(self.tenant_id, used_tokens))
 
@@ -202,6 +206,10 @@ class LLMBundle(LLM4Tenant):
 
         return txt[last_think_end + len("</think>") :]
 
+    @staticmethod
+    def _prompt_tokens(system: str, history: list) -> int:
+        return num_tokens_from_string(system or "") + sum([num_tokens_from_string(m.get("content") or "") for m in history if isinstance(m.get("content"), str)])
+
     @staticmethod
     def _clean_param(chat_partial, **kwargs):
         func = chat_partial.func
@@ -227,7 +235,14 @@ class LLMBundle(LLM4Tenant):
             chat_partial = partial(self.mdl.chat_with_tools, system, history, gen_conf, **kwargs)
 
         use_kwargs = self._clean_param(chat_partial, **kwargs)
-        txt, used_tokens = chat_partial(**use_kwargs)
+        try:
+            with self.limiter.slot(self._prompt_tokens(system, history)) as slot:
+                txt, used_tokens = chat_partial(**use_kwargs)
+                if isinstance(txt, str) and txt.find("**ERROR**") >= 0:
+                    slot.error = txt
+                slot.tokens_used = used_tokens
+        except CircuitOpenError as e:
+            txt, used_tokens = f"**ERROR**: {e}", 0
         txt = self._remove_reasoning_content(txt)
 
         if not self.verbose_tool_use:
@@ -252,22 +267,33 @@ class LLMBundle(LLM4Tenant):
         if self.is_tools and self.mdl.is_tools:
             chat_partial = partial(self.mdl.chat_streamly_with_tools, system, history, gen_conf)
         use_kwargs = self._clean_param(chat_partial, **kwargs)
-        for txt in chat_partial(**use_kwargs):
-            if isinstance(txt, int):
-                total_tokens = txt
-                if self.langfuse:
-                    generation.update(output={"output": ans})
-                    generation.end()
-                break
-
-            if txt.endswith("</think>"):
-                ans = ans[: -len("</think>")]
-
-            if not self.verbose_tool_use:
-                txt = re.sub(r"<tool_call>.*?</tool_call>", "", txt, flags=re.DOTALL)
-
-            ans += txt
-            yield ans
+        try:
+            with self.limiter.slot(self._prompt_tokens(system, history)) as slot:
+                for txt in chat_partial(**use_kwargs):
+                    if isinstance(txt, int):
+                        total_tokens = txt
+                        slot.tokens_used = txt
+                        if self.langfuse:
+                            generation.update(output={"output": ans})
+                            generation.end()
+                        break
+
+                    if txt.find("**ERROR**") >= 0:
+                        slot.error = txt
+
+                    if txt.endswith("</think>"):
+                        ans = ans[: -len("</think>")]
+
+                    if not self.verbose_tool_use:
+                        txt = re.sub(r"<tool_call>.*?</tool_call>", "", txt, flags=re.DOTALL)
+
+                    ans += txt
+                    # The consumer's time (a slow SSE client, say) isn't spent on the provider.
+                    self.limiter.suspend(slot)
+                    yield ans
+                    self.limiter.resume(slot, wait=False)
+        except CircuitOpenError as e:
+            yield ans + f"\n**ERROR**: {e}"
 
         if total_tokens > 0:
             if not TenantLLMService.increase_usage(self.tenant_id, self.llm_type, txt, self.llm_name):
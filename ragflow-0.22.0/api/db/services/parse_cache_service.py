@@ -0,0 +1,150 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import base64
+import hashlib
+import json
+import logging
+import os
+from io import BytesIO
+
+from api.db.db_models import DB, ParseCache
+from api.db.services.common_service import CommonService
+from common import settings
+from common.constants import ParserType
+from common.time_utils import current_timestamp
+
+PARSE_CACHE_ENABLED = os.environ.get("PARSE_CACHE_ENABLED", "1").lower() in ["1", "true"]
+PARSE_CACHE_TTL_DAYS = int(os.environ.get("PARSE_CACHE_TTL_DAYS", "7"))
+PARSE_CACHE_BUCKET = os.environ.get("PARSE_CACHE_BUCKET", "parse-cache")
+# Bump when chunkers change their output, so that older parsing results aren't reused.
+PARSE_CACHE_VERSION = 1
+
+# parser_config fields only used after chunking (enrichment, indexing, task splitting).
+NON_PARSING_FIELDS = {"auto_keywords", "auto_questions", "raptor", "graphrag", "tag_kb_ids", "topn_tags",
+                      "toc_extraction", "filename_embd_weight", "pages", "task_page_size"}
+
+# Chunkers whose output depends on the tenant's default ASR or chat models rather than on the file and settings,
+# and chunkers that update their KB while chunking (the field_map of table and resume KBs).
+# Figures described by the default IMAGE2TEXT model are covered by putting that model in the key.
+UNCACHED_PARSERS = {ParserType.PICTURE.value, ParserType.AUDIO.value, ParserType.TABLE.value, ParserType.RESUME.value}
+
+
+def _json_default(o):
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    raise TypeError(f"{type(o)} is not JSON serializable")
+
+
+class ParseCacheService(CommonService):
+    """Chunk lists produced by the chunkers, keyed by file content and parsing settings.
+
+    Reparsing a document after changing only embedding, keyword or question settings
+    reuses the chunks in object storage instead of running OCR, layout and TSR again.
+    """
+    model = ParseCache
+
+    @staticmethod
+    def file_digest(binary):
+        return hashlib.sha256(binary).hexdigest()
+
+    @staticmethod
+    def cache_key(task, file_digest):
+        """The cache key of a parsing task, or None if its results are not cacheable."""
+        if not PARSE_CACHE_ENABLED or task["parser_id"].lower() in UNCACHED_PARSERS:
+            return None
+        parser_config = {k: v for k, v in (task.get("parser_config") or {}).items() if k not in NON_PARSING_FIELDS}
+        return hashlib.sha256(json.dumps({
+            "version": PARSE_CACHE_VERSION,
+            "file": file_digest,
+            "tenant_id": task["tenant_id"],
+            "parser_id": task["parser_id"].lower(),
+            "name": task["name"],
+            "from_page": task["from_page"],
+            "to_page": task["to_page"],
+            "language": task["language"],
+            "img2txt_id": task.get("img2txt_id") or "",
+            "parser_config": parser_config,
+        }, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+    @classmethod
+    @DB.connection_context()
+    def get_chunks(cls, key):
+        """The cached chunk list, images as JPEG bytes, or None."""
+        obj = cls.model.get_or_none(cls.model.id == key)
+        if not obj:
+            return None
+        if current_timestamp() - obj.create_time > PARSE_CACHE_TTL_DAYS * 24 * 3600 * 1000:
+            cls.remove([obj])
+            return None
+        try:
+            binary = settings.STORAGE_IMPL.get(PARSE_CACHE_BUCKET, key)
+            if not binary:
+                cls.remove([obj])
+                return None
+            chunks = json.loads(binary)
+        except Exception:
+            logging.exception(f"ParseCacheService.get_chunks {key} got exception")
+            return None
+        for ck in chunks:
+            if ck.get("image"):
+                ck["image"] = base64.b64decode(ck["image"])
+        return chunks
+
+    @classmethod
+    @DB.connection_context()
+    def put_chunks(cls, key, task, chunks, file_digest):
+        """Store `chunks` under `key`, images as JPEG. `chunks` are left as they are."""
+        cached = []
+        for ck in chunks:
+            img = ck.get("image")
+            if img and not isinstance(img, bytes):
+                if img.mode in ("RGBA", "P"):
+                    img = img.convert("RGB")
+                with BytesIO() as buf:
+                    try:
+                        img.save(buf, format="JPEG")
+                    except OSError as e:
+                        logging.warning(f"Parsing result of {task['name']} is not cached, saving image exception: {e}")
+                        return
+                    finally:
+                        if img is not ck["image"]:
+                            img.close()
+                    ck = {**ck, "image": buf.getvalue()}
+            cached.append(ck)
+        try:
+            binary = json.dumps([
+                {k: base64.b64encode(v).decode("ascii") if k == "image" and v else v for k, v in ck.items()}
+                for ck in cached
+            ], ensure_ascii=False, default=_json_default).encode("utf-8")
+        except TypeError as e:
+            logging.warning(f"Parsing result of {task['name']} is not cached: {e}")
+            return
+        settings.STORAGE_IMPL.put(PARSE_CACHE_BUCKET, key, binary)
+        cls.model.delete().where(cls.model.id == key).execute()
+        cls.insert(id=key, tenant_id=task["tenant_id"], parser_id=task["parser_id"], file_digest=file_digest,
+                   chunk_num=len(chunks), size=len(binary))
+        cls.remove(cls.model.select().where(
+            cls.model.create_time < current_timestamp() - PARSE_CACHE_TTL_DAYS * 24 * 3600 * 1000).limit(64))
+
+    @classmethod
+    @DB.connection_context()
+    def remove(cls, objs):
+        ids = []
+        for obj in objs:
+            settings.STORAGE_IMPL.rm(PARSE_CACHE_BUCKET, obj.id)
+            ids.append(obj.id)
+        if ids:
+            cls.model.delete().where(cls.model.id.in_(ids)).execute()
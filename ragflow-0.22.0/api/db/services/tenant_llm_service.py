@@ -18,6 +18,7 @@ import logging
 from langfuse import Langfuse
 from common import settings
 from common.constants import LLMType
+from common.llm_limiter import get_limiter, limiter_key
 from api.db.db_models import DB, LLMFactories, TenantLLM
 from api.db.services.common_service import CommonService
 from api.db.services.langfuse_service import TenantLangfuseService
@@ -257,6 +258,10 @@ class LLM4Tenant:
         self.is_tools = model_config.get("is_tools", False)
         self.verbose_tool_use = kwargs.get("verbose_tool_use")
 
+        self.limiter = get_limiter(limiter_key(model_config.get("llm_factory", ""), model_config.get("api_base"), model_config.get("llm_name", llm_name)))
+        if hasattr(self.mdl, "limiter"):
+            self.mdl.limiter = self.limiter
+
         langfuse_keys = TenantLangfuseService.filter_by_tenant(tenant_id=tenant_id)
         self.langfuse = None
         if langfuse_keys:
@@ -0,0 +1,167 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import json
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+from common.token_utils import num_tokens_from_string
+
+STREAM_MODE_FULL = "full"
+STREAM_MODE_DELTA = "delta"
+MIN_SEGMENT_TOKENS = 16
+
+
+def stream_mode_of(req: dict) -> str:
+    return STREAM_MODE_DELTA if str(req.get("stream_mode", "")).lower() == STREAM_MODE_DELTA else STREAM_MODE_FULL
+
+
+def answer_segments(answers: Iterable[str], min_tokens: int = MIN_SEGMENT_TOKENS) -> Iterator[tuple[str, str]]:
+    """
+    Group the cumulative answers streamed by an LLM into segments of at least `min_tokens`
+    new tokens. Yields (answer so far, text added since the previous segment). Only the new
+    text of each streamed answer is tokenized.
+    """
+    last_ans, seen, answer, n_tokens = "", "", "", 0
+    for ans in answers:
+        new = ans[len(seen):] if ans.startswith(seen) else ans
+        n_tokens += num_tokens_from_string(new)
+        seen = answer = ans
+        if n_tokens < min_tokens:
+            continue
+        yield answer, answer[len(last_ans):]
+        last_ans, n_tokens = answer, 0
+    if answer[len(last_ans):]:
+        yield answer, answer[len(last_ans):]
+
+
+class BackgroundTTS:
+    """Synthesizes text segments in order on a worker thread, so that token delivery never waits for audio."""
+
+    def __init__(self, synthesize: Callable[[str], str | None]):
+        self._synthesize = synthesize
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+        self._pending = deque()
+
+    def submit(self, text: str):
+        if text:
+            self._pending.append(self._pool.submit(self._synthesize, text))
+
+    def ready(self) -> Iterator[str]:
+        """Audio of the segments synthesized so far, without blocking."""
+        while self._pending and self._pending[0].done():
+            audio = self._result(self._pending.popleft())
+            if audio:
+                yield audio
+
+    def drain(self) -> Iterator[str]:
+        """Audio of all the remaining segments, waiting for them."""
+        try:
+            while self._pending:
+                audio = self._result(self._pending.popleft())
+                if audio:
+                    yield audio
+        finally:
+            self.close()
+
+    def close(self):
+        """Drop the segments not synthesized yet, e.g. when the client has gone."""
+        self._pending.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _result(fut: Future):
+        try:
+            return fut.result()
+        except Exception:
+            logging.exception("TTS got exception")
+            return None
+
+
+def speak_segments(answers: Iterable[str], synthesize: Callable[[str], str | None] | None = None,
+                   background: bool = False) -> Iterator[tuple[str, str | None]]:
+    """
+    (answer so far, audio) for every segment of `answers`. With `background`, audio is
+    synthesized off the generator thread and yielded as extra (answer, audio) items once ready.
+    """
+    if not synthesize:
+        for answer, _ in answer_segments(answers):
+            yield answer, None
+        return
+    if not background:
+        for answer, delta in answer_segments(answers):
+            yield answer, synthesize(delta)
+        return
+
+    tts = BackgroundTTS(synthesize)
+    answer = ""
+    try:
+        for answer, delta in answer_segments(answers):
+            tts.submit(delta)
+            yield answer, None
+            for audio in tts.ready():
+                yield answer, audio
+        for audio in tts.drain():
+            yield answer, audio
+    finally:
+        # The generator is closed at a yield when an SSE client disconnects.
+        tts.close()
+
+
+def sse_message(data) -> str:
+    return "data:" + json.dumps(data, ensure_ascii=False) + "\n\n"
+
+
+def sse_answers(answers: Iterable[dict], structure: Callable[[dict], dict], stream_mode: str = STREAM_MODE_FULL,
+                message_id=None, session_id=None) -> Iterator[str]:
+    """
+    SSE events of the answers streamed by `chat()`.
+
+    In "full" mode every event carries the whole answer so far and its reference, as before.
+    In "delta" mode an event only carries the text added since the previous event (or the
+    whole text with `"replace": true` when the answer was rewritten, e.g. by citation
+    insertion), audio comes in events of its own, and the reference is sent once in a last
+    event flagged `"final": true`.
+    """
+    if stream_mode != STREAM_MODE_DELTA:
+        for ans in answers:
+            yield sse_message({"code": 0, "message": "", "data": structure(ans)})
+        return
+
+    sent, last = "", None
+    for ans in answers:
+        last = ans
+        text = ans.get("answer") or ""
+        if text.startswith(sent):
+            data = {"answer": text[len(sent):]}
+        else:
+            data = {"answer": text, "replace": True}
+        sent = text
+        if ans.get("audio_binary"):
+            data["audio_binary"] = ans["audio_binary"]
+        elif not data["answer"] and not data.get("replace"):
+            continue
+        data["id"] = message_id
+        data["session_id"] = session_id
+        yield sse_message({"code": 0, "message": "", "data": data})
+    if last is None:
+        return
+    data = structure(last)
+    data = {k: v for k, v in data.items() if k not in ("answer", "audio_binary")}
+    data["answer"] = ""
+    data["final"] = True
+    yield sse_message({"code": 0, "message": "", "data": data})
@@ -1,6 +1,7 @@
 """Blob storage connector"""
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import Any, Optional
 
@@ -11,7 +12,7 @@ from common.data_source.utils import (
     extract_size_bytes,
     get_file_ext,
 )
-from common.data_source.config import BlobType, DocumentSource, BLOB_STORAGE_SIZE_THRESHOLD, INDEX_BATCH_SIZE
+from common.data_source.config import BlobType, DocumentSource, BLOB_STORAGE_SIZE_THRESHOLD, BLOB_STORAGE_DOWNLOAD_CONCURRENCY, INDEX_BATCH_SIZE
 from common.data_source.exceptions import (
     ConnectorMissingCredentialError,
     ConnectorValidationError,
@@ -32,6 +33,7 @@ class BlobStorageConnector(LoadConnector, PollConnector):
         prefix: str = "",
         batch_size: int = INDEX_BATCH_SIZE,
         european_residency: bool = False,
+        max_concurrent_downloads: int = BLOB_STORAGE_DOWNLOAD_CONCURRENCY,
     ) -> None:
         self.bucket_type: BlobType = BlobType(bucket_type)
         self.bucket_name = bucket_name.strip()
@@ -42,6 +44,7 @@ class BlobStorageConnector(LoadConnector, PollConnector):
         self.size_threshold: int | None = BLOB_STORAGE_SIZE_THRESHOLD
         self.bucket_region: Optional[str] = None
         self.european_residency: bool = european_residency
+        self.max_concurrent_downloads: int = max(1, max_concurrent_downloads)
 
     def set_allow_images(self, allow_images: bool) -> None:
         """Set whether to process images"""
@@ -113,58 +116,69 @@ class BlobStorageConnector(LoadConnector, PollConnector):
         paginator = self.s3_client.get_paginator("list_objects_v2")
         pages = paginator.paginate(Bucket=self.bucket_name, Prefix=self.prefix)
 
-        batch: list[Document] = []
-        for page in pages:
-            if "Contents" not in page:
-                continue
-
-            for obj in page["Contents"]:
-                if obj["Key"].endswith("/"):
-                    continue
-
-                last_modified = obj["LastModified"].replace(tzinfo=timezone.utc)
-
-                if not (start < last_modified <= end):
+        # Objects of a listing page are downloaded concurrently; results keep the listing order.
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_downloads) as executor:
+            batch: list[Document] = []
+            for page in pages:
+                if "Contents" not in page:
                     continue
 
-                file_name = os.path.basename(obj["Key"])
-                key = obj["Key"]
+                objs = [obj for obj in page["Contents"] if self._should_download(obj, start, end)]
+                # Submit one window at a time so no more than `max_concurrent_downloads`
+                # blobs are held besides the pending batch.
+                for i in range(0, len(objs), self.max_concurrent_downloads):
+                    for doc in executor.map(self._download_document, objs[i: i + self.max_concurrent_downloads]):
+                        if doc is None:
+                            continue
+                        batch.append(doc)
+                        if len(batch) == self.batch_size:
+                            yield batch
+                            batch = []
+
+            if batch:
+                yield batch
+
+    def _should_download(self, obj: dict[str, Any], start: datetime, end: datetime) -> bool:
+        if obj["Key"].endswith("/"):
+            return False
+
+        last_modified = obj["LastModified"].replace(tzinfo=timezone.utc)
+        if not (start < last_modified <= end):
+            return False
+
+        size_bytes = extract_size_bytes(obj)
+        if (
+            self.size_threshold is not None
+            and isinstance(size_bytes, int)
+            and size_bytes > self.size_threshold
+        ):
+            logging.warning(
+                f"{os.path.basename(obj['Key'])} exceeds size threshold of {self.size_threshold}. Skipping."
+            )
+            return False
+        return True
 
-                size_bytes = extract_size_bytes(obj)
-                if (
-                    self.size_threshold is not None
-                    and isinstance(size_bytes, int)
-                    and size_bytes > self.size_threshold
-                ):
-                    logging.warning(
-                        f"{file_name} exceeds size threshold of {self.size_threshold}. Skipping."
-                    )
-                    continue
-                try:
-                    blob = download_object(self.s3_client, self.bucket_name, key, self.size_threshold)
-                    if blob is None:
-                        continue
-
-                    batch.append(
-                        Document(
-                            id=f"{self.bucket_type}:{self.bucket_name}:{key}",
-                            blob=blob,
-                            source=DocumentSource(self.bucket_type.value),
-                            semantic_identifier=file_name,
-                            extension=get_file_ext(file_name),
-                            doc_updated_at=last_modified,
-                            size_bytes=size_bytes if size_bytes else 0
-                        )
-                    )
-                    if len(batch) == self.batch_size:
-                        yield batch
-                        batch = []
-
-                except Exception:
-                    logging.exception(f"Error decoding object {key}")
-        
-        if batch:
-            yield batch
+    def _download_document(self, obj: dict[str, Any]) -> Document | None:
+        key = obj["Key"]
+        file_name = os.path.basename(key)
+        size_bytes = extract_size_bytes(obj)
+        try:
+            blob = download_object(self.s3_client, self.bucket_name, key, self.size_threshold)
+            if blob is None:
+                return None
+
+            return Document(
+                id=f"{self.bucket_type}:{self.bucket_name}:{key}",
+                blob=blob,
+                source=DocumentSource(self.bucket_type.value),
+                semantic_identifier=file_name,
+                extension=get_file_ext(file_name),
+                doc_updated_at=obj["LastModified"].replace(tzinfo=timezone.utc),
+                size_bytes=size_bytes if size_bytes else 0
+            )
+        except Exception:
+            logging.exception(f"Error decoding object {key}")
+            return None
 
     def load_from_state(self) -> GenerateDocumentsOutput:
         """Load documents from state"""
@@ -81,6 +81,7 @@ _PAGE_EXPANSION_FIELDS = [
 
 # Configuration constants
 BLOB_STORAGE_SIZE_THRESHOLD = 20 * 1024 * 1024  # 20MB
+BLOB_STORAGE_DOWNLOAD_CONCURRENCY = int(os.environ.get("BLOB_STORAGE_DOWNLOAD_CONCURRENCY", "8"))
 INDEX_BATCH_SIZE = 2
 SLACK_NUM_THREADS = 4
 ENABLE_EXPENSIVE_EXPERT_CALLS = False
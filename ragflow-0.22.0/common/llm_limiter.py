@@ -0,0 +1,405 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Provider-keyed adaptive limiter for model calls (chat, embedding, rerank).
+
+Every provider endpoint gets one `AdaptiveLimiter` per process, shared by all threads:
+- the concurrency limit follows AIMD: +1/limit on a fast success, x0.5 on a 429/5xx
+  or on a call much slower than the observed baseline;
+- retry backoff is shared, so one rate-limit error pauses every caller of the provider;
+- a circuit breaker fails fast after consecutive overload errors;
+- an optional token bucket enforces a tokens-per-minute budget.
+
+Slots are re-entrant per thread, and `released()` gives them back while the tools called
+by a model run, so that models called from those tools don't wait for their own caller.
+
+With LLM_LIMITER_SHARED_REDIS=1 the backoff and circuit-open deadlines are also
+published through Redis so that every process talking to the provider honours them.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+LLM_LIMITER_INIT = float(os.environ.get("LLM_LIMITER_INIT", os.environ.get("MAX_CONCURRENT_CHATS", 10)))
+LLM_LIMITER_MIN = float(os.environ.get("LLM_LIMITER_MIN", 1))
+LLM_LIMITER_MAX = float(os.environ.get("LLM_LIMITER_MAX", 64))
+LLM_LIMITER_TPM = int(os.environ.get("LLM_LIMITER_TPM", 0))
+LLM_LIMITER_MAX_WAIT = float(os.environ.get("LLM_LIMITER_MAX_WAIT", 600))
+LLM_LIMITER_LATENCY_FACTOR = float(os.environ.get("LLM_LIMITER_LATENCY_FACTOR", 3.0))
+LLM_LIMITER_FAILURE_THRESHOLD = int(os.environ.get("LLM_LIMITER_FAILURE_THRESHOLD", 5))
+LLM_LIMITER_OPEN_SECONDS = float(os.environ.get("LLM_LIMITER_OPEN_SECONDS", 30))
+LLM_LIMITER_SHARED_REDIS = os.environ.get("LLM_LIMITER_SHARED_REDIS", "0").lower() in ["1", "true"]
+
+_OVERLOAD_STATUS = {429, 500, 502, 503, 504}
+# Status codes only count as whole numbers, not as digits of a token count or a request id.
+_OVERLOAD_PATTERN = re.compile(r"(\b(429|50[0234])\b|rate limit|too many requests|tpm limit|requests per minute|rate_limit_exceeded|"
+                               r"server_error|overload|unavailable|max_retries_exceeded)", re.IGNORECASE)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def is_overload_error(error) -> bool:
+    """Whether an exception or an `**ERROR**` answer means the provider is saturated."""
+    if error is None:
+        return False
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in _OVERLOAD_STATUS
+    return _OVERLOAD_PATTERN.search(str(error)) is not None
+
+
+class _Slot:
+    def __init__(self, limiter, started_at: float):
+        self.limiter = limiter
+        self.started_at = started_at
+        self.suspended_at = None
+        self.reentrant = False
+        self.error = None
+        self.tokens_used = 0
+
+
+# Slots held by the current thread, so that nested calls to the same provider don't
+# queue behind their own caller and `released()` can give them back.
+_held = threading.local()
+
+
+def _held_slots() -> list:
+    if not hasattr(_held, "slots"):
+        _held.slots = []
+    return _held.slots
+
+
+@contextmanager
+def released():
+    """
+    Give back the slots held by this thread for the duration of the block, and take them
+    again afterwards. Used while the tools called by a model run: they may call models of
+    the same provider themselves, and their run time isn't provider load.
+    """
+    slots = list(_held_slots())
+    for slot in reversed(slots):
+        slot.limiter.suspend(slot)
+    try:
+        yield
+    finally:
+        for slot in slots:
+            slot.limiter.resume(slot)
+
+
+class AdaptiveLimiter:
+    def __init__(self, key: str, init_limit: float = LLM_LIMITER_INIT, min_limit: float = LLM_LIMITER_MIN, max_limit: float = LLM_LIMITER_MAX,
+                 tpm: int = LLM_LIMITER_TPM, max_wait: float = LLM_LIMITER_MAX_WAIT, latency_factor: float = LLM_LIMITER_LATENCY_FACTOR,
+                 failure_threshold: int = LLM_LIMITER_FAILURE_THRESHOLD, open_seconds: float = LLM_LIMITER_OPEN_SECONDS,
+                 shared: bool = LLM_LIMITER_SHARED_REDIS):
+        self.key = key
+        self.min_limit = max(1.0, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(max(init_limit, self.min_limit), self.max_limit)
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self.latency_factor = latency_factor
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.shared = shared
+
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self._backoff_until = 0.0
+        self._decreased_at = 0.0
+        self._baseline = None
+        self._samples = 0
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._tokens = float(tpm)
+        self._refilled_at = time.monotonic()
+        self._shared_checked_at = 0.0
+        self._waits = deque(maxlen=256)
+        self.throttled = 0
+        self.rejected = 0
+
+    # ---- public API ----
+
+    @contextmanager
+    def slot(self, tokens: int = 0):
+        """
+        Hold one unit of concurrency (and `tokens` of the TPM budget) for the duration of a call.
+
+        Exceptions raised inside the block are reported as failures; callers that get errors
+        back as values set `slot.error` instead, and may set `slot.tokens_used`.
+        A thread that already holds a slot of this limiter keeps using it.
+        """
+        held = _held_slots()
+        if any(s.limiter is self for s in held):
+            slot = _Slot(self, time.monotonic())
+            slot.reentrant = True
+            yield slot
+            return
+        slot = _Slot(self, self.acquire(tokens))
+        held.append(slot)
+        try:
+            yield slot
+        except Exception as e:
+            slot.error = e
+            raise
+        finally:
+            if slot.suspended_at is not None:
+                self.resume(slot, wait=False)
+            _held_slots().remove(slot)
+            self.release(slot.started_at, slot.error, max(0, slot.tokens_used - tokens))
+
+    def acquire(self, tokens: int = 0) -> float:
+        start = time.monotonic()
+        with self._cond:
+            self._pull_shared_state(start)
+            self._check_circuit(start)
+            self._wait_for_slot(start, tokens)
+            return time.monotonic()
+
+    def release(self, started_at: float, error=None, extra_tokens: int = 0):
+        now = time.monotonic()
+        latency = now - started_at
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            if self.tpm > 0:
+                self._tokens -= extra_tokens
+            if is_overload_error(error):
+                self._on_overload(now)
+            elif error is None:
+                self._on_success(now, latency)
+            else:
+                # Request errors (auth, bad request...) say nothing about provider load.
+                self._probing = False
+            self._cond.notify_all()
+
+    def suspend(self, slot: _Slot):
+        """Give `slot` back while its holder doesn't use the provider, e.g. while a stream's consumer works."""
+        if slot.reentrant:
+            return
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._cond.notify_all()
+        slot.suspended_at = time.monotonic()
+        _held_slots().remove(slot)
+
+    def resume(self, slot: _Slot, wait: bool = True):
+        """
+        Take a suspended `slot` again, waiting for the concurrency limit unless `wait` is False
+        (the provider is already answering, e.g. an open stream). The suspended time isn't
+        counted in the call's latency.
+        """
+        if slot.reentrant:
+            return
+        now = time.monotonic()
+        with self._cond:
+            if wait:
+                self._wait_for_slot(now, 0)
+            else:
+                self.in_flight += 1
+        slot.started_at += time.monotonic() - slot.suspended_at
+        slot.suspended_at = None
+        _held_slots().append(slot)
+
+    def backoff(self, delay: float):
+        """Pause every caller of this provider for `delay` seconds, then return."""
+        now = time.monotonic()
+        with self._cond:
+            self._backoff_until = max(self._backoff_until, now + delay)
+            self._on_overload(now, count_failure=False)
+            until = self._backoff_until
+        self._push_shared_state("backoff", until - now)
+        remaining = until - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def metrics(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            waits = list(self._waits)
+            if now < self._open_until:
+                circuit = "open"
+            elif self._probing:
+                circuit = "half_open"
+            else:
+                circuit = "closed"
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "queue_wait_avg": round(sum(waits) / len(waits), 4) if waits else 0.0,
+                "queue_wait_max": round(max(waits), 4) if waits else 0.0,
+                "throttled": self.throttled,
+                "rejected": self.rejected,
+                "backoff_remaining": round(max(0.0, self._backoff_until - now), 2),
+                "circuit": circuit,
+                "tokens_available": int(self._tokens) if self.tpm > 0 else None,
+            }
+
+    # ---- internals, called with self._cond held ----
+
+    def _wait_for_slot(self, start: float, tokens: int):
+        self.queued += 1
+        try:
+            while True:
+                now = time.monotonic()
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    break
+                if now - start > self.max_wait:
+                    raise TimeoutError(f"Waited more than {self.max_wait}s for model provider {self.key}")
+                self._cond.wait(min(wait, 1.0))
+                self._pull_shared_state(time.monotonic())
+            self.in_flight += 1
+            if self.tpm > 0:
+                self._tokens -= tokens
+        finally:
+            self.queued -= 1
+        waited = time.monotonic() - start
+        self._waits.append(waited)
+        if waited > 0.001:
+            self.throttled += 1
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        if now < self._backoff_until:
+            return self._backoff_until - now
+        if self.in_flight >= int(self.limit):
+            return 1.0
+        if self.tpm > 0 and tokens > 0:
+            self._refill(now)
+            # A request larger than the whole bucket is let through once the bucket is full.
+            need = min(tokens, self.tpm)
+            if self._tokens < need:
+                return (need - self._tokens) * 60.0 / self.tpm
+        return 0.0
+
+    def _refill(self, now: float):
+        if self.tpm <= 0:
+            return
+        self._tokens = min(float(self.tpm), self._tokens + (now - self._refilled_at) * self.tpm / 60.0)
+        self._refilled_at = now
+
+    def _check_circuit(self, now: float):
+        if now < self._open_until:
+            self.rejected += 1
+            raise CircuitOpenError(f"Model provider {self.key} is unavailable, retry in {self._open_until - now:.0f}s")
+        if self._failures >= self.failure_threshold:
+            # Half-open: let a single probe through.
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpenError(f"Model provider {self.key} is recovering")
+            self._probing = True
+
+    def _on_success(self, now: float, latency: float):
+        self._failures = 0
+        self._probing = False
+        self._samples += 1
+        if self._baseline is None:
+            self._baseline = latency
+        slow = self._samples > 10 and latency > self._baseline * self.latency_factor
+        self._baseline = 0.9 * self._baseline + 0.1 * latency
+        if slow:
+            self._decrease(now)
+        elif self.in_flight + 1 >= int(self.limit):
+            # Only grow while the current limit is actually used.
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _on_overload(self, now: float, count_failure: bool = True):
+        self._decrease(now)
+        if not count_failure:
+            return
+        self._failures += 1
+        if self._probing or self._failures >= self.failure_threshold:
+            self._probing = False
+            self._open_until = now + self.open_seconds
+            logging.warning(f"Circuit of model provider {self.key} opened for {self.open_seconds}s")
+            self._push_shared_state("open", self.open_seconds)
+
+    def _decrease(self, now: float):
+        # At most one multiplicative decrease per baseline latency, so that a burst of
+        # errors from the same overload doesn't collapse the limit to the floor.
+        if now - self._decreased_at < max(1.0, self._baseline or 0):
+            return
+        self._decreased_at = now
+        self.limit = max(self.min_limit, self.limit * 0.5)
+
+    def _redis_key(self, kind: str) -> str:
+        return "llm_limiter:{}:{}".format(hashlib.md5(self.key.encode("utf-8")).hexdigest(), kind)
+
+    def _push_shared_state(self, kind: str, seconds: float):
+        if not self.shared or seconds <= 0:
+            return
+        try:
+            from rag.utils.redis_conn import REDIS_CONN
+            REDIS_CONN.set(self._redis_key(kind), str(time.time() + seconds), int(seconds) + 1)
+        except Exception:
+            logging.exception("AdaptiveLimiter failed to publish shared state")
+
+    def _pull_shared_state(self, now: float):
+        if not self.shared or now - self._shared_checked_at < 1.0:
+            return
+        self._shared_checked_at = now
+        try:
+            from rag.utils.redis_conn import REDIS_CONN
+            for kind in ["backoff", "open"]:
+                until = REDIS_CONN.get(self._redis_key(kind))
+                if not until:
+                    continue
+                remaining = float(until) - time.time()
+                if remaining <= 0:
+                    continue
+                if kind == "backoff":
+                    self._backoff_until = max(self._backoff_until, now + remaining)
+                else:
+                    self._open_until = max(self._open_until, now + remaining)
+        except Exception:
+            logging.exception("AdaptiveLimiter failed to read shared state")
+
+
+_limiters: dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_key(llm_factory: str, api_base: str | None, llm_name: str | None) -> str:
+    """Self-hosted endpoints are keyed by URL (all models share the server); hosted APIs by model."""
+    if api_base:
+        return f"{llm_factory}@{api_base.rstrip('/')}"
+    return f"{llm_factory}/{llm_name}"
+
+
+def get_limiter(key: str, **kwargs) -> AdaptiveLimiter:
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = AdaptiveLimiter(key, **kwargs)
+        return _limiters[key]
+
+
+def limiter_metrics() -> dict:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {lmt.key: lmt.metrics() for lmt in limiters}
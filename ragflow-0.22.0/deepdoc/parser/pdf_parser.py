@@ -36,12 +36,15 @@ from pypdf import PdfReader as pdf2_read
 
 from common.file_utils import get_project_base_directory
 from common.misc_utils import pip_install_torch
+from deepdoc.parser.pdf_text_layer import TEXT_LAYER_FAST_PATH, is_text_layer_page, text_layer_boxes, text_layer_stats
 from deepdoc.vision import OCR, AscendLayoutRecognizer, LayoutRecognizer, Recognizer, TableStructureRecognizer
 from rag.app.picture import vision_llm_chunk as picture_vision_llm_chunk
 from rag.nlp import rag_tokenizer
 from rag.prompts.generator import vision_llm_describe_prompt
 from common import settings
 
+OCR_PAGE_CONCURRENCY = int(os.environ.get("OCR_PAGE_CONCURRENCY", "4"))
+
 LOCK_KEY_pdfplumber = "global_shared_lock_pdfplumber"
 if LOCK_KEY_pdfplumber not in sys.modules:
     sys.modules[LOCK_KEY_pdfplumber] = threading.Lock()
@@ -65,6 +68,9 @@ class RAGFlowPdfParser:
         self.parallel_limiter = None
         if settings.PARALLEL_DEVICES > 1:
             self.parallel_limiter = [trio.CapacityLimiter(1) for _ in range(settings.PARALLEL_DEVICES)]
+        elif OCR_PAGE_CONCURRENCY > 1:
+            # Pages OCRed at the same time get their detection/recognition batched together by the shared InferenceService.
+            self.parallel_limiter = [trio.CapacityLimiter(OCR_PAGE_CONCURRENCY)]
 
         layout_recognizer_type = os.getenv("LAYOUT_RECOGNIZER_TYPE", "onnx").lower()
         if layout_recognizer_type not in ["onnx", "ascend"]:
@@ -279,12 +285,20 @@ class RAGFlowPdfParser:
 
     def __ocr(self, pagenum, img, chars, ZM=3, device_id: int | None = None):
         start = timer()
+        if self.page_text_layer[pagenum - 1]:
+            bxs = Recognizer.sort_Y_firstly(text_layer_boxes(self.page_chars[pagenum - 1], pagenum), self.mean_height[pagenum - 1] / 3)
+            logging.info(f"__ocr page {pagenum} took {len(bxs)} boxes from the text layer ({timer() - start}s)")
+            if bxs and self.mean_height[pagenum - 1] == 0:
+                self.mean_height[pagenum - 1] = np.median([b["bottom"] - b["top"] for b in bxs])
+            self.boxes[pagenum - 1] = bxs
+            return
+
         bxs = self.ocr.detect(np.array(img), device_id)
         logging.info(f"__ocr detecting boxes of a image cost ({timer() - start}s)")
 
         start = timer()
         if not bxs:
-            self.boxes.append([])
+            self.boxes[pagenum - 1] = []
             return
         bxs = [(line[0], line[1][0]) for line in bxs]
         bxs = Recognizer.sort_Y_firstly(
@@ -340,7 +354,7 @@ class RAGFlowPdfParser:
         bxs = [b for b in bxs if b["text"]]
         if self.mean_height[pagenum - 1] == 0:
             self.mean_height[pagenum - 1] = np.median([b["bottom"] - b["top"] for b in bxs])
-        self.boxes.append(bxs)
+        self.boxes[pagenum - 1] = bxs
 
     def _layouts_rec(self, ZM, drop=True):
         assert len(self.page_images) == len(self.boxes)
@@ -1027,6 +1041,7 @@ class RAGFlowPdfParser:
         self.garbages = {}
         self.page_cum_height = [0]
         self.page_layout = []
+        self.page_text_layer = []
         self.page_from = page_from
         start = timer()
         try:
@@ -1041,6 +1056,16 @@ class RAGFlowPdfParser:
                         logging.warning(f"Failed to extract characters for pages {page_from}-{page_to}: {str(e)}")
                         self.page_chars = [[] for _ in range(page_to - page_from)]  # If failed to extract, using empty list instead.
 
+                    self.page_text_layer = [False] * len(self.page_images)
+                    if TEXT_LAYER_FAST_PATH:
+                        try:
+                            for i, page in enumerate(self.pdf.pages[page_from:page_to]):
+                                if i < len(self.page_chars):
+                                    stats = text_layer_stats(self.page_chars[i], page.width, page.height, page.images)
+                                    self.page_text_layer[i] = is_text_layer_page(stats)
+                        except Exception as e:
+                            logging.warning(f"Failed to classify text layers of pages {page_from}-{page_to}: {str(e)}")
+
                     self.total_page = len(self.pdf.pages)
 
         except Exception:
@@ -1109,12 +1134,13 @@ class RAGFlowPdfParser:
                 return chars
 
             if self.parallel_limiter:
+                devices = len(self.parallel_limiter)
                 async with trio.open_nursery() as nursery:
                     for i, img in enumerate(self.page_images):
                         chars = __ocr_preprocess()
 
-                        nursery.start_soon(__img_ocr, i, i % settings.PARALLEL_DEVICES, img, chars, self.parallel_limiter[i % settings.PARALLEL_DEVICES])
-                        await trio.sleep(0.1)
+                        nursery.start_soon(__img_ocr, i, i % devices, img, chars, self.parallel_limiter[i % devices])
+                        await trio.sleep(0.1 if devices > 1 else 0)
             else:
                 for i, img in enumerate(self.page_images):
                     chars = __ocr_preprocess()
@@ -1122,9 +1148,16 @@ class RAGFlowPdfParser:
 
         start = timer()
 
+        self.boxes = [[] for _ in self.page_images]
+        if len(self.page_text_layer) != len(self.page_images):
+            self.page_text_layer = [False] * len(self.page_images)
         trio.run(__img_ocr_launcher)
 
         logging.info(f"__images__ {len(self.page_images)} pages cost {timer() - start}s")
+        fast_pages = sum(self.page_text_layer)
+        logging.info(f"__images__ {fast_pages}/{len(self.page_images)} pages took the text layer instead of OCR")
+        if callback and fast_pages:
+            callback(msg=f"{fast_pages}/{len(self.page_images)} pages read from the PDF text layer, OCR skipped.")
 
         if not self.is_english and not any([c for c in self.page_chars]) and self.boxes:
             bxes = [b for bxs in self.boxes for b in bxs]
@@ -0,0 +1,118 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Fast path for born-digital PDF pages.
+
+When pdfplumber returns a complete character layer for a page, text boxes are built from
+the characters directly and OCR detection/recognition is skipped for that page. Layout and
+table structure recognition still run on the page image.
+"""
+
+import os
+import re
+import statistics
+
+TEXT_LAYER_FAST_PATH = os.environ.get("TEXT_LAYER_FAST_PATH", "1").lower() in ["1", "true"]
+TEXT_LAYER_MIN_CHARS = int(os.environ.get("TEXT_LAYER_MIN_CHARS", 32))
+TEXT_LAYER_MIN_COVERAGE = float(os.environ.get("TEXT_LAYER_MIN_COVERAGE", 0.003))
+TEXT_LAYER_MAX_CID_RATIO = float(os.environ.get("TEXT_LAYER_MAX_CID_RATIO", 0.01))
+TEXT_LAYER_MAX_ROTATED_RATIO = float(os.environ.get("TEXT_LAYER_MAX_ROTATED_RATIO", 0.1))
+TEXT_LAYER_MAX_IMAGE_COVERAGE = float(os.environ.get("TEXT_LAYER_MAX_IMAGE_COVERAGE", 0.3))
+
+_CID_PATTERN = re.compile(r"\(cid:[0-9]+\)|\ufffd")
+_NO_SPACE_PATTERN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+def _area(o, page_width, page_height):
+    x0, x1 = max(0, o["x0"]), min(page_width, o["x1"])
+    top, bottom = max(0, o["top"]), min(page_height, o["bottom"])
+    return max(0, x1 - x0) * max(0, bottom - top)
+
+
+def text_layer_stats(chars, page_width, page_height, images=()) -> dict:
+    """Char count, glyph coverage of the page area, unmapped CID / rotated glyph ratios and image coverage."""
+    page_area = max(1., page_width * page_height)
+    glyphs = [c for c in chars if c.get("text", "").strip()]
+    n = len(glyphs)
+    return {
+        "chars": n,
+        "coverage": sum([_area(c, page_width, page_height) for c in glyphs]) / page_area,
+        "cid_ratio": len([c for c in glyphs if _CID_PATTERN.search(c["text"])]) / n if n else 0.,
+        "rotated_ratio": len([c for c in glyphs if not c.get("upright", True)]) / n if n else 0.,
+        "image_coverage": min(1., sum([_area(im, page_width, page_height) for im in images]) / page_area),
+    }
+
+
+def is_text_layer_page(stats: dict) -> bool:
+    """
+    Whether the characters of a page can replace OCR: enough glyphs covering the page, almost
+    no unmapped CID glyphs or rotated text, and no large raster image that may hold text of its own.
+    """
+    return stats["chars"] >= TEXT_LAYER_MIN_CHARS \
+        and stats["coverage"] >= TEXT_LAYER_MIN_COVERAGE \
+        and stats["cid_ratio"] <= TEXT_LAYER_MAX_CID_RATIO \
+        and stats["rotated_ratio"] <= TEXT_LAYER_MAX_ROTATED_RATIO \
+        and stats["image_coverage"] <= TEXT_LAYER_MAX_IMAGE_COVERAGE
+
+
+def text_layer_boxes(chars, page_number, space_gap=0.2, box_gap=1.5) -> list[dict]:
+    """
+    Group the characters of a page into text boxes shaped like the ones `__ocr` produces.
+
+    Characters sharing a baseline form a line, and a line is cut into boxes where the
+    horizontal gap exceeds `box_gap` x the char height (columns, table cells). Inside a box
+    a space is inserted for an explicit space char, or a gap wider than `space_gap` x the
+    char height between non-CJK characters.
+    """
+    chars = sorted([c for c in chars if c.get("upright", True) and c.get("text")], key=lambda c: (c["bottom"], c["x0"]))
+    lines = []
+    for c in chars:
+        h = c["bottom"] - c["top"]
+        if lines and abs(c["bottom"] - lines[-1]["bottom"]) <= 0.3 * max(h, lines[-1]["height"]):
+            lines[-1]["chars"].append(c)
+            continue
+        lines.append({"bottom": c["bottom"], "height": h, "chars": [c]})
+
+    boxes = []
+    for ln in lines:
+        cs = sorted(ln["chars"], key=lambda c: c["x0"])
+        heights = [c["bottom"] - c["top"] for c in cs if c["text"].strip()]
+        if not heights:
+            continue
+        h = max(1., statistics.median(heights))
+        bx, space, last = None, False, None
+        for c in cs:
+            t = c["text"]
+            if not t.strip():
+                space = True
+                continue
+            if bx is not None and c["x0"] - last["x1"] > box_gap * h:
+                boxes.append(bx)
+                bx = None
+            if bx is None:
+                bx = {"x0": c["x0"], "x1": c["x1"], "top": c["top"], "bottom": c["bottom"], "text": "", "page_number": page_number}
+            elif space or (c["x0"] - last["x1"] > space_gap * h
+                           and not (_NO_SPACE_PATTERN.match(bx["text"][-1]) and _NO_SPACE_PATTERN.match(t[0]))):
+                bx["text"] += " "
+            bx["text"] += t.strip()
+            space = t != t.rstrip()
+            bx["x0"], bx["x1"] = min(bx["x0"], c["x0"]), max(bx["x1"], c["x1"])
+            bx["top"], bx["bottom"] = min(bx["top"], c["top"]), max(bx["bottom"], c["bottom"])
+            last = c
+        if bx is not None:
+            boxes.append(bx)
+    return boxes
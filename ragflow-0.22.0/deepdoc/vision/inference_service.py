@@ -0,0 +1,223 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+DEEPDOC_BATCHING = os.environ.get("DEEPDOC_BATCHING", "1").lower() in ["1", "true"]
+DEEPDOC_MAX_BATCH_SIZE = int(os.environ.get("DEEPDOC_MAX_BATCH_SIZE", 32))
+DEEPDOC_MAX_BATCH_WAIT_MS = float(os.environ.get("DEEPDOC_MAX_BATCH_WAIT_MS", 10))
+
+
+class _Request:
+    def __init__(self, inputs: dict, pad_axis: int | None):
+        self.inputs = inputs
+        self.size = next(iter(inputs.values())).shape[0]
+        self.key = tuple(sorted(
+            (nm, tuple(0 if i + 1 == pad_axis else d for i, d in enumerate(arr.shape[1:])), arr.dtype.str)
+            for nm, arr in inputs.items()
+        ))
+        self.width = next(iter(inputs.values())).shape[pad_axis] if pad_axis is not None else 0
+        self.future = None
+        self.taken = False
+        self.enqueued_at = time.monotonic()
+        self.deadline = self.enqueued_at
+
+
+class _Result(Future):
+    """The future of a request, run by the thread asking for its result."""
+
+    def __init__(self, service, req: _Request):
+        super().__init__()
+        self._service = service
+        self._req = req
+
+    def result(self, timeout=None):
+        if not self.done():
+            self._service._drive(self._req)
+        return super().result(timeout)
+
+    def exception(self, timeout=None):
+        if not self.done():
+            self._service._drive(self._req)
+        return super().exception(timeout)
+
+
+class InferenceService:
+    """
+    Process-local micro-batching front of one ONNX session.
+
+    Callers from any thread (pages of one document, or several documents parsed at once)
+    `submit` their input tensors and get a future back. The thread asking for a result
+    runs its request on the session itself, concatenated along the batch axis with the
+    queued requests of the same input signature, its own and other threads', up to
+    `max_batch_size` rows, and splits the outputs back. A request only waits, at most
+    `max_wait_ms`, when another thread recently submitted the same signature; otherwise
+    it runs right away, so inputs whose shape changes from call to call (detection) run
+    concurrently on their callers' threads as before. With `pad_axis`, requests that only
+    differ along that axis (text line width of the recognizer) are zero padded to the
+    widest one, which is what the recognizer already does inside one page.
+    """
+
+    def __init__(self, name: str, sess, run_options, batchable: bool = True, pad_axis: int | None = None,
+                 max_batch_size: int = DEEPDOC_MAX_BATCH_SIZE, max_wait_ms: float | int = DEEPDOC_MAX_BATCH_WAIT_MS):
+        self.name = name
+        self.sess = sess
+        self.run_options = run_options
+        self.batchable = batchable and DEEPDOC_BATCHING
+        self.pad_axis = pad_axis
+        self.max_batch_size = max(1, max_batch_size)
+        fixed_batch = sess.get_inputs()[0].shape[0]
+        if isinstance(fixed_batch, int) and fixed_batch > 0:
+            self.max_batch_size = min(self.max_batch_size, fixed_batch)
+        self.max_wait = max_wait_ms / 1000.
+
+        self._cond = threading.Condition()
+        self._pending = deque()
+        # Input signature -> {thread id: time of its last request}
+        self._submitters = {}
+        self.batches = 0
+        self.rows = 0
+
+    def submit(self, inputs: dict) -> Future:
+        if not self.batchable:
+            fut = Future()
+            try:
+                fut.set_result(self._run(inputs))
+            except Exception as e:
+                fut.set_exception(e)
+            return fut
+
+        req = _Request(inputs, self.pad_axis)
+        req.future = _Result(self, req)
+        with self._cond:
+            if self._partner_expected(req):
+                req.deadline += self.max_wait
+            self._pending.append(req)
+            self._cond.notify_all()
+        return req.future
+
+    def run(self, inputs: dict) -> list:
+        return self.submit(inputs).result()
+
+    def _run(self, inputs: dict) -> list:
+        for i in range(100000):
+            try:
+                return self.sess.run(None, inputs, self.run_options)
+            except Exception as e:
+                if i >= 3:
+                    raise e
+                time.sleep(5)
+
+    def _drive(self, req: _Request):
+        """Runs the batch of `req` on this thread, unless another thread has taken it."""
+        with self._cond:
+            while True:
+                if req.future.done():
+                    return
+                if req.taken:
+                    self._cond.wait()
+                    continue
+                batch = self._compatible(req)
+                remaining = req.deadline - time.monotonic()
+                if sum([r.size for r in batch]) >= self.max_batch_size or remaining <= 0:
+                    for r in batch:
+                        r.taken = True
+                        self._pending.remove(r)
+                    break
+                self._cond.wait(remaining)
+        try:
+            self._run_batch(batch)
+        except Exception as e:
+            logging.exception(f"InferenceService {self.name} got exception")
+            for r in batch:
+                if not r.future.done():
+                    r.future.set_exception(e)
+        finally:
+            with self._cond:
+                self._cond.notify_all()
+
+    def _partner_expected(self, req: _Request) -> bool:
+        # Whether another thread submitted the same signature within the last second.
+        now, tid = time.monotonic(), threading.get_ident()
+        for key in list(self._submitters.keys()):
+            threads = self._submitters[key]
+            for t in [t for t, at in threads.items() if now - at > 1.]:
+                del threads[t]
+            if not threads:
+                del self._submitters[key]
+        threads = self._submitters.setdefault(req.key, {})
+        expected = any([t != tid for t in threads])
+        threads[tid] = now
+        return expected
+
+    def _compatible(self, first: _Request) -> list[_Request]:
+        batch, size = [first], first.size
+        lo = hi = first.width
+        for r in self._pending:
+            if r is first or r.key != first.key or size + r.size > self.max_batch_size:
+                continue
+            # Don't let a short text line be padded to more than twice its width.
+            if self.pad_axis is not None and max(hi, r.width) > 2 * min(lo, r.width):
+                continue
+            batch.append(r)
+            size += r.size
+            lo, hi = min(lo, r.width), max(hi, r.width)
+        return batch
+
+    def _stack(self, batch: list[_Request]) -> dict:
+        inputs = {}
+        for nm in batch[0].inputs:
+            arrs = [r.inputs[nm] for r in batch]
+            if self.pad_axis is not None:
+                width = max([a.shape[self.pad_axis] for a in arrs])
+                padded = []
+                for a in arrs:
+                    if a.shape[self.pad_axis] < width:
+                        pad = [(0, 0)] * a.ndim
+                        pad[self.pad_axis] = (0, width - a.shape[self.pad_axis])
+                        a = np.pad(a, pad)
+                    padded.append(a)
+                arrs = padded
+            inputs[nm] = np.concatenate(arrs, axis=0)
+        return inputs
+
+    def _run_batch(self, batch: list[_Request]):
+        if len(batch) == 1:
+            batch[0].future.set_result(self._run(batch[0].inputs))
+            return
+
+        rows = sum([r.size for r in batch])
+        outputs = self._run(self._stack(batch))
+        if any([o.shape[0] != rows for o in outputs]):
+            # Outputs aren't batch-major (e.g. boxes after NMS), they can't be split back.
+            logging.warning(f"InferenceService {self.name}: outputs are not batch-major, batching disabled.")
+            self.batchable = False
+            for r in batch:
+                r.future.set_result(self._run(r.inputs))
+            return
+
+        self.batches += 1
+        self.rows += rows
+        offset = 0
+        for r in batch:
+            r.future.set_result([o[offset: offset + r.size] for o in outputs])
+            offset += r.size
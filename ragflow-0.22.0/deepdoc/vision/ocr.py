@@ -32,8 +32,10 @@ import cv2
 import onnxruntime as ort
 
 from .postprocess import build_post_process
+from .inference_service import InferenceService
 
 loaded_models = {}
+inference_services = {}
 
 def transform(data, ops=None):
     """ transform """
@@ -95,9 +97,12 @@ def load_model(model_dir, nm, device_id: int | None = None):
 
     options = ort.SessionOptions()
     options.enable_cpu_mem_arena = False
-    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
-    options.intra_op_num_threads = 2
-    options.inter_op_num_threads = 2
+    if os.environ.get("OCR_EXECUTION_MODE", "sequential").lower() == "parallel":
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    else:
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = int(os.environ.get("OCR_INTRA_OP_NUM_THREADS", "2"))
+    options.inter_op_num_threads = int(os.environ.get("OCR_INTER_OP_NUM_THREADS", "2"))
 
     # https://github.com/microsoft/onnxruntime/issues/9509#issuecomment-951546580
     # Shrink GPU memory after execution
@@ -131,6 +136,18 @@ def load_model(model_dir, nm, device_id: int | None = None):
     return loaded_model
 
 
+def load_service(model_dir, nm, device_id: int | None = None, **kwargs) -> InferenceService:
+    """The micro-batching InferenceService shared by every caller of the model in this process."""
+    model_file_path = os.path.join(model_dir, nm + ".onnx")
+    model_cached_tag = model_file_path + str(device_id) if device_id is not None else model_file_path
+    service = inference_services.get(model_cached_tag)
+    if service:
+        return service
+    sess, run_options = load_model(model_dir, nm, device_id)
+    service = inference_services.setdefault(model_cached_tag, InferenceService(nm, sess, run_options, **kwargs))
+    return service
+
+
 class TextRecognizer:
     def __init__(self, model_dir, device_id: int | None = None):
         self.rec_image_shape = [int(v) for v in "3, 48, 320".split(",")]
@@ -141,7 +158,8 @@ class TextRecognizer:
             "use_space_char": True
         }
         self.postprocess_op = build_post_process(postprocess_params)
-        self.predictor, self.run_options = load_model(model_dir, 'rec', device_id)
+        self.service = load_service(model_dir, 'rec', device_id, pad_axis=3)
+        self.predictor, self.run_options = self.service.sess, self.service.run_options
         self.input_tensor = self.predictor.get_inputs()[0]
 
     def resize_norm_img(self, img, max_wh_ratio):
@@ -373,6 +391,7 @@ class TextRecognizer:
         batch_num = self.rec_batch_num
         st = time.time()
 
+        futures = []
         for beg_img_no in range(0, img_num, batch_num):
             end_img_no = min(img_num, beg_img_no + batch_num)
             norm_img_batch = []
@@ -393,15 +412,10 @@ class TextRecognizer:
 
             input_dict = {}
             input_dict[self.input_tensor.name] = norm_img_batch
-            for i in range(100000):
-                try:
-                    outputs = self.predictor.run(None, input_dict, self.run_options)
-                    break
-                except Exception as e:
-                    if i >= 3:
-                        raise e
-                    time.sleep(5)
-            preds = outputs[0]
+            futures.append((beg_img_no, self.service.submit(input_dict)))
+
+        for beg_img_no, fut in futures:
+            preds = fut.result()[0]
             rec_result = self.postprocess_op(preds)
             for rno in range(len(rec_result)):
                 rec_res[indices[beg_img_no + rno]] = rec_result[rno]
@@ -437,7 +451,8 @@ class TextDetector:
                               "unclip_ratio": 1.5, "use_dilation": False, "score_mode": "fast", "box_type": "quad"}
 
         self.postprocess_op = build_post_process(postprocess_params)
-        self.predictor, self.run_options = load_model(model_dir, 'det', device_id)
+        self.service = load_service(model_dir, 'det', device_id)
+        self.predictor, self.run_options = self.service.sess, self.service.run_options
         self.input_tensor = self.predictor.get_inputs()[0]
 
         img_h, img_w = self.input_tensor.shape[2:]
@@ -515,14 +530,7 @@ class TextDetector:
         img = img.copy()
         input_dict = {}
         input_dict[self.input_tensor.name] = img
-        for i in range(100000):
-            try:
-                outputs = self.predictor.run(None, input_dict, self.run_options)
-                break
-            except Exception as e:
-                if i >= 3:
-                    raise e
-                time.sleep(5)
+        outputs = self.service.run(input_dict)
 
         post_result = self.postprocess_op({"maps": outputs[0]}, shape_list)
         dt_boxes = post_result[0]['points']
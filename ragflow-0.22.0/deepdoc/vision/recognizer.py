@@ -26,7 +26,7 @@ from common.file_utils import get_project_base_directory
 from .operators import *  # noqa: F403
 from .operators import preprocess
 from . import operators
-from .ocr import load_model
+from .ocr import load_service
 
 class Recognizer:
     def __init__(self, label_list, task_name, model_dir=None):
@@ -45,8 +45,11 @@ class Recognizer:
             model_dir = os.path.join(
                         get_project_base_directory(),
                         "rag/res/deepdoc")
-        self.ort_sess, self.run_options = load_model(model_dir, task_name)
+        self.service = load_service(model_dir, task_name)
+        self.ort_sess, self.run_options = self.service.sess, self.service.run_options
         self.input_names = [node.name for node in self.ort_sess.get_inputs()]
+        # Models taking a scale_factor input end with NMS, their outputs can't be split per image.
+        self.service.batchable = self.service.batchable and "scale_factor" not in self.input_names
         self.output_names = [node.name for node in self.ort_sess.get_outputs()]
         self.input_shape = self.ort_sess.get_inputs()[0].shape[2:4]
         self.label_list = label_list
@@ -428,8 +431,9 @@ class Recognizer:
             batch_image_list = images[start_index:end_index]
             inputs = self.preprocess(batch_image_list)
             logging.debug("preprocess")
-            for ins in inputs:
-                bb = self.postprocess(self.ort_sess.run(None, {k:v for k,v in ins.items() if k in self.input_names}, self.run_options)[0], ins, thr)
+            futures = [self.service.submit({k:v for k,v in ins.items() if k in self.input_names}) for ins in inputs]
+            for ins, fut in zip(inputs, futures):
+                bb = self.postprocess(fut.result()[0], ins, thr)
                 res.append(bb)
 
         #seeit.save_results(image_list, res, self.label_list, threshold=thr)
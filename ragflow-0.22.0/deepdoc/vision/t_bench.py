@@ -0,0 +1,106 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+CPU benchmark of deepdoc OCR + layout, in pages/sec.
+
+The "sequential" run is the former path: one page at a time, no cross-page batching.
+The other runs OCR `--concurrency` pages at once with the shared InferenceService batching
+detection, recognition and layout requests of different pages together.
+
+    python deepdoc/vision/t_bench.py --inputs ./sample_pdfs --concurrency 4,8
+"""
+
+import os
+import sys
+sys.path.insert(
+    0,
+    os.path.abspath(
+        os.path.join(
+            os.path.dirname(
+                os.path.abspath(__file__)),
+            '../../')))
+
+os.environ['CUDA_VISIBLE_DEVICES'] = ''  # cpu
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from deepdoc.vision import OCR, LayoutRecognizer, init_in_out
+from deepdoc.vision.ocr import inference_services
+
+
+def set_batching(enabled, batchable):
+    for tag, service in inference_services.items():
+        service.batchable = enabled and batchable[tag]
+
+
+def bench(ocr, layouter, images, concurrency):
+    def page(img):
+        ocr(np.array(img))
+        layouter.forward([np.array(img)])
+
+    start = time.time()
+    if concurrency <= 1:
+        for img in images:
+            page(img)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(page, images))
+    return len(images) / (time.time() - start)
+
+
+def main(args):
+    ocr = OCR()
+    layouter = LayoutRecognizer("layout")
+    images, _ = init_in_out(args)
+    if not images:
+        print("No pages found in {}".format(args.inputs))
+        return
+
+    # Warm up the sessions so that model loading isn't measured.
+    bench(ocr, layouter, images[:1], 1)
+    batchable = {tag: service.batchable for tag, service in inference_services.items()}
+
+    set_batching(False, batchable)
+    baseline = bench(ocr, layouter, images, 1)
+    print("sequential, no batching: {:.2f} pages/s".format(baseline))
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        set_batching(False, batchable)
+        unbatched = bench(ocr, layouter, images, concurrency)
+        set_batching(True, batchable)
+        batched = bench(ocr, layouter, images, concurrency)
+        print("concurrency {}: {:.2f} pages/s without batching, {:.2f} pages/s with batching ({:.2f}x)".format(
+            concurrency, unbatched, batched, batched / baseline))
+    for name, service in inference_services.items():
+        if service.batches:
+            print("{}: {} batches, {:.1f} rows/batch".format(name, service.batches, service.rows / service.batches))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--inputs',
+                        help="Directory where to store images or PDFs, or a file path to a single image or PDF",
+                        required=True)
+    parser.add_argument('--output_dir', help="Directory where init_in_out stores outputs. Default: './bench_outputs'",
+                        default="./bench_outputs")
+    parser.add_argument('--concurrency', help="Comma separated numbers of pages processed at once. Default: '4,8'",
+                        default="4,8")
+    args = parser.parse_args()
+    main(args)
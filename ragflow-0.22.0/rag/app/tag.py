@@ -122,6 +122,10 @@ def chunk(filename, binary=None, lang="Chinese", callback=None, **kwargs):
         "Excel, csv(txt) format files are supported.")
 
 
+# The tenant of a KB never changes, so tag KB -> tenant lookups are kept for the process lifetime.
+TAG_KB_TENANTS = {}
+
+
 def label_question(question, kbs):
     from api.db.services.knowledgebase_service import KnowledgebaseService
     from graphrag.utils import get_tags_from_cache, set_tags_to_cache
@@ -137,11 +141,15 @@ def label_question(question, kbs):
             set_tags_to_cache(tags=all_tags, kb_ids=tag_kb_ids)
         else:
             all_tags = json.loads(all_tags)
-        tag_kbs = KnowledgebaseService.get_by_ids(tag_kb_ids)
-        if not tag_kbs:
+        missing = [kb_id for kb_id in tag_kb_ids if kb_id not in TAG_KB_TENANTS]
+        if missing:
+            for tag_kb in KnowledgebaseService.get_by_ids(missing):
+                TAG_KB_TENANTS[tag_kb.id] = tag_kb.tenant_id
+        tenant_ids = list(set([TAG_KB_TENANTS[kb_id] for kb_id in tag_kb_ids if kb_id in TAG_KB_TENANTS]))
+        if not tenant_ids:
             return tags
         tags = settings.retriever.tag_query(question,
-                                              list(set([kb.tenant_id for kb in tag_kbs])),
+                                              tenant_ids,
                                               tag_kb_ids,
                                               all_tags,
                                               kb.parser_config.get("topn_tags", 3)
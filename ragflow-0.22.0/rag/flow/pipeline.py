@@ -17,11 +17,11 @@ import datetime
 import json
 import logging
 import random
-from timeit import default_timer as timer
 import trio
 from agent.canvas import Graph
 from api.db.services.document_service import DocumentService
 from api.db.services.task_service import has_canceled, TaskService, CANVAS_DEBUG_DOC_ID
+from rag.flow.pipeline_log import PipelineLog, pipeline_log_key
 from rag.utils.redis_conn import REDIS_CONN
 
 
@@ -35,6 +35,7 @@ class Pipeline(Graph):
         self._doc_id = doc_id
         self._flow_id = flow_id
         self._kb_id = None
+        self._log = PipelineLog(REDIS_CONN, pipeline_log_key(flow_id, self.task_id), len(self.components))
         if self._doc_id:
             self._kb_id = DocumentService.get_knowledgebase_id(doc_id)
             if not self._kb_id:
@@ -42,82 +43,39 @@ class Pipeline(Graph):
 
     def callback(self, component_name: str, progress: float | int | None = None, message: str = "") -> None:
         from common.exceptions import TaskCanceledException
-        log_key = f"{self._flow_id}-{self.task_id}-logs"
-        timestamp = timer()
-        if has_canceled(self.task_id):
+        canceled = has_canceled(self.task_id)
+        if canceled:
             progress = -1
             message += "[CANCEL]"
         try:
-            bin = REDIS_CONN.get(log_key)
-            obj = json.loads(bin.encode("utf-8"))
-            if obj:
-                if obj[-1]["component_id"] == component_name:
-                    obj[-1]["trace"].append(
-                        {
-                            "progress": progress,
-                            "message": message,
-                            "datetime": datetime.datetime.now().strftime("%H:%M:%S"),
-                            "timestamp": timestamp,
-                            "elapsed_time": timestamp - obj[-1]["trace"][-1]["timestamp"],
-                        }
-                    )
-                else:
-                    obj.append(
-                        {
-                            "component_id": component_name,
-                            "trace": [{"progress": progress, "message": message, "datetime": datetime.datetime.now().strftime("%H:%M:%S"), "timestamp": timestamp, "elapsed_time": 0}],
-                        }
-                    )
-            else:
-                obj = [
-                    {
-                        "component_id": component_name,
-                        "trace": [{"progress": progress, "message": message, "datetime": datetime.datetime.now().strftime("%H:%M:%S"), "timestamp": timestamp, "elapsed_time": 0}],
-                    }
-                ]
+            extra = {}
+            if component_name == "END" and not self._doc_id:
+                extra["dsl"] = json.loads(str(self))
+            finished, first = self._log.append(component_name, progress, message, **extra)
             if component_name != "END" and self._doc_id and self.task_id:
-                percentage = 1.0 / len(self.components.items())
-                finished = 0.0
-                for o in obj:
-                    for t in o["trace"]:
-                        if t["progress"] < 0:
-                            finished = -1
-                            break
-                    if finished < 0:
-                        break
-                    finished += o["trace"][-1]["progress"] * percentage
-
                 msg = ""
-                if len(obj[-1]["trace"]) == 1:
-                    msg += f"\n-------------------------------------\n[{self.get_component_name(o['component_id'])}]:\n"
-                t = obj[-1]["trace"][-1]
-                msg += "%s: %s\n" % (t["datetime"], t["message"])
+                if first:
+                    msg += f"\n-------------------------------------\n[{self.get_component_name(component_name)}]:\n"
+                msg += "%s: %s\n" % (datetime.datetime.now().strftime("%H:%M:%S"), message)
                 TaskService.update_progress(self.task_id, {"progress": finished, "progress_msg": msg})
-            elif component_name == "END" and not self._doc_id:
-                obj[-1]["trace"][-1]["dsl"] = json.loads(str(self))
-            REDIS_CONN.set_obj(log_key, obj, 60 * 30)
 
         except Exception as e:
             logging.exception(e)
 
-        if has_canceled(self.task_id):
+        if canceled:
             raise TaskCanceledException(message)
 
     def fetch_logs(self):
-        log_key = f"{self._flow_id}-{self.task_id}-logs"
         try:
-            bin = REDIS_CONN.get(log_key)
-            if bin:
-                return json.loads(bin.encode("utf-8"))
+            return self._log.fetch()
         except Exception as e:
             logging.exception(e)
         return []
 
 
     async def run(self, **kwargs):
-        log_key = f"{self._flow_id}-{self.task_id}-logs"
         try:
-            REDIS_CONN.set_obj(log_key, [], 60 * 10)
+            self._log.reset()
         except Exception as e:
             logging.exception(e)
         self.error = ""
@@ -0,0 +1,100 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import datetime
+import os
+import threading
+from timeit import default_timer as timer
+
+PIPELINE_LOG_MAX_EVENTS = int(os.environ.get("PIPELINE_LOG_MAX_EVENTS", 10000))
+PIPELINE_LOG_EXPIRE = 60 * 30
+
+
+def pipeline_log_key(flow_id, task_id) -> str:
+    return f"{flow_id}-{task_id}-log-events"
+
+
+def fold_logs(events: list[dict]) -> list[dict]:
+    """
+    The trace of a pipeline run from its events: consecutive events of the same component
+    make one entry, [{"component_id": ..., "trace": [{"progress", "message", "datetime",
+    "timestamp", "elapsed_time"}, ...]}, ...].
+    """
+    logs = []
+    for e in events:
+        t = {k: v for k, v in e.items() if k != "component_id"}
+        if logs and logs[-1]["component_id"] == e["component_id"]:
+            t["elapsed_time"] = t["timestamp"] - logs[-1]["trace"][-1]["timestamp"]
+            logs[-1]["trace"].append(t)
+        else:
+            t["elapsed_time"] = 0
+            logs.append({"component_id": e["component_id"], "trace": [t]})
+    return logs
+
+
+class PipelineLog:
+    """
+    Progress events of a pipeline run, appended one by one to a capped Redis list, so that an
+    event costs a single RPUSH whatever the length of the trace and concurrent callbacks can't
+    overwrite each other. The overall progress is kept in memory by the writer.
+    """
+
+    def __init__(self, redis_conn, key: str, n_components: int,
+                 max_events: int = PIPELINE_LOG_MAX_EVENTS, exp: int = PIPELINE_LOG_EXPIRE):
+        self._redis = redis_conn
+        self.key = key
+        self._percentage = 1.0 / max(1, n_components)
+        self._max_events = max_events
+        self._exp = exp
+        self._lock = threading.Lock()
+        # [component_id, last progress] of every run of consecutive events of a component.
+        self._runs = []
+        self._failed = False
+
+    def reset(self):
+        with self._lock:
+            self._runs = []
+            self._failed = False
+        self._redis.delete(self.key)
+
+    def append(self, component_id: str, progress: float | int | None, message: str, **extra) -> tuple[float | int, bool]:
+        """
+        Log an event. Returns the overall progress, -1 once a component failed, and whether
+        the event is the first of a run of its component.
+        """
+        event = {
+            "component_id": component_id,
+            "progress": progress,
+            "message": message,
+            "datetime": datetime.datetime.now().strftime("%H:%M:%S"),
+            "timestamp": timer(),
+        }
+        event.update(extra)
+        with self._lock:
+            first = not self._runs or self._runs[-1][0] != component_id
+            if first:
+                self._runs.append([component_id, progress])
+            else:
+                self._runs[-1][1] = progress
+            self._failed = self._failed or (progress is not None and progress < 0)
+            if self._failed:
+                finished = -1
+            else:
+                finished = sum([(p or 0) * self._percentage for _, p in self._runs])
+            self._redis.rpush_obj(self.key, event, self._max_events, self._exp)
+        return finished, first
+
+    def fetch(self) -> list[dict]:
+        return fold_logs(self._redis.lrange_obj(self.key))
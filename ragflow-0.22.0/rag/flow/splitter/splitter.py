@@ -15,10 +15,8 @@
 import random
 from functools import partial
 
-import trio
-
 from common.misc_utils import get_uuid
-from rag.utils.base64_image import id2image, image2id
+from rag.utils.base64_image import id2image, images2ids
 from deepdoc.parser.pdf_parser import RAGFlowPdfParser
 from rag.flow.base import ProcessBase, ProcessParamBase
 from rag.flow.splitter.schema import SplitterFromUpstream
@@ -104,8 +102,6 @@ class Splitter(ProcessBase):
             }
             for c, img in zip(chunks, images) if c.strip()
         ]
-        async with trio.open_nursery() as nursery:
-            for d in cks:
-                nursery.start_soon(image2id, d, partial(settings.STORAGE_IMPL.put, tenant_id=self._canvas._tenant_id), get_uuid())
+        await images2ids(cks, partial(settings.STORAGE_IMPL.put, tenant_id=self._canvas._tenant_id), [get_uuid() for _ in cks])
         self.set_output("chunks",  cks)
         self.callback(1, "Done.")
@@ -36,6 +36,7 @@ from zhipuai import ZhipuAI
 
 from rag.llm import FACTORY_DEFAULT_BASE_URL, LITELLM_PROVIDER_PREFIX, SupportedLiteLLMProvider
 from rag.nlp import is_chinese, is_english
+from common.llm_limiter import released
 from common.token_utils import num_tokens_from_string, total_token_count_from_response
 
 
@@ -81,6 +82,8 @@ class Base(ABC):
         self.is_tools = False
         self.tools = []
         self.toolcall_sessions = {}
+        # Set by LLMBundle: the provider's AdaptiveLimiter, whose backoff is shared by all callers.
+        self.limiter = None
 
     def _get_delay(self):
         """Calculate retry delay time"""
@@ -229,7 +232,10 @@ class Base(ABC):
         if self._should_retry(error_code):
             delay = self._get_delay()
             logging.warning(f"Error: {error_code}. Retrying in {delay:.2f} seconds... (Attempt {attempt + 1}/{self.max_retries})")
-            time.sleep(delay)
+            if getattr(self, "limiter", None):
+                self.limiter.backoff(delay)
+            else:
+                time.sleep(delay)
             return None
 
         return f"{ERROR_PREFIX}: {error_code} - {str(e)}"
@@ -302,7 +308,8 @@ class Base(ABC):
                         name = tool_call.function.name
                         try:
                             args = json_repair.loads(tool_call.function.arguments)
-                            tool_response = self.toolcall_session.tool_call(name, args)
+                            with released():
+                                tool_response = self.toolcall_session.tool_call(name, args)
                             history = self._append_history(history, tool_call, tool_response)
                             ans += self._verbose_tool_use(name, args, tool_response)
                         except Exception as e:
@@ -420,7 +427,8 @@ class Base(ABC):
                         try:
                             args = json_repair.loads(tool_call.function.arguments)
                             yield self._verbose_tool_use(name, args, "Begin to call...")
-                            tool_response = self.toolcall_session.tool_call(name, args)
+                            with released():
+                                tool_response = self.toolcall_session.tool_call(name, args)
                             history = self._append_history(history, tool_call, tool_response)
                             yield self._verbose_tool_use(name, args, tool_response)
                         except Exception as e:
@@ -1418,6 +1426,8 @@ class LiteLLMBase(ABC):
         self.is_tools = False
         self.tools = []
         self.toolcall_sessions = {}
+        # Set by LLMBundle: the provider's AdaptiveLimiter, whose backoff is shared by all callers.
+        self.limiter = None
 
         # Factory specific fields
         if self.provider == SupportedLiteLLMProvider.Bedrock:
@@ -1549,7 +1559,10 @@ class LiteLLMBase(ABC):
         if self._should_retry(error_code):
             delay = self._get_delay()
             logging.warning(f"Error: {error_code}. Retrying in {delay:.2f} seconds... (Attempt {attempt + 1}/{self.max_retries})")
-            time.sleep(delay)
+            if getattr(self, "limiter", None):
+                self.limiter.backoff(delay)
+            else:
+                time.sleep(delay)
             return None
 
         return f"{ERROR_PREFIX}: {error_code} - {str(e)}"
@@ -1684,7 +1697,8 @@ class LiteLLMBase(ABC):
                         name = tool_call.function.name
                         try:
                             args = json_repair.loads(tool_call.function.arguments)
-                            tool_response = self.toolcall_session.tool_call(name, args)
+                            with released():
+                                tool_response = self.toolcall_session.tool_call(name, args)
                             history = self._append_history(history, tool_call, tool_response)
                             ans += self._verbose_tool_use(name, args, tool_response)
                         except Exception as e:
@@ -1815,7 +1829,8 @@ class LiteLLMBase(ABC):
                         try:
                             args = json_repair.loads(tool_call.function.arguments)
                             yield self._verbose_tool_use(name, args, "Begin to call...")
-                            tool_response = self.toolcall_session.tool_call(name, args)
+                            with released():
+                                tool_response = self.toolcall_session.tool_call(name, args)
                             history = self._append_history(history, tool_call, tool_response)
                             yield self._verbose_tool_use(name, args, tool_response)
                         except Exception as e:
@@ -14,7 +14,9 @@
 #  limitations under the License.
 #
 import json
+import os
 from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
 
 import httpx
@@ -25,6 +27,8 @@ from yarl import URL
 from common.log_utils import log_exception
 from common.token_utils import num_tokens_from_string, truncate, total_token_count_from_response
 
+HUGGINGFACE_RERANK_CONCURRENCY = int(os.environ.get("HUGGINGFACE_RERANK_CONCURRENCY", 4))
+
 class Base(ABC):
     def __init__(self, key, model_name, **kwargs):
         """
@@ -382,19 +386,27 @@ class QWenRerank(Base):
 
 class HuggingfaceRerank(Base):
     _FACTORY_NAME = "HuggingFace"
+    # Batches go out concurrently over keep-alive connections shared by all the instances.
+    _session = requests.Session()
+    _session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=HUGGINGFACE_RERANK_CONCURRENCY))
+    _executor = ThreadPoolExecutor(max_workers=HUGGINGFACE_RERANK_CONCURRENCY, thread_name_prefix="huggingface_rerank")
 
     @staticmethod
     def post(query: str, texts: list, url="127.0.0.1"):
         exc = None
         scores = [0 for _ in range(len(texts))]
         batch_size = 8
-        for i in range(0, len(texts), batch_size):
-            try:
-                res = requests.post(
-                    f"http://{url}/rerank", headers={"Content-Type": "application/json"}, json={"query": query, "texts": texts[i : i + batch_size], "raw_scores": False, "truncate": True}
-                )
 
-                for o in res.json():
+        def rerank_batch(i):
+            res = HuggingfaceRerank._session.post(
+                f"http://{url}/rerank", headers={"Content-Type": "application/json"}, json={"query": query, "texts": texts[i : i + batch_size], "raw_scores": False, "truncate": True}
+            )
+            return res.json()
+
+        futures = [(i, HuggingfaceRerank._executor.submit(rerank_batch, i)) for i in range(0, len(texts), batch_size)]
+        for i, future in futures:
+            try:
+                for o in future.result():
                     scores[o["index"] + i] = o["score"]
             except Exception as e:
                 exc = e
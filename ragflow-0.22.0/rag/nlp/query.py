@@ -16,17 +16,34 @@
 
 import logging
 import json
+import os
 import re
-from collections import defaultdict
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
 
 from rag.utils.doc_store_conn import MatchTextExpr
 from rag.nlp import rag_tokenizer, term_weight, synonym
 
+QUERY_ANALYSIS_CACHE_SIZE = int(os.environ.get("QUERY_ANALYSIS_CACHE_SIZE", 1024))
+
+
+@dataclass(frozen=True)
+class QueryAnalysis:
+    """Tokenization, term weighting and synonym expansion of a question, independent of min_match."""
+    text: str
+    query: str | None
+    keywords: tuple
+    weighted_terms: tuple
+    relaxable: bool
+
 
 class FulltextQueryer:
     def __init__(self):
         self.tw = term_weight.Dealer()
         self.syn = synonym.Dealer()
+        self._analyses = OrderedDict()
+        self._analyses_lock = threading.Lock()
         self.query_fields = [
             "title_tks^10",
             "title_sm_tks^5",
@@ -83,12 +100,44 @@ class FulltextQueryer:
         return txt
 
     def question(self, txt, tbl="qa", min_match: float = 0.6):
+        return self.match_expr(self.analyze(txt), min_match)
+
+    def match_expr(self, analysis: QueryAnalysis, min_match: float | int = 0.6):
+        """Build the match expression of an analysed question for `min_match`, without tokenizing it again."""
+        if analysis.query is None:
+            return None, list(analysis.keywords)
+        extra_options = {"minimum_should_match": min_match} if analysis.relaxable else {}
+        return MatchTextExpr(self.query_fields, analysis.query, 100, extra_options), list(analysis.keywords)
+
+    @staticmethod
+    def normalize(txt):
         txt = FulltextQueryer.add_space_between_eng_zh(txt)
-        txt = re.sub(
+        return re.sub(
             r"[ :|\r\n\t,，。？?/`!！&^%%()\[\]{}<>]+",
             " ",
             rag_tokenizer.tradi2simp(rag_tokenizer.strQ2B(txt.lower())),
         ).strip()
+
+    def analyze(self, txt) -> QueryAnalysis:
+        """The analysis of a question, memoized by normalized text and synonym dictionary version."""
+        txt = FulltextQueryer.normalize(txt)
+        # Cache hits don't look synonyms up, so count them here to keep the Redis synonyms reloading.
+        self.syn.lookup_num += 1
+        self.syn.load()
+        key = (txt, self.syn.version)
+        with self._analyses_lock:
+            analysis = self._analyses.get(key)
+            if analysis is not None:
+                self._analyses.move_to_end(key)
+                return analysis
+        analysis = self._analyze(txt)
+        with self._analyses_lock:
+            self._analyses[key] = analysis
+            while len(self._analyses) > QUERY_ANALYSIS_CACHE_SIZE:
+                self._analyses.popitem(last=False)
+        return analysis
+
+    def _analyze(self, txt) -> QueryAnalysis:
         otxt = txt
         txt = FulltextQueryer.rmWWW(txt)
 
@@ -126,9 +175,7 @@ class FulltextQueryer:
             if not q:
                 q.append(txt)
             query = " ".join(q)
-            return MatchTextExpr(
-                self.query_fields, query, 100
-            ), keywords
+            return QueryAnalysis(otxt, query, tuple(keywords), tuple(tks_w), False)
 
         def need_fine_grained_tokenize(tk):
             if len(tk) < 3:
@@ -138,12 +185,13 @@ class FulltextQueryer:
             return True
 
         txt = FulltextQueryer.rmWWW(txt)
-        qs, keywords = [], []
+        qs, keywords, weighted_terms = [], [], []
         for tt in self.tw.split(txt)[:256]:  # .split():
             if not tt:
                 continue
             keywords.append(tt)
             twts = self.tw.weights([tt])
+            weighted_terms.extend(twts)
             syns = self.syn.lookup(tt)
             if syns and len(keywords) < 32:
                 keywords.extend(syns)
@@ -207,14 +255,12 @@ class FulltextQueryer:
 
             qs.append(tms)
 
+        query = None
         if qs:
             query = " OR ".join([f"({t})" for t in qs if t])
             if not query:
                 query = otxt
-            return MatchTextExpr(
-                self.query_fields, query, 100, {"minimum_should_match": min_match}
-            ), keywords
-        return None, keywords
+        return QueryAnalysis(otxt, query, tuple(keywords), tuple(weighted_terms), True)
 
     def hybrid_similarity(self, avec, bvecs, atks, btkss, tkweight=0.3, vtweight=0.7):
         from sklearn.metrics.pairwise import cosine_similarity as CosineSimilarity
@@ -236,8 +282,15 @@ class FulltextQueryer:
                 d[t] += c
             return d
 
+        def toSet(tks):
+            if isinstance(tks, str):
+                tks = tks.split()
+            return set(tks)
+
         atks = toDict(atks)
-        btkss = [toDict(tks) for tks in btkss]
+        # `similarity` only checks which query terms a candidate contains, the candidate's own
+        # term weights never contribute, so they aren't computed for every candidate.
+        btkss = [toSet(tks) for tks in btkss]
         return [self.similarity(atks, btks) for btks in btkss]
 
     def similarity(self, qtwt, dtwt):
@@ -0,0 +1,76 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+RERANK_CACHE_SIZE = int(os.environ.get("RERANK_CACHE_SIZE", 100000))
+
+
+def _digest(text: str) -> str:
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def _model_key(rerank_mdl) -> tuple:
+    return (
+        type(rerank_mdl).__name__,
+        getattr(rerank_mdl, "tenant_id", ""),
+        getattr(rerank_mdl, "llm_name", "") or getattr(rerank_mdl, "model_name", ""),
+    )
+
+
+class RerankScoreCache:
+    """
+    LRU of rerank model scores by (model, query, chunk id, chunk content).
+
+    Pagination and follow-up questions send the same (query, chunk) pairs to the rerank model
+    over and over; only the pairs not seen yet are sent, in a single `similarity` call.
+    """
+
+    def __init__(self, max_size: int = RERANK_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._scores = OrderedDict()
+
+    def similarity(self, rerank_mdl, query: str, chunk_ids: list[str], texts: list[str]) -> tuple[np.ndarray, int]:
+        """rerank_mdl.similarity(query, texts) for chunks `chunk_ids`, served from the cache where possible."""
+        model, q = _model_key(rerank_mdl), _digest(query)
+        keys = [(model, q, chunk_id, _digest(text)) for chunk_id, text in zip(chunk_ids, texts)]
+        scores = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    scores[i] = self._scores[key]
+
+        misses = [i for i, score in enumerate(scores) if score is None]
+        used_tokens = 0
+        if misses:
+            sim, used_tokens = rerank_mdl.similarity(query, [texts[i] for i in misses])
+            with self._lock:
+                for i, score in zip(misses, sim):
+                    scores[i] = float(score)
+                    self._scores[keys[i]] = scores[i]
+                while len(self._scores) > self.max_size:
+                    self._scores.popitem(last=False)
+        return np.array(scores), used_tokens
+
+    def clear(self):
+        with self._lock:
+            self._scores.clear()
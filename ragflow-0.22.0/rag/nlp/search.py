@@ -19,10 +19,13 @@ import re
 import math
 import os
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 
 from rag.prompts.generator import relevant_chunks_with_toc
 from rag.nlp import rag_tokenizer, query
+from rag.nlp.tag_feature import TagFeatureIndex
+from rag.nlp.rerank_cache import RerankScoreCache
 import numpy as np
 from rag.utils.doc_store_conn import DocStoreConnection, MatchDenseExpr, FusionExpr, OrderByExpr
 from common.string_utils import remove_redundant_spaces
@@ -37,6 +40,8 @@ class Dealer:
     def __init__(self, dataStore: DocStoreConnection):
         self.qryr = query.FulltextQueryer()
         self.dataStore = dataStore
+        self.tag_index = TagFeatureIndex(self)
+        self.rerank_cache = RerankScoreCache()
 
     @dataclass
     class SearchResult:
@@ -110,7 +115,8 @@ class Dealer:
                 highlightFields = []
             elif isinstance(highlight, list):
                 highlightFields = highlight
-            matchText, keywords = self.qryr.question(qst, min_match=0.3)
+            analysis = self.qryr.analyze(qst)
+            matchText, keywords = self.qryr.match_expr(analysis, min_match=0.3)
             if emb_mdl is None:
                 matchExprs = [matchText]
                 res = self.dataStore.search(src, highlightFields, filters, matchExprs, orderBy, offset, limit,
@@ -136,7 +142,7 @@ class Dealer:
                         res = self.dataStore.search(src, [], filters, [], orderBy, offset, limit, idx_names, kb_ids)
                         total = self.dataStore.getTotal(res)
                     else:
-                        matchText, _ = self.qryr.question(qst, min_match=0.1)
+                        matchText, _ = self.qryr.match_expr(analysis, min_match=0.1)
                         matchDense.extra_options["similarity"] = 0.17
                         res = self.dataStore.search(src, highlightFields, filters, [matchText, matchDense, fusionExpr],
                                                     orderBy, offset, limit, idx_names, kb_ids, rank_feature=rank_feature)
@@ -343,7 +349,7 @@ class Dealer:
             ins_tw.append(tks)
 
         tksim = self.qryr.token_similarity(keywords, ins_tw)
-        vtsim, _ = rerank_mdl.similarity(query, [remove_redundant_spaces(" ".join(tks)) for tks in ins_tw])
+        vtsim, _ = self.rerank_cache.similarity(rerank_mdl, query, sres.ids, [remove_redundant_spaces(" ".join(tks)) for tks in ins_tw])
         ## For rank feature(tag_fea) scores.
         rank_fea = self._rank_feature_scores(rank_feature, sres)
 
@@ -509,6 +515,12 @@ class Dealer:
         total = np.sum([c for _, c in res])
         return {t: (c + 1) / (total + S) for t, c in res}
 
+    @staticmethod
+    def _tag_features(aggs, all_tags, topn_tags=3, S=1000):
+        cnt = np.sum([c for _, c in aggs])
+        return sorted([(a, round(0.1*(c + 1) / (cnt + S) / max(1e-6, all_tags.get(a, 0.0001)))) for a, c in aggs],
+                      key=lambda x: x[1] * -1)[:topn_tags]
+
     def tag_content(self, tenant_id: str, kb_ids: list[str], doc, all_tags, topn_tags=3, keywords_topn=30, S=1000):
         idx_nm = index_name(tenant_id)
         match_txt = self.qryr.paragraph(doc["title_tks"] + " " + doc["content_ltks"], doc.get("important_kwd", []), keywords_topn)
@@ -516,25 +528,50 @@ class Dealer:
         aggs = self.dataStore.getAggregation(res, "tag_kwd")
         if not aggs:
             return False
-        cnt = np.sum([c for _, c in aggs])
-        tag_fea = sorted([(a, round(0.1*(c + 1) / (cnt + S) / max(1e-6, all_tags.get(a, 0.0001)))) for a, c in aggs],
-                         key=lambda x: x[1] * -1)[:topn_tags]
+        tag_fea = self._tag_features(aggs, all_tags, topn_tags, S)
         doc[TAG_FLD] = {a.replace(".", "_"): c for a, c in tag_fea if c > 0}
         return True
 
+    def tag_contents(self, tenant_id: str, kb_ids: list[str], docs: list[dict], all_tags, topn_tags=3, keywords_topn=30, S=1000, max_workers=8):
+        """
+        Bulk version of `tag_content`.
+
+        The `paragraph` match of every chunk is built up front and the aggregation queries are
+        dispatched concurrently. Returns the tag-feature matrix: one `{tag: feature}` dict per
+        doc, or None where the tag KBs have no matching chunks. Docs are not modified.
+        """
+        if not docs:
+            return []
+        idx_nm = index_name(tenant_id)
+        match_txts = [self.qryr.paragraph(d["title_tks"] + " " + d["content_ltks"], d.get("important_kwd", []), keywords_topn) for d in docs]
+
+        def tag_one(match_txt):
+            res = self.dataStore.search([], [], {}, [match_txt], OrderByExpr(), 0, 0, idx_nm, kb_ids, ["tag_kwd"])
+            aggs = self.dataStore.getAggregation(res, "tag_kwd")
+            if not aggs:
+                return None
+            return {a.replace(".", "_"): c for a, c in self._tag_features(aggs, all_tags, topn_tags, S) if c > 0}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(match_txts)))) as executor:
+            return list(executor.map(tag_one, match_txts))
+
     def tag_query(self, question: str, tenant_ids: str | list[str], kb_ids: list[str], all_tags, topn_tags=3, S=1000):
         if isinstance(tenant_ids, str):
             idx_nms = index_name(tenant_ids)
         else:
             idx_nms = [index_name(tid) for tid in tenant_ids]
+        try:
+            tags = self.tag_index.tag_query(question, idx_nms, kb_ids, all_tags, topn_tags, S)
+            if tags is not None:
+                return tags
+        except Exception:
+            logging.exception("TagFeatureIndex.tag_query got exception, falling back to the doc store")
         match_txt, _ = self.qryr.question(question, min_match=0.0)
         res = self.dataStore.search([], [], {}, [match_txt], OrderByExpr(), 0, 0, idx_nms, kb_ids, ["tag_kwd"])
         aggs = self.dataStore.getAggregation(res, "tag_kwd")
         if not aggs:
             return {}
-        cnt = np.sum([c for _, c in aggs])
-        tag_fea = sorted([(a, round(0.1*(c + 1) / (cnt + S) / max(1e-6, all_tags.get(a, 0.0001)))) for a, c in aggs],
-                         key=lambda x: x[1] * -1)[:topn_tags]
+        tag_fea = self._tag_features(aggs, all_tags, topn_tags, S)
         return {a.replace(".", "_"): max(1, c) for a, c in tag_fea}
 
     def retrieval_by_toc(self, query:str, chunks:list[dict], tenant_ids:list[str], chat_mdl, topn: int=6):
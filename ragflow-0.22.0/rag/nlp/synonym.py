@@ -29,6 +29,8 @@ class Dealer:
         self.lookup_num = 100000000
         self.load_tm = time.time() - 1000000
         self.dictionary = None
+        # Bumped whenever the dictionary is reloaded, so that cached query analyses expire.
+        self.version = 0
         path = os.path.join(get_project_base_directory(), "rag/res", "synonym.json")
         try:
             self.dictionary = json.load(open(path, 'r'))
@@ -64,6 +66,7 @@ class Dealer:
         try:
             d = json.loads(d)
             self.dictionary = d
+            self.version += 1
         except Exception as e:
             logging.error("Fail to load synonym!" + str(e))
 
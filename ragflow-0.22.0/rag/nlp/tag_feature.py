@@ -0,0 +1,190 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from rag.nlp import rag_tokenizer
+from rag.utils.doc_store_conn import OrderByExpr
+
+TAG_INDEX_MAX_CHUNKS = int(os.environ.get("TAG_INDEX_MAX_CHUNKS", 10000))
+TAG_INDEX_TTL = int(os.environ.get("TAG_INDEX_TTL", 3600))
+TAG_INDEX_CHECK_INTERVAL = float(os.environ.get("TAG_INDEX_CHECK_INTERVAL", 5))
+TAG_QUERY_CACHE_SIZE = int(os.environ.get("TAG_QUERY_CACHE_SIZE", 4096))
+
+TERM_FIELDS = ["title_tks", "title_sm_tks", "important_tks", "question_tks", "content_ltks", "content_sm_ltks"]
+
+
+def _tag_kb_version_key(kb_id):
+    return f"tag_kb_version:{kb_id}"
+
+
+def bump_tag_kb_version(kb_id):
+    """Tell every process that the chunks of tag KB `kb_id` changed."""
+    from common.misc_utils import get_uuid
+    from rag.utils.redis_conn import REDIS_CONN
+    try:
+        REDIS_CONN.set(_tag_kb_version_key(kb_id), get_uuid(), 30 * 24 * 3600)
+    except Exception:
+        logging.exception("bump_tag_kb_version got exception")
+
+
+def _tag_kb_versions(kb_ids):
+    from rag.utils.redis_conn import REDIS_CONN
+    return tuple([REDIS_CONN.get(_tag_kb_version_key(kb_id)) or "" for kb_id in kb_ids])
+
+
+class _Postings:
+    def __init__(self, versions):
+        self.versions = versions
+        self.built_at = time.time()
+        self.checked_at = time.monotonic()
+        self.terms: dict[str, list[int]] = {}
+        self.chunk_tags: list[list[str]] = []
+
+    def add(self, terms, tags):
+        idx = len(self.chunk_tags)
+        self.chunk_tags.append(tags)
+        for t in terms:
+            self.terms.setdefault(t, []).append(idx)
+
+    def aggregate(self, terms):
+        matched = set()
+        for t in terms:
+            matched.update(self.terms.get(t, []))
+        cnt = Counter()
+        for i in matched:
+            cnt.update(self.chunk_tags[i])
+        return cnt.most_common()
+
+
+class TagFeatureIndex:
+    """
+    In-memory term->chunk posting table of tag KBs.
+
+    `Dealer.tag_query` runs a full-text match of the question over the tag KBs and aggregates
+    `tag_kwd` of the matching chunks. Tag KBs are small, so the same aggregation is computed
+    here from the question tokens without a doc store round trip. Posting tables are rebuilt
+    when a tag KB version is bumped (see `bump_tag_kb_version`) or after TAG_INDEX_TTL, and
+    recent question -> tag feature results are kept in an LRU.
+    """
+
+    def __init__(self, dealer):
+        self.dealer = dealer
+        self._lock = threading.Lock()
+        self._postings: dict[tuple, _Postings] = {}
+        self._too_large: dict[tuple, float] = {}
+        self._cache = OrderedDict()
+
+    def tag_query(self, question: str, idx_nms, kb_ids: list[str], all_tags, topn_tags=3, S=1000):
+        """Return the tag features of `question`, or None if the tag KBs can't be served from memory."""
+        key = tuple(sorted(kb_ids))
+        postings = self._get_postings(idx_nms, key)
+        if postings is None:
+            return None
+
+        cache_key = (question, key, topn_tags, postings.versions, postings.built_at)
+        with self._lock:
+            if cache_key in self._cache:
+                self._cache.move_to_end(cache_key)
+                return dict(self._cache[cache_key])
+
+        aggs = postings.aggregate(self.question_terms(question))
+        res = {}
+        if aggs:
+            res = {a.replace(".", "_"): max(1, c) for a, c in self.dealer._tag_features(aggs, all_tags, topn_tags, S)}
+        with self._lock:
+            self._cache[cache_key] = res
+            while len(self._cache) > TAG_QUERY_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return dict(res)
+
+    def question_terms(self, question: str) -> set[str]:
+        _, keywords = self.dealer.qryr.question(question, min_match=0.0)
+        tks = rag_tokenizer.tokenize(" ".join(keywords)).split()
+        terms = set(tks)
+        terms.update(rag_tokenizer.fine_grained_tokenize(" ".join(tks)).split())
+        return set([t for t in terms if t])
+
+    def invalidate(self, kb_ids=None):
+        with self._lock:
+            if kb_ids is None:
+                self._postings.clear()
+                self._too_large.clear()
+            else:
+                kb_ids = set(kb_ids)
+                for k in [k for k in self._postings if kb_ids & set(k)]:
+                    del self._postings[k]
+                for k in [k for k in self._too_large if kb_ids & set(k)]:
+                    del self._too_large[k]
+
+    def _get_postings(self, idx_nms, key: tuple):
+        now = time.monotonic()
+        with self._lock:
+            postings = self._postings.get(key)
+            too_large_at = self._too_large.get(key)
+        if too_large_at is not None and now - too_large_at < TAG_INDEX_TTL:
+            return None
+        if postings is not None:
+            if time.time() - postings.built_at > TAG_INDEX_TTL:
+                postings = None
+            elif now - postings.checked_at > TAG_INDEX_CHECK_INTERVAL:
+                postings.checked_at = now
+                if _tag_kb_versions(key) != postings.versions:
+                    postings = None
+        if postings is not None:
+            return postings
+
+        versions = _tag_kb_versions(key)
+        postings = self._build(idx_nms, list(key), versions)
+        with self._lock:
+            if postings is None:
+                self._too_large[key] = now
+                self._postings.pop(key, None)
+            else:
+                self._postings[key] = postings
+        return postings
+
+    def _build(self, idx_nms, kb_ids: list[str], versions):
+        fields = TERM_FIELDS + ["important_kwd", "tag_kwd"]
+        data_store = self.dealer.dataStore
+        postings = _Postings(versions)
+        bs = 1024
+        for p in range(0, TAG_INDEX_MAX_CHUNKS + 1, bs):
+            res = data_store.search(fields, [], {}, [], OrderByExpr(), p, bs, idx_nms, kb_ids)
+            if p == 0 and data_store.getTotal(res) > TAG_INDEX_MAX_CHUNKS:
+                logging.info(f"Tag KBs {kb_ids} have more than {TAG_INDEX_MAX_CHUNKS} chunks, tag queries go to the doc store.")
+                return None
+            chunks = data_store.getFields(res, fields)
+            for ck in chunks.values():
+                tags = ck.get("tag_kwd") or []
+                if isinstance(tags, str):
+                    tags = [tags]
+                if not tags:
+                    continue
+                terms = set()
+                for fld in TERM_FIELDS:
+                    if isinstance(ck.get(fld), str):
+                        terms.update(ck[fld].split())
+                kwd = ck.get("important_kwd") or []
+                terms.update(kwd if isinstance(kwd, list) else [kwd])
+                postings.add(terms, tags)
+            if len(chunks) < bs:
+                break
+        logging.info(f"Built tag posting table of {kb_ids}: {len(postings.chunk_tags)} chunks, {len(postings.terms)} terms")
+        return postings
@@ -153,11 +153,14 @@ def kb_prompt(kbinfos, max_tokens, hash_id=False):
 CITATION_PROMPT_TEMPLATE = load_prompt("citation_prompt")
 CITATION_PLUS_TEMPLATE = load_prompt("citation_plus")
 CONTENT_TAGGING_PROMPT_TEMPLATE = load_prompt("content_tagging_prompt")
+CONTENT_TAGGING_BATCH_PROMPT_TEMPLATE = load_prompt("content_tagging_batch_prompt")
 CROSS_LANGUAGES_SYS_PROMPT_TEMPLATE = load_prompt("cross_languages_sys_prompt")
 CROSS_LANGUAGES_USER_PROMPT_TEMPLATE = load_prompt("cross_languages_user_prompt")
 FULL_QUESTION_PROMPT_TEMPLATE = load_prompt("full_question_prompt")
 KEYWORD_PROMPT_TEMPLATE = load_prompt("keyword_prompt")
+KEYWORD_BATCH_PROMPT_TEMPLATE = load_prompt("keyword_batch_prompt")
 QUESTION_PROMPT_TEMPLATE = load_prompt("question_prompt")
+QUESTION_BATCH_PROMPT_TEMPLATE = load_prompt("question_batch_prompt")
 VISION_LLM_DESCRIBE_PROMPT = load_prompt("vision_llm_describe_prompt")
 VISION_LLM_FIGURE_DESCRIBE_PROMPT = load_prompt("vision_llm_figure_describe_prompt")
 STRUCTURED_OUTPUT_PROMPT = load_prompt("structured_output_prompt")
@@ -214,6 +217,53 @@ def question_proposal(chat_mdl, content, topn=3):
     return kwd
 
 
+def _batch_enrichment(chat_mdl, rendered_prompt, n, temperature):
+    """
+    Run one packed prompt over `n` chunks and return the per-chunk JSON values.
+
+    A chunk whose entry is missing from the answer gets None, so that the caller
+    can fall back to the single-chunk prompt for it.
+    """
+    msg = [{"role": "system", "content": rendered_prompt}, {"role": "user", "content": "Output: "}]
+    _, msg = message_fit_in(msg, chat_mdl.max_length)
+    ans = chat_mdl.chat(msg[0]["content"], msg[1:], {"temperature": temperature})
+    if isinstance(ans, tuple):
+        ans = ans[0]
+    ans = re.sub(r"(^.*</think>|```json\n|```\n*$)", "", ans, flags=re.DOTALL)
+    if ans.find("**ERROR**") >= 0:
+        return [None] * n
+    try:
+        obj = json_repair.loads(ans)
+    except Exception:
+        logging.exception(f"Loading json failure: {ans}")
+        return [None] * n
+    if not isinstance(obj, dict):
+        return [None] * n
+    return [obj.get(str(i)) for i in range(n)]
+
+
+def keyword_extraction_batch(chat_mdl, contents: list[str], topn=3):
+    template = PROMPT_JINJA_ENV.from_string(KEYWORD_BATCH_PROMPT_TEMPLATE)
+    rendered_prompt = template.render(contents=contents, topn=topn)
+    res = []
+    for kwd in _batch_enrichment(chat_mdl, rendered_prompt, len(contents), 0.2):
+        if isinstance(kwd, list):
+            kwd = ",".join([str(k).strip() for k in kwd if str(k).strip()])
+        res.append(kwd if isinstance(kwd, str) else None)
+    return res
+
+
+def question_proposal_batch(chat_mdl, contents: list[str], topn=3):
+    template = PROMPT_JINJA_ENV.from_string(QUESTION_BATCH_PROMPT_TEMPLATE)
+    rendered_prompt = template.render(contents=contents, topn=topn)
+    res = []
+    for qst in _batch_enrichment(chat_mdl, rendered_prompt, len(contents), 0.2):
+        if isinstance(qst, list):
+            qst = "\n".join([str(q).strip() for q in qst if str(q).strip()])
+        res.append(qst if isinstance(qst, str) else None)
+    return res
+
+
 def full_question(tenant_id=None, llm_id=None, messages=[], language=None, chat_mdl=None):
     from common.constants import LLMType
     from api.db.services.llm_service import LLMBundle
@@ -310,6 +360,34 @@ def content_tagging(chat_mdl, content, all_tags, examples, topn=3):
     return res
 
 
+def content_tagging_batch(chat_mdl, contents: list[str], all_tags, examples, topn=3):
+    template = PROMPT_JINJA_ENV.from_string(CONTENT_TAGGING_BATCH_PROMPT_TEMPLATE)
+
+    for ex in examples:
+        ex["tags_json"] = json.dumps(ex[TAG_FLD], indent=2, ensure_ascii=False)
+
+    rendered_prompt = template.render(
+        topn=topn,
+        all_tags=all_tags,
+        examples=examples,
+        contents=contents,
+    )
+    res = []
+    for obj in _batch_enrichment(chat_mdl, rendered_prompt, len(contents), 0.5):
+        if not isinstance(obj, dict):
+            res.append(None)
+            continue
+        tags = {}
+        for k, v in obj.items():
+            try:
+                if int(v) > 0:
+                    tags[str(k)] = int(v)
+            except Exception:
+                pass
+        res.append(tags)
+    return res
+
+
 def vision_llm_describe_prompt(page=None) -> str:
     template = PROMPT_JINJA_ENV.from_string(VISION_LLM_DESCRIBE_PROMPT)
 
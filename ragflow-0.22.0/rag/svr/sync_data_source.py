@@ -20,13 +20,14 @@
 
 
 import copy
+import hashlib
 import sys
 import threading
 import time
 import traceback
 from typing import Any
 
-from api.db.services.connector_service import ConnectorService, SyncLogsService
+from api.db.services.connector_service import ConnectorService, ConnectorDocDigestService, SyncLogsService
 from api.db.services.knowledgebase_service import KnowledgebaseService
 from common.log_utils import init_root_logger
 from common.config_utils import show_configs
@@ -48,6 +49,7 @@ from common.signal_utils import start_tracemalloc_and_snapshot, stop_tracemalloc
 
 MAX_CONCURRENT_TASKS = int(os.environ.get('MAX_CONCURRENT_TASKS', "5"))
 task_limiter = trio.Semaphore(MAX_CONCURRENT_TASKS)
+SYNC_PREFETCH_BATCHES = int(os.environ.get('SYNC_PREFETCH_BATCHES', "4"))
 
 
 class SyncBase:
@@ -66,27 +68,28 @@ class SyncBase:
                     next_update = datetime(1970, 1, 1, tzinfo=timezone.utc)
                     if task["poll_range_start"]:
                         next_update = task["poll_range_start"]
-                    for document_batch in document_batch_generator:
-                        if not document_batch:
-                            continue
-                        min_update = min([doc.doc_updated_at for doc in document_batch])
-                        max_update = max([doc.doc_updated_at for doc in document_batch])
-                        next_update = max([next_update, max_update])
-                        docs = [{
-                            "id": doc.id,
-                            "connector_id": task["connector_id"],
-                            "source": self.SOURCE_NAME,
-                            "semantic_identifier": doc.semantic_identifier,
-                            "extension": doc.extension,
-                            "size_bytes": doc.size_bytes,
-                            "doc_updated_at": doc.doc_updated_at,
-                            "blob": doc.blob
-                        } for doc in document_batch]
-
-                        e, kb = KnowledgebaseService.get_by_id(task["kb_id"])
-                        err, dids = SyncLogsService.duplicate_and_parse(kb, docs, task["tenant_id"], f"{self.SOURCE_NAME}/{task['connector_id']}", task["auto_parse"])
-                        SyncLogsService.increase_docs(task["id"], min_update, max_update, len(docs), "\n".join(err), len(err))
-                        doc_num += len(docs)
+                    # The connector generator is blocking (HTTP/S3 round trips), so it runs in a
+                    # worker thread and hands batches over through a bounded channel.
+                    send_channel, receive_channel = trio.open_memory_channel(SYNC_PREFETCH_BATCHES)
+                    async with trio.open_nursery() as nursery:
+                        nursery.start_soon(self._produce, document_batch_generator, task, send_channel)
+                        async with receive_channel:
+                            async for docs in receive_channel:
+                                min_update = min([doc["doc_updated_at"] for doc in docs])
+                                max_update = max([doc["doc_updated_at"] for doc in docs])
+                                next_update = max([next_update, max_update])
+
+                                changed = await trio.to_thread.run_sync(lambda: ConnectorDocDigestService.filter_changed(task["connector_id"], task["kb_id"], docs))
+                                if len(changed) < len(docs):
+                                    logging.info("{} unchanged docs skipped".format(len(docs) - len(changed)))
+                                err, dids = [], []
+                                if changed:
+                                    e, kb = KnowledgebaseService.get_by_id(task["kb_id"])
+                                    err, dids = await trio.to_thread.run_sync(lambda: SyncLogsService.duplicate_and_parse(kb, changed, task["tenant_id"], f"{self.SOURCE_NAME}/{task['connector_id']}", task["auto_parse"]))
+                                    if not err and len(dids) == len(changed):
+                                        await trio.to_thread.run_sync(lambda: ConnectorDocDigestService.record(task["connector_id"], task["kb_id"], changed, dids))
+                                SyncLogsService.increase_docs(task["id"], min_update, max_update, len(changed), "\n".join(err), len(err))
+                                doc_num += len(changed)
 
                     logging.info("{} docs synchronized till {}".format(doc_num, next_update))
                     SyncLogsService.done(task["id"], task["connector_id"])
@@ -101,6 +104,31 @@ class SyncBase:
 
         SyncLogsService.schedule(task["connector_id"], task["kb_id"], task["poll_range_start"])
 
+    async def _produce(self, document_batch_generator, task: dict, send_channel: trio.MemorySendChannel):
+        def produce():
+            for document_batch in document_batch_generator:
+                if not document_batch:
+                    continue
+                docs = [{
+                    "id": doc.id,
+                    "connector_id": task["connector_id"],
+                    "source": self.SOURCE_NAME,
+                    "semantic_identifier": doc.semantic_identifier,
+                    "extension": doc.extension,
+                    "size_bytes": doc.size_bytes,
+                    "doc_updated_at": doc.doc_updated_at,
+                    "blob": doc.blob,
+                    "digest": hashlib.sha256(doc.blob).hexdigest()
+                } for doc in document_batch]
+                try:
+                    trio.from_thread.run(send_channel.send, docs)
+                except (trio.BrokenResourceError, trio.ClosedResourceError, trio.Cancelled, trio.RunFinishedError):
+                    # The consumer has gone away (failure or timeout); stop pulling from the source.
+                    return
+
+        async with send_channel:
+            await trio.to_thread.run_sync(produce, cancellable=True)
+
     async def _generate(self, task: dict):
         raise NotImplementedError
 
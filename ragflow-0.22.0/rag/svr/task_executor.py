@@ -28,12 +28,13 @@ from api.db import PIPELINE_SPECIAL_PROGRESS_FREEZE_TASK_TYPES
 from api.db.services.knowledgebase_service import KnowledgebaseService
 from api.db.services.pipeline_operation_log_service import PipelineOperationLogService
 from common.connection_utils import timeout
-from rag.utils.base64_image import image2id
+from rag.utils.base64_image import images2ids
 from common.log_utils import init_root_logger
 from common.config_utils import show_configs
 from graphrag.general.index import run_graphrag_for_kb
 from graphrag.utils import get_llm_cache, set_llm_cache, get_tags_from_cache, set_tags_to_cache
-from rag.prompts.generator import keyword_extraction, question_proposal, content_tagging, run_toc_from_text
+from rag.prompts.generator import keyword_extraction, question_proposal, content_tagging, run_toc_from_text, \
+    keyword_extraction_batch, question_proposal_batch, content_tagging_batch
 import logging
 import os
 from datetime import datetime
@@ -41,6 +42,7 @@ import json
 import xxhash
 import copy
 import re
+from collections import deque
 from functools import partial
 from multiprocessing.context import TimeoutError
 from timeit import default_timer as timer
@@ -55,16 +57,19 @@ from api.db.services.document_service import DocumentService
 from api.db.services.llm_service import LLMBundle
 from api.db.services.task_service import TaskService, has_canceled, CANVAS_DEBUG_DOC_ID, GRAPH_RAPTOR_FAKE_DOC_ID
 from api.db.services.file2document_service import File2DocumentService
+from api.db.services.parse_cache_service import ParseCacheService
 from common.versions import get_ragflow_version
 from api.db.db_models import close_connection
 from rag.app import laws, paper, presentation, manual, qa, table, book, resume, picture, naive, one, audio, \
     email, tag
 from rag.nlp import search, rag_tokenizer, add_positions
+from rag.nlp.tag_feature import bump_tag_kb_version
 from rag.raptor import RecursiveAbstractiveProcessing4TreeOrganizedRetrieval as Raptor
 from common.token_utils import num_tokens_from_string, truncate
 from rag.utils.redis_conn import REDIS_CONN, RedisDistributedLock
 from graphrag.utils import chat_limiter
 from common.signal_utils import start_tracemalloc_and_snapshot, stop_tracemalloc
+from common.llm_limiter import limiter_metrics
 from common.exceptions import TaskCanceledException
 from common import settings
 from common.constants import PAGERANK_FLD, TAG_FLD, SVR_CONSUMER_GROUP_NAME
@@ -98,6 +103,8 @@ TASK_TYPE_TO_PIPELINE_TASK_TYPE = {
 }
 
 UNACKED_ITERATOR = None
+# Messages read ahead from the task queues, waiting for a free task slot.
+COLLECTED_MSGS = deque()
 
 CONSUMER_NO = "0" if len(sys.argv) < 2 else sys.argv[1]
 CONSUMER_NAME = "task_executor_" + CONSUMER_NO
@@ -112,7 +119,14 @@ CURRENT_TASKS = {}
 MAX_CONCURRENT_TASKS = int(os.environ.get('MAX_CONCURRENT_TASKS', "5"))
 MAX_CONCURRENT_CHUNK_BUILDERS = int(os.environ.get('MAX_CONCURRENT_CHUNK_BUILDERS', "1"))
 MAX_CONCURRENT_MINIO = int(os.environ.get('MAX_CONCURRENT_MINIO', '10'))
+MAX_CONCURRENT_TAG_QUERIES = int(os.environ.get('MAX_CONCURRENT_TAG_QUERIES', '8'))
+TAG_BATCH_SIZE = int(os.environ.get('TAG_BATCH_SIZE', '256'))
+# Number of chunks packed into one keyword/question/tagging prompt. 1 keeps one LLM call per chunk.
+ENRICHMENT_BATCH_SIZE = int(os.environ.get('ENRICHMENT_BATCH_SIZE', '1'))
+# How long a read of the task queues waits for a task to arrive, in milliseconds.
+QUEUE_BLOCK_MS = int(os.environ.get('QUEUE_BLOCK_MS', "5000"))
 task_limiter = trio.Semaphore(MAX_CONCURRENT_TASKS)
+collect_lock = trio.Lock()
 chunk_limiter = trio.CapacityLimiter(MAX_CONCURRENT_CHUNK_BUILDERS)
 embed_limiter = trio.CapacityLimiter(MAX_CONCURRENT_CHUNK_BUILDERS)
 minio_limiter = trio.CapacityLimiter(MAX_CONCURRENT_MINIO)
@@ -163,6 +177,20 @@ def set_progress(task_id, from_page=0, to_page=-1, prog=None, msg="Processing...
         logging.exception(f"set_progress({task_id}), progress: {prog}, progress_msg: {msg}, got exception")
 
 
+async def next_queued_msg(svr_queue_names):
+    """
+    The next message of the task queues. When none is buffered, reads as many as there are
+    free task slots, higher priority queues first, off the event loop.
+    """
+    async with collect_lock:
+        if not COLLECTED_MSGS:
+            count = min(MAX_CONCURRENT_TASKS, task_limiter.value + 1)
+            COLLECTED_MSGS.extend(await trio.to_thread.run_sync(
+                lambda: REDIS_CONN.queue_consumer_by_priority(svr_queue_names, SVR_CONSUMER_GROUP_NAME, CONSUMER_NAME,
+                                                              count=count, block=QUEUE_BLOCK_MS)))
+        return COLLECTED_MSGS.popleft() if COLLECTED_MSGS else None
+
+
 async def collect():
     global CONSUMER_NAME, DONE_TASKS, FAILED_TASKS
     global UNACKED_ITERATOR
@@ -174,10 +202,7 @@ async def collect():
         try:
             redis_msg = next(UNACKED_ITERATOR)
         except StopIteration:
-            for svr_queue_name in svr_queue_names:
-                redis_msg = REDIS_CONN.queue_consumer(svr_queue_name, SVR_CONSUMER_GROUP_NAME, CONSUMER_NAME)
-                if redis_msg:
-                    break
+            redis_msg = await next_queued_msg(svr_queue_names)
     except Exception:
         logging.exception("collect got exception")
         return None, None
@@ -223,6 +248,87 @@ async def get_storage_binary(bucket, name):
     return await trio.to_thread.run_sync(lambda: settings.STORAGE_IMPL.get(bucket, name))
 
 
+async def doc_keyword_extraction(chat_mdl, d, topn):
+    cached = get_llm_cache(chat_mdl.llm_name, d["content_with_weight"], "keywords", {"topn": topn})
+    if not cached:
+        async with chat_limiter:
+            cached = await trio.to_thread.run_sync(lambda: keyword_extraction(chat_mdl, d["content_with_weight"], topn))
+        set_llm_cache(chat_mdl.llm_name, d["content_with_weight"], cached, "keywords", {"topn": topn})
+    if cached:
+        d["important_kwd"] = cached.split(",")
+        d["important_tks"] = rag_tokenizer.tokenize(" ".join(d["important_kwd"]))
+    return
+
+
+async def doc_keyword_extraction_batch(chat_mdl, batch, topn):
+    todo = [d for d in batch if not get_llm_cache(chat_mdl.llm_name, d["content_with_weight"], "keywords", {"topn": topn})]
+    if len(todo) > 1:
+        async with chat_limiter:
+            kwds = await trio.to_thread.run_sync(lambda: keyword_extraction_batch(chat_mdl, [d["content_with_weight"] for d in todo], topn))
+        for d, kwd in zip(todo, kwds):
+            if kwd:
+                set_llm_cache(chat_mdl.llm_name, d["content_with_weight"], kwd, "keywords", {"topn": topn})
+    # Cached chunks and those missing from the packed answer go through the single-chunk path.
+    async with trio.open_nursery() as nursery:
+        for d in batch:
+            nursery.start_soon(doc_keyword_extraction, chat_mdl, d, topn)
+
+
+async def doc_question_proposal(chat_mdl, d, topn):
+    cached = get_llm_cache(chat_mdl.llm_name, d["content_with_weight"], "question", {"topn": topn})
+    if not cached:
+        async with chat_limiter:
+            cached = await trio.to_thread.run_sync(lambda: question_proposal(chat_mdl, d["content_with_weight"], topn))
+        set_llm_cache(chat_mdl.llm_name, d["content_with_weight"], cached, "question", {"topn": topn})
+    if cached:
+        d["question_kwd"] = cached.split("\n")
+        d["question_tks"] = rag_tokenizer.tokenize("\n".join(d["question_kwd"]))
+
+
+async def doc_question_proposal_batch(chat_mdl, batch, topn):
+    todo = [d for d in batch if not get_llm_cache(chat_mdl.llm_name, d["content_with_weight"], "question", {"topn": topn})]
+    if len(todo) > 1:
+        async with chat_limiter:
+            qsts = await trio.to_thread.run_sync(lambda: question_proposal_batch(chat_mdl, [d["content_with_weight"] for d in todo], topn))
+        for d, qst in zip(todo, qsts):
+            if qst:
+                set_llm_cache(chat_mdl.llm_name, d["content_with_weight"], qst, "question", {"topn": topn})
+    async with trio.open_nursery() as nursery:
+        for d in batch:
+            nursery.start_soon(doc_question_proposal, chat_mdl, d, topn)
+
+
+async def doc_content_tagging(chat_mdl, d, topn_tags, all_tags, examples):
+    cached = get_llm_cache(chat_mdl.llm_name, d["content_with_weight"], all_tags, {"topn": topn_tags})
+    if not cached:
+        picked_examples = random.choices(examples, k=2) if len(examples)>2 else examples
+        if not picked_examples:
+            picked_examples.append({"content": "This is an example", TAG_FLD: {'example': 1}})
+        async with chat_limiter:
+            cached = await trio.to_thread.run_sync(lambda: content_tagging(chat_mdl, d["content_with_weight"], all_tags, picked_examples, topn=topn_tags))
+        if cached:
+            cached = json.dumps(cached)
+    if cached:
+        set_llm_cache(chat_mdl.llm_name, d["content_with_weight"], cached, all_tags, {"topn": topn_tags})
+        d[TAG_FLD] = json.loads(cached)
+
+
+async def doc_content_tagging_batch(chat_mdl, batch, topn_tags, all_tags, examples):
+    todo = [d for d in batch if not get_llm_cache(chat_mdl.llm_name, d["content_with_weight"], all_tags, {"topn": topn_tags})]
+    if len(todo) > 1:
+        picked_examples = random.choices(examples, k=2) if len(examples)>2 else examples
+        if not picked_examples:
+            picked_examples.append({"content": "This is an example", TAG_FLD: {'example': 1}})
+        async with chat_limiter:
+            tags = await trio.to_thread.run_sync(lambda: content_tagging_batch(chat_mdl, [d["content_with_weight"] for d in todo], all_tags, picked_examples, topn=topn_tags))
+        for d, tag in zip(todo, tags):
+            if tag:
+                set_llm_cache(chat_mdl.llm_name, d["content_with_weight"], json.dumps(tag), all_tags, {"topn": topn_tags})
+    async with trio.open_nursery() as nursery:
+        for d in batch:
+            nursery.start_soon(doc_content_tagging, chat_mdl, d, topn_tags, all_tags, examples)
+
+
 @timeout(60*80, 1)
 async def build_chunks(task, progress_callback):
     if task["size"] > settings.DOC_MAXIMUM_SIZE:
@@ -249,18 +355,34 @@ async def build_chunks(task, progress_callback):
         logging.exception("Chunking {}/{} got exception".format(task["location"], task["name"]))
         raise
 
-    try:
-        async with chunk_limiter:
-            cks = await trio.to_thread.run_sync(lambda: chunker.chunk(task["name"], binary=binary, from_page=task["from_page"],
-                                to_page=task["to_page"], lang=task["language"], callback=progress_callback,
-                                kb_id=task["kb_id"], parser_config=task["parser_config"], tenant_id=task["tenant_id"]))
-        logging.info("Chunking({}) {}/{} done".format(timer() - st, task["location"], task["name"]))
-    except TaskCanceledException:
-        raise
-    except Exception as e:
-        progress_callback(-1, "Internal server error while chunking: %s" % str(e).replace("'", ""))
-        logging.exception("Chunking {}/{} got exception".format(task["location"], task["name"]))
-        raise
+    file_digest = await trio.to_thread.run_sync(lambda: ParseCacheService.file_digest(binary))
+    cache_key = ParseCacheService.cache_key(task, file_digest)
+    cks = None
+    if cache_key:
+        try:
+            cks = await trio.to_thread.run_sync(lambda: ParseCacheService.get_chunks(cache_key))
+        except Exception:
+            logging.exception("Parse cache of {}/{} got exception".format(task["location"], task["name"]))
+    if cks:
+        progress_callback(msg="Reused {} chunks parsed earlier from the same file with the same parsing settings.".format(len(cks)))
+    else:
+        try:
+            async with chunk_limiter:
+                cks = await trio.to_thread.run_sync(lambda: chunker.chunk(task["name"], binary=binary, from_page=task["from_page"],
+                                    to_page=task["to_page"], lang=task["language"], callback=progress_callback,
+                                    kb_id=task["kb_id"], parser_config=task["parser_config"], tenant_id=task["tenant_id"]))
+            logging.info("Chunking({}) {}/{} done".format(timer() - st, task["location"], task["name"]))
+        except TaskCanceledException:
+            raise
+        except Exception as e:
+            progress_callback(-1, "Internal server error while chunking: %s" % str(e).replace("'", ""))
+            logging.exception("Chunking {}/{} got exception".format(task["location"], task["name"]))
+            raise
+        if cache_key and cks:
+            try:
+                await trio.to_thread.run_sync(lambda: ParseCacheService.put_chunks(cache_key, task, cks, file_digest))
+            except Exception:
+                logging.exception("Caching chunks of {}/{} got exception".format(task["location"], task["name"]))
 
     docs = []
     doc = {
@@ -271,29 +393,31 @@ async def build_chunks(task, progress_callback):
         doc[PAGERANK_FLD] = int(task["pagerank"])
     st = timer()
 
-    @timeout(60)
-    async def upload_to_minio(document, chunk):
+    for ck in cks:
+        d = copy.deepcopy(doc)
+        d.update(ck)
+        d["id"] = xxhash.xxh64((ck["content_with_weight"] + str(d["doc_id"])).encode("utf-8", "surrogatepass")).hexdigest()
+        d["create_time"] = str(datetime.now()).replace("T", " ")[:19]
+        d["create_timestamp_flt"] = datetime.now().timestamp()
+        if not d.get("image"):
+            _ = d.pop("image", None)
+            d["img_id"] = ""
+        docs.append(d)
+
+    img_docs = [d for d in docs if "image" in d]
+
+    # The images are encoded on a thread pool and uploaded together, so the 60s a chunk
+    # used to get becomes 60s for the lot plus a second per image.
+    @timeout(60 + len(img_docs))
+    async def upload_to_minio():
         try:
-            d = copy.deepcopy(document)
-            d.update(chunk)
-            d["id"] = xxhash.xxh64((chunk["content_with_weight"] + str(d["doc_id"])).encode("utf-8", "surrogatepass")).hexdigest()
-            d["create_time"] = str(datetime.now()).replace("T", " ")[:19]
-            d["create_timestamp_flt"] = datetime.now().timestamp()
-            if not d.get("image"):
-                _ = d.pop("image", None)
-                d["img_id"] = ""
-                docs.append(d)
-                return
-            await image2id(d, partial(settings.STORAGE_IMPL.put, tenant_id=task["tenant_id"]), d["id"], task["kb_id"])
-            docs.append(d)
+            await images2ids(img_docs, partial(settings.STORAGE_IMPL.put, tenant_id=task["tenant_id"]), [d["id"] for d in img_docs], task["kb_id"])
         except Exception:
-            logging.exception(
-                "Saving image of chunk {}/{}/{} got exception".format(task["location"], task["name"], d["id"]))
+            logging.exception("Saving images of chunks {}/{} got exception".format(task["location"], task["name"]))
             raise
 
-    async with trio.open_nursery() as nursery:
-        for ck in cks:
-            nursery.start_soon(upload_to_minio, doc, ck)
+    if img_docs:
+        await upload_to_minio()
 
     el = timer() - st
     logging.info("MINIO PUT({}) cost {:.3f} s".format(task["name"], el))
@@ -303,19 +427,13 @@ async def build_chunks(task, progress_callback):
         progress_callback(msg="Start to generate keywords for every chunk ...")
         chat_mdl = LLMBundle(task["tenant_id"], LLMType.CHAT, llm_name=task["llm_id"], lang=task["language"])
 
-        async def doc_keyword_extraction(chat_mdl, d, topn):
-            cached = get_llm_cache(chat_mdl.llm_name, d["content_with_weight"], "keywords", {"topn": topn})
-            if not cached:
-                async with chat_limiter:
-                    cached = await trio.to_thread.run_sync(lambda: keyword_extraction(chat_mdl, d["content_with_weight"], topn))
-                set_llm_cache(chat_mdl.llm_name, d["content_with_weight"], cached, "keywords", {"topn": topn})
-            if cached:
-                d["important_kwd"] = cached.split(",")
-                d["important_tks"] = rag_tokenizer.tokenize(" ".join(d["important_kwd"]))
-            return
         async with trio.open_nursery() as nursery:
-            for d in docs:
-                nursery.start_soon(doc_keyword_extraction, chat_mdl, d, task["parser_config"]["auto_keywords"])
+            if ENRICHMENT_BATCH_SIZE > 1:
+                for b in range(0, len(docs), ENRICHMENT_BATCH_SIZE):
+                    nursery.start_soon(doc_keyword_extraction_batch, chat_mdl, docs[b:b + ENRICHMENT_BATCH_SIZE], task["parser_config"]["auto_keywords"])
+            else:
+                for d in docs:
+                    nursery.start_soon(doc_keyword_extraction, chat_mdl, d, task["parser_config"]["auto_keywords"])
         progress_callback(msg="Keywords generation {} chunks completed in {:.2f}s".format(len(docs), timer() - st))
 
     if task["parser_config"].get("auto_questions", 0):
@@ -323,18 +441,13 @@ async def build_chunks(task, progress_callback):
         progress_callback(msg="Start to generate questions for every chunk ...")
         chat_mdl = LLMBundle(task["tenant_id"], LLMType.CHAT, llm_name=task["llm_id"], lang=task["language"])
 
-        async def doc_question_proposal(chat_mdl, d, topn):
-            cached = get_llm_cache(chat_mdl.llm_name, d["content_with_weight"], "question", {"topn": topn})
-            if not cached:
-                async with chat_limiter:
-                    cached = await trio.to_thread.run_sync(lambda: question_proposal(chat_mdl, d["content_with_weight"], topn))
-                set_llm_cache(chat_mdl.llm_name, d["content_with_weight"], cached, "question", {"topn": topn})
-            if cached:
-                d["question_kwd"] = cached.split("\n")
-                d["question_tks"] = rag_tokenizer.tokenize("\n".join(d["question_kwd"]))
         async with trio.open_nursery() as nursery:
-            for d in docs:
-                nursery.start_soon(doc_question_proposal, chat_mdl, d, task["parser_config"]["auto_questions"])
+            if ENRICHMENT_BATCH_SIZE > 1:
+                for b in range(0, len(docs), ENRICHMENT_BATCH_SIZE):
+                    nursery.start_soon(doc_question_proposal_batch, chat_mdl, docs[b:b + ENRICHMENT_BATCH_SIZE], task["parser_config"]["auto_questions"])
+            else:
+                for d in docs:
+                    nursery.start_soon(doc_question_proposal, chat_mdl, d, task["parser_config"]["auto_questions"])
         progress_callback(msg="Question generation {} chunks completed in {:.2f}s".format(len(docs), timer() - st))
 
     if task["kb_parser_config"].get("tag_kb_ids", []):
@@ -355,32 +468,28 @@ async def build_chunks(task, progress_callback):
         chat_mdl = LLMBundle(task["tenant_id"], LLMType.CHAT, llm_name=task["llm_id"], lang=task["language"])
 
         docs_to_tag = []
-        for d in docs:
+        for b in range(0, len(docs), TAG_BATCH_SIZE):
             task_canceled = has_canceled(task["id"])
             if task_canceled:
                 progress_callback(-1, msg="Task has been canceled.")
                 return
-            if settings.retriever.tag_content(tenant_id, kb_ids, d, all_tags, topn_tags=topn_tags, S=S) and len(d[TAG_FLD]) > 0:
-                examples.append({"content": d["content_with_weight"], TAG_FLD: d[TAG_FLD]})
-            else:
-                docs_to_tag.append(d)
-
-        async def doc_content_tagging(chat_mdl, d, topn_tags):
-            cached = get_llm_cache(chat_mdl.llm_name, d["content_with_weight"], all_tags, {"topn": topn_tags})
-            if not cached:
-                picked_examples = random.choices(examples, k=2) if len(examples)>2 else examples
-                if not picked_examples:
-                    picked_examples.append({"content": "This is an example", TAG_FLD: {'example': 1}})
-                async with chat_limiter:
-                    cached = await trio.to_thread.run_sync(lambda: content_tagging(chat_mdl, d["content_with_weight"], all_tags, picked_examples, topn=topn_tags))
-                if cached:
-                    cached = json.dumps(cached)
-            if cached:
-                set_llm_cache(chat_mdl.llm_name, d["content_with_weight"], cached, all_tags, {"topn": topn_tags})
-                d[TAG_FLD] = json.loads(cached)
+            batch = docs[b:b + TAG_BATCH_SIZE]
+            tag_feas = await trio.to_thread.run_sync(lambda: settings.retriever.tag_contents(tenant_id, kb_ids, batch, all_tags, topn_tags=topn_tags, S=S, max_workers=MAX_CONCURRENT_TAG_QUERIES))
+            for d, tag_fea in zip(batch, tag_feas):
+                if tag_fea is not None:
+                    d[TAG_FLD] = tag_fea
+                if tag_fea:
+                    examples.append({"content": d["content_with_weight"], TAG_FLD: d[TAG_FLD]})
+                else:
+                    docs_to_tag.append(d)
+
         async with trio.open_nursery() as nursery:
-            for d in docs_to_tag:
-                nursery.start_soon(doc_content_tagging, chat_mdl, d, topn_tags)
+            if ENRICHMENT_BATCH_SIZE > 1:
+                for b in range(0, len(docs_to_tag), ENRICHMENT_BATCH_SIZE):
+                    nursery.start_soon(doc_content_tagging_batch, chat_mdl, docs_to_tag[b:b + ENRICHMENT_BATCH_SIZE], topn_tags, all_tags, examples)
+            else:
+                for d in docs_to_tag:
+                    nursery.start_soon(doc_content_tagging, chat_mdl, d, topn_tags, all_tags, examples)
         progress_callback(msg="Tagging {} chunks completed in {:.2f}s".format(len(docs), timer() - st))
 
     return docs
@@ -925,6 +1034,8 @@ async def do_handle_task(task):
                                                                                      timer() - start_ts))
 
     DocumentService.increment_chunk_num(task_doc_id, task_dataset_id, token_count, chunk_count, 0)
+    if task["parser_id"].lower() == ParserType.TAG.value:
+        bump_tag_kb_version(task_dataset_id)
 
     time_cost = timer() - start_ts
     progress_callback(msg="Indexing done ({:.2f}s).".format(time_cost))
@@ -947,9 +1058,12 @@ async def do_handle_task(task):
 async def handle_task():
 
     global DONE_TASKS, FAILED_TASKS
+    st = timer()
     redis_msg, task = await collect()
     if not task:
-        await trio.sleep(5)
+        # An empty read has already waited QUEUE_BLOCK_MS for a task. Pause only when collect
+        # returned sooner, e.g. after a Redis error.
+        await trio.sleep(max(0.0, QUEUE_BLOCK_MS / 1000 - (timer() - st)))
         return
 
     task_type = task["task_type"]
@@ -1021,6 +1135,7 @@ async def report_status():
                 "done": DONE_TASKS,
                 "failed": FAILED_TASKS,
                 "current": current,
+                "llm_limiters": limiter_metrics(),
             })
             REDIS_CONN.zadd(CONSUMER_NAME, heartbeat, now.timestamp())
             logging.info(f"{CONSUMER_NAME} reported heartbeat: {heartbeat}")
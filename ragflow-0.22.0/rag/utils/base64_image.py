@@ -16,18 +16,46 @@
 
 import base64
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from io import BytesIO
 
 from PIL import Image
 
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", 75))
+IMAGE_ENCODE_THREADS = int(os.environ.get("IMAGE_ENCODE_THREADS", 4))
+
 test_image_base64 = "iVBORw0KGgoAAAANSUhEUgAAAGQAAABkCAIAAAD/gAIDAAAA6ElEQVR4nO3QwQ3AIBDAsIP9d25XIC+EZE8QZc18w5l9O+AlZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBWYFZgVmBT+IYAHHLHkdEgAAAABJRU5ErkJggg=="
 test_image = base64.b64decode(test_image_base64)
 
 
+def encode_image(image) -> bytes:
+    """JPEG bytes of a PIL image (RGBA and palette images are converted to RGB first)."""
+    with BytesIO() as output_buffer:
+        converted_image = None
+        # If the image is in RGBA mode, convert it to RGB mode before saving it in JPEG format.
+        if image.mode in ("RGBA", "P"):
+            converted_image = image = image.convert("RGB")
+        try:
+            image.save(output_buffer, format='JPEG', quality=IMAGE_JPEG_QUALITY)
+        except OSError as e:
+            logging.warning(
+                "Saving image exception, ignore: {}".format(str(e)))
+        finally:
+            if converted_image:
+                converted_image.close()
+        return output_buffer.getvalue()
+
+
+def _release_image(d: dict, img_id: str):
+    d["img_id"] = img_id
+    if not isinstance(d["image"], bytes):
+        d["image"].close()
+    del d["image"]  # Remove image reference
+
+
 async def image2id(d: dict, storage_put_func: partial, objname:str, bucket:str="imagetemps"):
-    import logging
-    from io import BytesIO
     import trio
     from rag.svr.task_executor import minio_limiter
     if "image" not in d:
@@ -36,27 +64,50 @@ async def image2id(d: dict, storage_put_func: partial, objname:str, bucket:str="
         del d["image"]
         return
 
-    with BytesIO() as output_buffer:
-        if isinstance(d["image"], bytes):
-            output_buffer.write(d["image"])
-            output_buffer.seek(0)
-        else:
-            # If the image is in RGBA mode, convert it to RGB mode before saving it in JPEG format.
-            if d["image"].mode in ("RGBA", "P"):
-                converted_image = d["image"].convert("RGB")
-                d["image"] = converted_image
-            try:
-                d["image"].save(output_buffer, format='JPEG')
-            except OSError as e:
-                logging.warning(
-                    "Saving image exception, ignore: {}".format(str(e)))
+    if isinstance(d["image"], bytes):
+        binary = d["image"]
+    else:
+        binary = await trio.to_thread.run_sync(encode_image, d["image"])
+
+    async with minio_limiter:
+        await trio.to_thread.run_sync(lambda: storage_put_func(bucket=bucket, fnm=objname, binary=binary))
+    _release_image(d, f"{bucket}-{objname}")
 
+
+async def images2ids(docs: list[dict], storage_put_func: partial, objnames: list[str], bucket:str="imagetemps"):
+    """
+    image2id for many chunks at once: their images are encoded on a pool of
+    IMAGE_ENCODE_THREADS threads, then uploaded together, `minio_limiter` bounding
+    the uploads in flight.
+    """
+    import trio
+    from rag.svr.task_executor import minio_limiter
+    todo = []
+    for d, objname in zip(docs, objnames):
+        if "image" not in d:
+            continue
+        if not d["image"]:
+            del d["image"]
+            continue
+        todo.append((d, objname))
+    if not todo:
+        return
+
+    def encode_all():
+        with ThreadPoolExecutor(max_workers=IMAGE_ENCODE_THREADS) as pool:
+            return list(pool.map(lambda d: d["image"] if isinstance(d["image"], bytes) else encode_image(d["image"]),
+                                 [d for d, _ in todo]))
+
+    binaries = await trio.to_thread.run_sync(encode_all)
+
+    async def upload(d, objname, binary):
         async with minio_limiter:
-            await trio.to_thread.run_sync(lambda: storage_put_func(bucket=bucket, fnm=objname, binary=output_buffer.getvalue()))
-        d["img_id"] = f"{bucket}-{objname}"
-        if not isinstance(d["image"], bytes):
-            d["image"].close()
-        del d["image"]  # Remove image reference
+            await trio.to_thread.run_sync(lambda: storage_put_func(bucket=bucket, fnm=objname, binary=binary))
+        _release_image(d, f"{bucket}-{objname}")
+
+    async with trio.open_nursery() as nursery:
+        for (d, objname), binary in zip(todo, binaries):
+            nursery.start_soon(upload, d, objname, binary)
 
 
 def id2image(image_id:str|None, storage_get_func: partial):
@@ -0,0 +1,138 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+DOC_BULK_CHUNK_BYTES = int(os.environ.get("DOC_BULK_CHUNK_BYTES", 10 * 1024 * 1024))
+DOC_BULK_CHUNK_DOCS = int(os.environ.get("DOC_BULK_CHUNK_DOCS", 500))
+DOC_BULK_THREADS = int(os.environ.get("DOC_BULK_THREADS", 4))
+DOC_BULK_ATTEMPTS = int(os.environ.get("DOC_BULK_ATTEMPTS", 3))
+
+# Item statuses worth sending again: the node was overloaded or unavailable, not the document rejected.
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+
+def _dumps(d) -> str:
+    return json.dumps(d, ensure_ascii=False)
+
+
+def index_actions(documents: list[dict], index_name: str, kb_id: str | None = None) -> Iterator[tuple[str, dict, dict]]:
+    """
+    (id, action, source) of each document. The source is a shallow copy without `id`,
+    the field values (vectors, token lists) are shared with the caller's documents.
+    """
+    for d in documents:
+        assert "_id" not in d
+        assert "id" in d
+        source = {k: v for k, v in d.items() if k != "id"}
+        if kb_id is not None:
+            source["kb_id"] = kb_id
+        yield d["id"], {"index": {"_index": index_name, "_id": d["id"]}}, source
+
+
+class _Item:
+    __slots__ = ("id", "lines", "size")
+
+    def __init__(self, id, lines: tuple):
+        self.id = id
+        self.lines = lines
+        self.size = len(lines[0]) + len(lines[1]) + 2
+
+
+def _chunks(items: Iterable[_Item], chunk_bytes: int, chunk_docs: int) -> Iterator[list[_Item]]:
+    chunk, size = [], 0
+    for it in items:
+        if chunk and (size + it.size > chunk_bytes or len(chunk) >= chunk_docs):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(it)
+        size += it.size
+    if chunk:
+        yield chunk
+
+
+def _error_status(result: dict) -> tuple[int, object]:
+    for action in ["create", "delete", "index", "update"]:
+        if action in result:
+            r = result[action]
+            return int(r.get("status", 200)), r.get("error")
+    return 200, None
+
+
+def parallel_bulk(bulk: Callable[[list], dict], actions: Iterable[tuple[str, dict, dict]],
+                  dumps: Callable = _dumps, chunk_bytes: int = DOC_BULK_CHUNK_BYTES,
+                  chunk_docs: int = DOC_BULK_CHUNK_DOCS, threads: int = DOC_BULK_THREADS,
+                  attempts: int = DOC_BULK_ATTEMPTS, backoff: float | int = 1.) -> list[str]:
+    """
+    Send `actions` through `bulk(operations)` in chunks of at most `chunk_bytes` serialized
+    bytes (and `chunk_docs` documents), with up to `threads` chunks in flight.
+
+    Actions are serialized once while the chunks are being cut, so only the in-flight chunks
+    are held as text. Items rejected with a retryable status, and all the items of a chunk
+    whose request raised, are sent again in new chunks, up to `attempts` times in total.
+    Returns "id:error" for every document that couldn't be indexed.
+    """
+    threads = max(1, threads)
+    errors = []
+
+    def send(chunk: list[_Item]) -> list[tuple[_Item, object]]:
+        try:
+            r = bulk([ln for it in chunk for ln in it.lines])
+        except Exception as e:
+            logging.warning(f"Bulk request of {len(chunk)} documents got exception: {e}")
+            return [(it, e) for it in chunk]
+        if not r.get("errors"):
+            return []
+        failed = []
+        for it, result in zip(chunk, r["items"]):
+            status, error = _error_status(result)
+            if error is None and status < 300:
+                continue
+            if status in RETRYABLE_STATUS:
+                failed.append((it, error))
+            else:
+                errors.append(f"{it.id}:{error}")
+        return failed
+
+    items = (_Item(id, (dumps(action), dumps(source))) for id, action, source in actions)
+    for attempt in range(max(1, attempts)):
+        retry = []
+        if threads == 1:
+            for chunk in _chunks(items, chunk_bytes, chunk_docs):
+                retry.extend(send(chunk))
+        else:
+            with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="doc-bulk") as pool:
+                in_flight = deque()
+                for chunk in _chunks(items, chunk_bytes, chunk_docs):
+                    if len(in_flight) >= threads:
+                        retry.extend(in_flight.popleft().result())
+                    in_flight.append(pool.submit(send, chunk))
+                while in_flight:
+                    retry.extend(in_flight.popleft().result())
+        if not retry:
+            return errors
+        if attempt + 1 < attempts:
+            logging.info(f"Retrying {len(retry)} failed bulk items, attempt {attempt + 2}/{attempts}.")
+            time.sleep(backoff * (attempt + 1))
+        items = [it for it, _ in retry]
+
+    errors.extend([f"{it.id}:{error}" for it, error in retry])
+    return errors
@@ -27,6 +27,7 @@ from elastic_transport import ConnectionTimeout
 from common.decorator import singleton
 from common.file_utils import get_project_base_directory
 from common.misc_utils import convert_bytes
+from rag.utils.doc_store_bulk import index_actions, parallel_bulk
 from rag.utils.doc_store_conn import DocStoreConnection, MatchExpr, OrderByExpr, MatchTextExpr, MatchDenseExpr, \
     FusionExpr
 from rag.nlp import is_english, rag_tokenizer
@@ -244,7 +245,10 @@ class ESConnection(DocStoreConnection):
         if limit > 0:
             s = s[offset:offset + limit]
         q = s.to_dict()
-        logger.debug(f"ESConnection.search {str(indexNames)} query: " + json.dumps(q))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("ESConnection.search %s query: %s", indexNames, json.dumps(q))
+        # Only fetch the fields the caller reads, the full source holds every dense vector and token field.
+        source = list(dict.fromkeys(selectFields)) if selectFields else True
 
         for i in range(ATTEMPT_TIME):
             try:
@@ -254,10 +258,10 @@ class ESConnection(DocStoreConnection):
                                      timeout="600s",
                                      # search_type="dfs_query_then_fetch",
                                      track_total_hits=True,
-                                     _source=True)
+                                     _source=source)
                 if str(res.get("timed_out", "")).lower() == "true":
                     raise Exception("Es Timeout.")
-                logger.debug(f"ESConnection.search {str(indexNames)} res: " + str(res))
+                logger.debug("ESConnection.search %s res: %s", indexNames, res)
                 return res
             except ConnectionTimeout:
                 logger.exception("ES request timeout")
@@ -290,40 +294,18 @@ class ESConnection(DocStoreConnection):
 
     def insert(self, documents: list[dict], indexName: str, knowledgebaseId: str = None) -> list[str]:
         # Refers to https://www.elastic.co/guide/en/elasticsearch/reference/current/docs-bulk.html
-        operations = []
-        for d in documents:
-            assert "_id" not in d
-            assert "id" in d
-            d_copy = copy.deepcopy(d)
-            d_copy["kb_id"] = knowledgebaseId
-            meta_id = d_copy.pop("id", "")
-            operations.append(
-                {"index": {"_index": indexName, "_id": meta_id}})
-            operations.append(d_copy)
-
-        res = []
-        for _ in range(ATTEMPT_TIME):
+        def bulk(operations):
             try:
-                res = []
-                r = self.es.bulk(index=(indexName), operations=operations,
-                                 refresh=False, timeout="60s")
-                if re.search(r"False", str(r["errors"]), re.IGNORECASE):
-                    return res
-
-                for item in r["items"]:
-                    for action in ["create", "delete", "index", "update"]:
-                        if action in item and "error" in item[action]:
-                            res.append(str(item[action]["_id"]) + ":" + str(item[action]["error"]))
-                return res
+                return self.es.bulk(index=indexName, operations=operations, refresh=False, timeout="60s")
             except ConnectionTimeout:
                 logger.exception("ES request timeout")
-                time.sleep(3)
                 self._connect()
-                continue
-            except Exception as e:
-                res.append(str(e))
-                logger.warning("ESConnection.insert got exception: " + str(e))
+                raise
 
+        res = parallel_bulk(bulk, index_actions(documents, indexName, knowledgebaseId),
+                            dumps=self.es.transport.serializers.get_serializer("application/json").dumps)
+        if res:
+            logger.warning(f"ESConnection.insert {len(res)} documents failed, e.g. {res[0]}")
         return res
 
     def update(self, condition: dict, newValue: dict, indexName: str, knowledgebaseId: str) -> bool:
@@ -482,9 +464,10 @@ class ESConnection(DocStoreConnection):
     def __getSource(self, res):
         rr = []
         for d in res["hits"]["hits"]:
-            d["_source"]["id"] = d["_id"]
-            d["_source"]["_score"] = d["_score"]
-            rr.append(d["_source"])
+            src = d.setdefault("_source", {})
+            src["id"] = d["_id"]
+            src["_score"] = d["_score"]
+            rr.append(src)
         return rr
 
     def getFields(self, res, fields: list[str]) -> dict[str, dict]:
@@ -520,7 +503,10 @@ class ESConnection(DocStoreConnection):
                 ans[d["_id"]] = txt
                 continue
 
-            txt = d["_source"][fieldnm]
+            txt = d.get("_source", {}).get(fieldnm)
+            if not txt:
+                ans[d["_id"]] = "...".join([a for a in list(hlts.items())[0][1]])
+                continue
             txt = re.sub(r"[\r\n]", " ", txt, flags=re.IGNORECASE | re.MULTILINE)
             txts = []
             for t in re.split(r"[.?!;\n]", txt):
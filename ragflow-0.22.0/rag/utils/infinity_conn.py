@@ -20,6 +20,11 @@ import re
 import json
 import time
 import copy
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 import infinity
 from infinity.common import ConflictType, InfinityException, SortType
 from infinity.index import IndexInfo, IndexType
@@ -42,6 +47,8 @@ from rag.utils.doc_store_conn import (
 
 logger = logging.getLogger("ragflow.infinity_conn")
 
+INFINITY_SEARCH_THREADS = int(os.environ.get("INFINITY_SEARCH_THREADS", 8))
+
 
 def field_keyword(field_name: str):
     # The "docnm_kwd" field is always a string, not list.
@@ -50,12 +57,18 @@ def field_keyword(field_name: str):
     return False
 
 
-def equivalent_condition_to_str(condition: dict, table_instance=None) -> str | None:
-    assert "_id" not in condition
+def table_columns(table_instance) -> dict:
+    """{column name: (type, default)} of a table."""
     clmns = {}
-    if table_instance:
-        for n, ty, de, _ in table_instance.show_columns().rows():
-            clmns[n] = (ty, de)
+    for n, ty, de, _ in table_instance.show_columns().rows():
+        clmns[n] = (ty, de)
+    return clmns
+
+
+def equivalent_condition_to_str(condition: dict, table_instance=None, clmns: dict | None = None) -> str | None:
+    assert "_id" not in condition
+    if clmns is None:
+        clmns = table_columns(table_instance) if table_instance else {}
 
     def exists(cln):
         nonlocal clmns
@@ -126,6 +139,42 @@ def concat_dataframes(df_list: list[pd.DataFrame], selectFields: list[str]) -> p
     return pd.DataFrame(columns=schema)
 
 
+def scatter_gather(table_names: list[str], search_table: Callable, executor: ThreadPoolExecutor | None = None) -> list:
+    """
+    search_table(table_name) for every table, concurrently on `executor` when there are several,
+    so that a search takes as long as its slowest table. Results are in table order, without the
+    None of tables that don't exist.
+    """
+    if executor is None or len(table_names) <= 1:
+        results = [search_table(table_name) for table_name in table_names]
+    else:
+        results = list(executor.map(search_table, table_names))
+    return [r for r in results if r is not None]
+
+
+def merge_by_score(df_list: list[pd.DataFrame], limit: int) -> pd.DataFrame | None:
+    """
+    The `limit` best rows of dataframes each sorted by descending "_score", picked by a k-way heap
+    merge instead of sorting them all together. None when every dataframe is empty.
+    """
+    df_list = [df for df in df_list if not df.empty]
+    if not df_list:
+        return None
+    if len(df_list) == 1:
+        return df_list[0].head(limit).reset_index(drop=True)
+
+    def ranked(scores, offset):
+        return ((-score, offset + i) for i, score in enumerate(scores))
+
+    runs = []
+    offset = 0
+    for df in df_list:
+        runs.append(ranked(df["_score"].tolist(), offset))
+        offset += len(df)
+    positions = [pos for _, pos in itertools.islice(heapq.merge(*runs), limit)]
+    return pd.concat(df_list, axis=0).reset_index(drop=True).iloc[positions].reset_index(drop=True)
+
+
 @singleton
 class InfinityConnection(DocStoreConnection):
     def __init__(self):
@@ -135,6 +184,9 @@ class InfinityConnection(DocStoreConnection):
             host, port = infinity_uri.split(":")
             infinity_uri = infinity.common.NetworkAddress(host, int(port))
         self.connPool = None
+        self._columns = {}
+        self._columns_lock = threading.Lock()
+        self._search_executor = ThreadPoolExecutor(max_workers=INFINITY_SEARCH_THREADS, thread_name_prefix="infinity_search")
         logger.info(f"Use Infinity {infinity_uri} as the doc engine.")
         for _ in range(24):
             try:
@@ -187,6 +239,19 @@ class InfinityConnection(DocStoreConnection):
                     ConflictType.Ignore,
                 )
 
+    def _table_columns(self, table_name: str, table_instance) -> dict:
+        """table_columns() of a table, cached since the schema only changes when the table is (re)created."""
+        clmns = self._columns.get(table_name)
+        if clmns is None:
+            clmns = table_columns(table_instance)
+            with self._columns_lock:
+                self._columns[table_name] = clmns
+        return clmns
+
+    def _forget_columns(self, table_name: str):
+        with self._columns_lock:
+            self._columns.pop(table_name, None)
+
     """
     Database operations
     """
@@ -251,6 +316,7 @@ class InfinityConnection(DocStoreConnection):
                 ConflictType.Ignore,
             )
         self.connPool.release_conn(inf_conn)
+        self._forget_columns(table_name)
         logger.info(f"INFINITY created table {table_name}, vector size {vectorSize}")
 
     def deleteIdx(self, indexName: str, knowledgebaseId: str):
@@ -259,6 +325,7 @@ class InfinityConnection(DocStoreConnection):
         db_instance = inf_conn.get_database(self.dbName)
         db_instance.drop_table(table_name, ConflictType.Ignore)
         self.connPool.release_conn(inf_conn)
+        self._forget_columns(table_name)
         logger.info(f"INFINITY dropped table {table_name}")
 
     def indexExist(self, indexName: str, knowledgebaseId: str) -> bool:
@@ -297,10 +364,6 @@ class InfinityConnection(DocStoreConnection):
         if isinstance(indexNames, str):
             indexNames = indexNames.split(",")
         assert isinstance(indexNames, list) and len(indexNames) > 0
-        inf_conn = self.connPool.get_conn()
-        db_instance = inf_conn.get_database(self.dbName)
-        df_list = list()
-        table_list = list()
         output = selectFields.copy()
         for essential_field in ["id"] + aggFields:
             if essential_field not in output:
@@ -333,17 +396,21 @@ class InfinityConnection(DocStoreConnection):
         filter_fulltext = ""
         if condition:
             table_found = False
+            inf_conn = self.connPool.get_conn()
+            db_instance = inf_conn.get_database(self.dbName)
             for indexName in indexNames:
                 for kb_id in knowledgebaseIds:
                     table_name = f"{indexName}_{kb_id}"
                     try:
-                        filter_cond = equivalent_condition_to_str(condition, db_instance.get_table(table_name))
+                        clmns = self._table_columns(table_name, db_instance.get_table(table_name))
+                        filter_cond = equivalent_condition_to_str(condition, clmns=clmns)
                         table_found = True
                         break
                     except Exception:
                         pass
                 if table_found:
                     break
+            self.connPool.release_conn(inf_conn)
             if not table_found:
                 logger.error(f"No valid tables found for indexNames {indexNames} and knowledgebaseIds {knowledgebaseIds}")
                 return pd.DataFrame(), 0
@@ -398,16 +465,14 @@ class InfinityConnection(DocStoreConnection):
                 else:
                     order_by_expr_list.append((order_field[0], SortType.Desc))
 
-        total_hits_count = 0
-        # Scatter search tables and gather the results
-        for indexName in indexNames:
-            for knowledgebaseId in knowledgebaseIds:
-                table_name = f"{indexName}_{knowledgebaseId}"
+        def search_table(table_name):
+            # Every table is searched on a connection of its own, so that tables go in parallel.
+            inf_conn = self.connPool.get_conn()
+            try:
                 try:
-                    table_instance = db_instance.get_table(table_name)
+                    table_instance = inf_conn.get_database(self.dbName).get_table(table_name)
                 except Exception:
-                    continue
-                table_list.append(table_name)
+                    return None
                 builder = table_instance.output(output)
                 if len(matchExprs) > 0:
                     for matchExpr in matchExprs:
@@ -437,16 +502,25 @@ class InfinityConnection(DocStoreConnection):
                     builder.sort(order_by_expr_list)
                 builder.offset(offset).limit(limit)
                 kb_res, extra_result = builder.option({"total_hits_count": True}).to_df()
-                if extra_result:
-                    total_hits_count += int(extra_result["total_hits_count"])
-                logger.debug(f"INFINITY search table: {str(table_name)}, result: {str(kb_res)}")
-                df_list.append(kb_res)
-        self.connPool.release_conn(inf_conn)
-        res = concat_dataframes(df_list, output)
-        if matchExprs:
-            res["_score"] = res[score_column] + res[PAGERANK_FLD]
-            res = res.sort_values(by="_score", ascending=False).reset_index(drop=True)
-            res = res.head(limit)
+            finally:
+                self.connPool.release_conn(inf_conn)
+            hits = int(extra_result["total_hits_count"]) if extra_result else 0
+            if matchExprs and not kb_res.empty:
+                kb_res["_score"] = kb_res[score_column] + kb_res[PAGERANK_FLD]
+                kb_res = kb_res.sort_values(by="_score", ascending=False, kind="stable")
+            logger.debug(f"INFINITY search table: {str(table_name)}, result: {str(kb_res)}")
+            return kb_res, hits
+
+        # Scatter search tables and gather the results
+        table_names = [f"{indexName}_{knowledgebaseId}" for indexName in indexNames for knowledgebaseId in knowledgebaseIds]
+        results = scatter_gather(table_names, search_table, self._search_executor)
+        df_list = [kb_res for kb_res, _ in results]
+        total_hits_count = sum([hits for _, hits in results])
+        res = merge_by_score(df_list, limit) if matchExprs else None
+        if res is None:
+            res = concat_dataframes(df_list, output)
+            if matchExprs:
+                res["_score"] = res[score_column] + res[PAGERANK_FLD]
         logger.debug(f"INFINITY search final result: {str(res)}")
         return res, total_hits_count
 
@@ -497,8 +571,8 @@ class InfinityConnection(DocStoreConnection):
 
         # embedding fields can't have a default value....
         embedding_clmns = []
-        clmns = table_instance.show_columns().rows()
-        for n, ty, _, _ in clmns:
+        clmns = self._table_columns(table_name, table_instance)
+        for n, (ty, _) in clmns.items():
             r = re.search(r"Embedding\([a-z]+,([0-9]+)\)", ty)
             if not r:
                 continue
@@ -555,11 +629,8 @@ class InfinityConnection(DocStoreConnection):
         # if "exists" in condition:
         #    del condition["exists"]
 
-        clmns = {}
-        if table_instance:
-            for n, ty, de, _ in table_instance.show_columns().rows():
-                clmns[n] = (ty, de)
-        filter = equivalent_condition_to_str(condition, table_instance)
+        clmns = self._table_columns(table_name, table_instance)
+        filter = equivalent_condition_to_str(condition, clmns=clmns)
         removeValue = {}
         for k, v in list(newValue.items()):
             if field_keyword(k):
@@ -629,7 +700,7 @@ class InfinityConnection(DocStoreConnection):
         except Exception:
             logger.warning(f"Skipped deleting from table {table_name} since the table doesn't exist.")
             return 0
-        filter = equivalent_condition_to_str(condition, table_instance)
+        filter = equivalent_condition_to_str(condition, clmns=self._table_columns(table_name, table_instance))
         logger.debug(f"INFINITY delete table {table_name}, filter {filter}.")
         res = table_instance.delete(filter)
         self.connPool.release_conn(inf_conn)
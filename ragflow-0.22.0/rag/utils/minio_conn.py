@@ -15,20 +15,22 @@
 #
 
 import logging
-import time
 from datetime import timedelta
+from functools import partial
 from minio import Minio
 from minio.commonconfig import CopySource
 from minio.error import S3Error
 from io import BytesIO
 from common.decorator import singleton
 from common import settings
+from rag.utils.storage_retry import KnownBuckets, retry
 
 
 @singleton
 class RAGFlowMinio:
     def __init__(self):
         self.conn = None
+        self._buckets = KnownBuckets()
         self.__open__()
 
     def __open__(self):
@@ -62,21 +64,29 @@ class RAGFlowMinio:
                                  )
         return r
 
+    def _on_error(self, bucket, e):
+        if isinstance(e, S3Error):
+            # MinIO answered, the connection is fine.
+            if e.code == "NoSuchBucket":
+                self._buckets.discard(bucket)
+            return
+        self.__open__()
+
+    def _ensure_bucket(self, bucket):
+        if bucket in self._buckets:
+            return
+        if not self.conn.bucket_exists(bucket):
+            self.conn.make_bucket(bucket)
+        self._buckets.add(bucket)
+
     def put(self, bucket, fnm, binary, tenant_id=None):
-        for _ in range(3):
-            try:
-                if not self.conn.bucket_exists(bucket):
-                    self.conn.make_bucket(bucket)
-
-                r = self.conn.put_object(bucket, fnm,
-                                         BytesIO(binary),
-                                         len(binary)
-                                         )
-                return r
-            except Exception:
-                logging.exception(f"Fail to put {bucket}/{fnm}:")
-                self.__open__()
-                time.sleep(1)
+        def _put():
+            self._ensure_bucket(bucket)
+            return self.conn.put_object(bucket, fnm,
+                                        BytesIO(binary),
+                                        len(binary)
+                                        )
+        return retry(_put, 3, partial(self._on_error, bucket), f"put {bucket}/{fnm}:")
 
     def rm(self, bucket, fnm, tenant_id=None):
         try:
@@ -85,23 +95,18 @@ class RAGFlowMinio:
             logging.exception(f"Fail to remove {bucket}/{fnm}:")
 
     def get(self, bucket, filename, tenant_id=None):
-        for _ in range(1):
-            try:
-                r = self.conn.get_object(bucket, filename)
-                return r.read()
-            except Exception:
-                logging.exception(f"Fail to get {bucket}/{filename}")
-                self.__open__()
-                time.sleep(1)
-        return
+        return retry(lambda: self.conn.get_object(bucket, filename).read(), 1,
+                     partial(self._on_error, bucket), f"get {bucket}/{filename}")
 
     def obj_exist(self, bucket, filename, tenant_id=None):
         try:
-            if not self.conn.bucket_exists(bucket):
+            if bucket not in self._buckets and not self.conn.bucket_exists(bucket):
                 return False
             self.conn.stat_object(bucket, filename)
             return True
-        except Exception:
+        except Exception as e:
+            if isinstance(e, S3Error) and e.code == "NoSuchBucket":
+                self._buckets.discard(bucket)
             return False
 
     def get_url(self, bucket, filename, expires=3600):
@@ -114,8 +119,10 @@ class RAGFlowMinio:
     def bucket_exists(self, bucket):
         try:
             if not self.conn.bucket_exists(bucket):
+                self._buckets.discard(bucket)
                 return False
             else:
+                self._buckets.add(bucket)
                 return True
         except S3Error as e:
             if e.code in ["NoSuchKey", "NoSuchBucket", "ResourceNotFound"]:
@@ -125,16 +132,11 @@ class RAGFlowMinio:
             return False
 
     def get_presigned_url(self, bucket, fnm, expires, tenant_id=None):
-        for _ in range(10):
-            try:
-                return self.conn.get_presigned_url("GET", bucket, fnm, expires)
-            except Exception:
-                logging.exception(f"Fail to get_presigned {bucket}/{fnm}:")
-                self.__open__()
-                time.sleep(1)
-        return
+        return retry(lambda: self.conn.get_presigned_url("GET", bucket, fnm, expires), 10,
+                     partial(self._on_error, bucket), f"get_presigned {bucket}/{fnm}:")
 
     def remove_bucket(self, bucket):
+        self._buckets.discard(bucket)
         try:
             if self.conn.bucket_exists(bucket):
                 objects_to_delete = self.conn.list_objects(bucket, recursive=True)
@@ -146,8 +148,7 @@ class RAGFlowMinio:
 
     def copy(self, src_bucket, src_path, dest_bucket, dest_path):
         try:
-            if not self.conn.bucket_exists(dest_bucket):
-                self.conn.make_bucket(dest_bucket)
+            self._ensure_bucket(dest_bucket)
 
             try:
                 self.conn.stat_object(src_bucket, src_path)
@@ -162,7 +163,9 @@ class RAGFlowMinio:
             )
             return True
 
-        except Exception:
+        except Exception as e:
+            if isinstance(e, S3Error) and e.code == "NoSuchBucket":
+                self._buckets.discard(dest_bucket)
             logging.exception(f"Fail to copy {src_bucket}/{src_path} -> {dest_bucket}/{dest_path}")
             return False
 
@@ -26,6 +26,7 @@ from opensearchpy import UpdateByQuery, Q, Search, Index
 from opensearchpy import ConnectionTimeout
 from common.decorator import singleton
 from common.file_utils import get_project_base_directory
+from rag.utils.doc_store_bulk import index_actions, parallel_bulk
 from rag.utils.doc_store_conn import DocStoreConnection, MatchExpr, OrderByExpr, MatchTextExpr, MatchDenseExpr, \
     FusionExpr
 from rag.nlp import is_english, rag_tokenizer
@@ -239,7 +240,10 @@ class OSConnection(DocStoreConnection):
         if limit > 0:
             s = s[offset:offset + limit]
         q = s.to_dict()
-        logger.debug(f"OSConnection.search {str(indexNames)} query: " + json.dumps(q))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("OSConnection.search %s query: %s", indexNames, json.dumps(q))
+        # Only fetch the fields the caller reads, the full source holds every dense vector and token field.
+        source = list(dict.fromkeys(selectFields)) if selectFields else True
         
         if use_knn:
             del q["query"]
@@ -252,10 +256,10 @@ class OSConnection(DocStoreConnection):
                                      timeout=600,
                                      # search_type="dfs_query_then_fetch",
                                      track_total_hits=True,
-                                     _source=True)
+                                     _source=source)
                 if str(res.get("timed_out", "")).lower() == "true":
                     raise Exception("OpenSearch Timeout.")
-                logger.debug(f"OSConnection.search {str(indexNames)} res: " + str(res))
+                logger.debug("OSConnection.search %s res: %s", indexNames, res)
                 return res
             except Exception as e:
                 logger.exception(f"OSConnection.search {str(indexNames)} query: " + str(q))
@@ -287,38 +291,11 @@ class OSConnection(DocStoreConnection):
 
     def insert(self, documents: list[dict], indexName: str, knowledgebaseId: str = None) -> list[str]:
         # Refers to https://opensearch.org/docs/latest/api-reference/document-apis/bulk/
-        operations = []
-        for d in documents:
-            assert "_id" not in d
-            assert "id" in d
-            d_copy = copy.deepcopy(d)
-            meta_id = d_copy.pop("id", "")
-            operations.append(
-                {"index": {"_index": indexName, "_id": meta_id}})
-            operations.append(d_copy)
-
-        res = []
-        for _ in range(ATTEMPT_TIME):
-            try:
-                res = []
-                r = self.os.bulk(index=(indexName), body=operations,
-                                 refresh=False, timeout=60)
-                if re.search(r"False", str(r["errors"]), re.IGNORECASE):
-                    return res
-
-                for item in r["items"]:
-                    for action in ["create", "delete", "index", "update"]:
-                        if action in item and "error" in item[action]:
-                            res.append(str(item[action]["_id"]) + ":" + str(item[action]["error"]))
-                return res
-            except Exception as e:
-                res.append(str(e))
-                logger.warning("OSConnection.insert got exception: " + str(e))
-                res = []
-                if re.search(r"(Timeout|time out)", str(e), re.IGNORECASE):
-                    res.append(str(e))
-                    time.sleep(3)
-                    continue
+        res = parallel_bulk(lambda operations: self.os.bulk(index=indexName, body=operations, refresh=False, timeout=60),
+                            index_actions(documents, indexName),
+                            dumps=self.os.transport.serializer.dumps)
+        if res:
+            logger.warning(f"OSConnection.insert {len(res)} documents failed, e.g. {res[0]}")
         return res
 
     def update(self, condition: dict, newValue: dict, indexName: str, knowledgebaseId: str) -> bool:
@@ -466,9 +443,10 @@ class OSConnection(DocStoreConnection):
     def __getSource(self, res):
         rr = []
         for d in res["hits"]["hits"]:
-            d["_source"]["id"] = d["_id"]
-            d["_source"]["_score"] = d["_score"]
-            rr.append(d["_source"])
+            src = d.setdefault("_source", {})
+            src["id"] = d["_id"]
+            src["_score"] = d["_score"]
+            rr.append(src)
         return rr
 
     def getFields(self, res, fields: list[str]) -> dict[str, dict]:
@@ -501,7 +479,10 @@ class OSConnection(DocStoreConnection):
                 ans[d["_id"]] = txt
                 continue
 
-            txt = d["_source"][fieldnm]
+            txt = d.get("_source", {}).get(fieldnm)
+            if not txt:
+                ans[d["_id"]] = "...".join([a for a in list(hlts.items())[0][1]])
+                continue
             txt = re.sub(r"[\r\n]", " ", txt, flags=re.IGNORECASE | re.MULTILINE)
             txts = []
             for t in re.split(r"[.?!;\n]", txt):
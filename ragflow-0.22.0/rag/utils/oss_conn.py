@@ -17,16 +17,18 @@ import logging
 import boto3
 from botocore.exceptions import ClientError
 from botocore.config import Config
-import time
+from functools import partial
 from io import BytesIO
 from common.decorator import singleton
 from common import settings
+from rag.utils.storage_retry import KnownBuckets, retry
 
 
 @singleton
 class RAGFlowOSS:
     def __init__(self):
         self.conn = None
+        self._buckets = KnownBuckets()
         self.oss_config = settings.OSS
         self.access_key = self.oss_config.get('access_key', None)
         self.secret_key = self.oss_config.get('secret_key', None)
@@ -104,22 +106,30 @@ class RAGFlowOSS:
     def list(self, bucket, dir, recursive=True):
         return []
 
+    def _on_error(self, bucket, e):
+        if isinstance(e, ClientError):
+            # The service answered, the connection is fine.
+            if e.response.get("Error", {}).get("Code") == "NoSuchBucket":
+                self._buckets.discard(bucket)
+            return
+        self.__open__()
+
+    def _ensure_bucket(self, bucket):
+        if bucket in self._buckets:
+            return
+        if not self.bucket_exists(bucket):
+            self.conn.create_bucket(Bucket=bucket)
+            logging.info(f"create bucket {bucket} ********")
+        self._buckets.add(bucket)
+
     @use_prefix_path
     @use_default_bucket
     def put(self, bucket, fnm, binary, tenant_id=None):
         logging.debug(f"bucket name {bucket}; filename :{fnm}:")
-        for _ in range(1):
-            try:
-                if not self.bucket_exists(bucket):
-                    self.conn.create_bucket(Bucket=bucket)
-                    logging.info(f"create bucket {bucket} ********")
-                r = self.conn.upload_fileobj(BytesIO(binary), bucket, fnm)
-
-                return r
-            except Exception:
-                logging.exception(f"Fail put {bucket}/{fnm}")
-                self.__open__()
-                time.sleep(1)
+        def _put():
+            self._ensure_bucket(bucket)
+            return self.conn.upload_fileobj(BytesIO(binary), bucket, fnm)
+        return retry(_put, 1, partial(self._on_error, bucket), f"put {bucket}/{fnm}")
 
     @use_prefix_path
     @use_default_bucket
@@ -132,16 +142,8 @@ class RAGFlowOSS:
     @use_prefix_path
     @use_default_bucket
     def get(self, bucket, fnm, tenant_id=None):
-        for _ in range(1):
-            try:
-                r = self.conn.get_object(Bucket=bucket, Key=fnm)
-                object_data = r['Body'].read()
-                return object_data
-            except Exception:
-                logging.exception(f"fail get {bucket}/{fnm}")
-                self.__open__()
-                time.sleep(1)
-        return
+        return retry(lambda: self.conn.get_object(Bucket=bucket, Key=fnm)['Body'].read(), 1,
+                     partial(self._on_error, bucket), f"get {bucket}/{fnm}")
 
     @use_prefix_path
     @use_default_bucket
@@ -158,17 +160,7 @@ class RAGFlowOSS:
     @use_prefix_path
     @use_default_bucket
     def get_presigned_url(self, bucket, fnm, expires, tenant_id=None):
-        for _ in range(10):
-            try:
-                r = self.conn.generate_presigned_url('get_object',
-                                                     Params={'Bucket': bucket,
-                                                             'Key': fnm},
-                                                     ExpiresIn=expires)
-
-                return r
-            except Exception:
-                logging.exception(f"fail get url {bucket}/{fnm}")
-                self.__open__()
-                time.sleep(1)
-        return
+        def _url():
+            return self.conn.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': fnm}, ExpiresIn=expires)
+        return retry(_url, 10, partial(self._on_error, bucket), f"get url {bucket}/{fnm}")
 
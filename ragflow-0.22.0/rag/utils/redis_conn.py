@@ -71,6 +71,8 @@ class RedisDB:
     def __init__(self):
         self.REDIS = None
         self.config = REDIS
+        # (queue, group) pairs known to exist, so that reads don't have to check for the group first.
+        self._queue_groups = set()
         self.__open__()
 
     def register_scripts(self) -> None:
@@ -225,6 +227,28 @@ class RedisDB:
             self.__open__()
         return None
 
+    def rpush_obj(self, key: str, obj, max_len: int, exp=3600):
+        """Append obj to the list at key, keeping its last max_len items."""
+        try:
+            pipeline = self.REDIS.pipeline(transaction=False)
+            pipeline.rpush(key, json.dumps(obj, ensure_ascii=False))
+            pipeline.ltrim(key, -max_len, -1)
+            pipeline.expire(key, exp)
+            pipeline.execute()
+            return True
+        except Exception as e:
+            logging.warning("RedisDB.rpush_obj " + str(key) + " got exception: " + str(e))
+            self.__open__()
+        return False
+
+    def lrange_obj(self, key: str, start: int = 0, end: int = -1) -> list:
+        try:
+            return [json.loads(v) for v in self.REDIS.lrange(key, start, end)]
+        except Exception as e:
+            logging.warning("RedisDB.lrange_obj " + str(key) + " got exception: " + str(e))
+            self.__open__()
+        return []
+
     def transaction(self, key, value, exp=3600):
         try:
             pipeline = self.REDIS.pipeline(transaction=True)
@@ -251,52 +275,72 @@ class RedisDB:
                 self.__open__()
         return False
 
-    def queue_consumer(self, queue_name, group_name, consumer_name, msg_id=b">") -> RedisMsg:
-        """https://redis.io/docs/latest/commands/xreadgroup/"""
+    def _create_queue_group(self, queue_name, group_name):
+        try:
+            self.REDIS.xgroup_create(queue_name, group_name, id="0", mkstream=True)
+        except redis.exceptions.ResponseError as e:
+            if "busygroup" not in str(e).lower():
+                raise
+        self._queue_groups.add((queue_name, group_name))
+
+    def queue_consumer_batch(self, queue_names: list[str], group_name, consumer_name, count=1, block=5, msg_id=b">") -> list[RedisMsg]:
+        """
+        Up to `count` messages of each queue in one XREADGROUP, waiting up to `block` ms for one
+        to arrive. The consumer group is created the first time a queue is read, and again only
+        if Redis answers NOGROUP because the stream or the group was deleted since.
+        https://redis.io/docs/latest/commands/xreadgroup/
+        """
         for _ in range(3):
             try:
-
-                try:
-                    group_info = self.REDIS.xinfo_groups(queue_name)
-                    if not any(gi["name"] == group_name for gi in group_info):
-                        self.REDIS.xgroup_create(queue_name, group_name, id="0", mkstream=True)
-                except redis.exceptions.ResponseError as e:
-                    if "no such key" in str(e).lower():
-                        self.REDIS.xgroup_create(queue_name, group_name, id="0", mkstream=True)
-                    elif "busygroup" in str(e).lower():
-                        logging.warning("Group already exists, continue.")
-                        pass
-                    else:
-                        raise
-
-                args = {
-                    "groupname": group_name,
-                    "consumername": consumer_name,
-                    "count": 1,
-                    "block": 5,
-                    "streams": {queue_name: msg_id},
-                }
-                messages = self.REDIS.xreadgroup(**args)
-                if not messages:
-                    return None
-                stream, element_list = messages[0]
-                if not element_list:
-                    return None
-                msg_id, payload = element_list[0]
-                res = RedisMsg(self.REDIS, queue_name, group_name, msg_id, payload)
-                return res
+                for queue_name in queue_names:
+                    if (queue_name, group_name) not in self._queue_groups:
+                        self._create_queue_group(queue_name, group_name)
+                messages = self.REDIS.xreadgroup(
+                    groupname=group_name,
+                    consumername=consumer_name,
+                    streams={queue_name: msg_id for queue_name in queue_names},
+                    count=count,
+                    block=block,
+                )
+                return [RedisMsg(self.REDIS, stream, group_name, mid, payload)
+                        for stream, element_list in messages or [] for mid, payload in element_list]
+            except redis.exceptions.ResponseError as e:
+                if "nogroup" in str(e).lower():
+                    for queue_name in queue_names:
+                        self._queue_groups.discard((queue_name, group_name))
+                    continue
+                logging.exception("RedisDB.queue_consumer " + str(queue_names) + " got exception: " + str(e))
+                self.__open__()
             except Exception as e:
                 if str(e) == 'no such key':
                     pass
                 else:
                     logging.exception(
                         "RedisDB.queue_consumer "
-                        + str(queue_name)
+                        + str(queue_names)
                         + " got exception: "
                         + str(e)
                     )
                     self.__open__()
-        return None
+        return []
+
+    def queue_consumer_by_priority(self, queue_names: list[str], group_name, consumer_name, count=1, block=5) -> list[RedisMsg]:
+        """
+        Up to `count` messages in all, taken from `queue_names` in order, so that the messages of
+        a later queue never get ahead of a task arriving in an earlier one. When they are all
+        empty, waits up to `block` ms for the first message to arrive, in any of them.
+        """
+        msgs = []
+        for queue_name in queue_names:
+            if len(msgs) < count:
+                msgs.extend(self.queue_consumer_batch([queue_name], group_name, consumer_name, count=count - len(msgs), block=None))
+        if msgs:
+            return msgs
+        return self.queue_consumer_batch(queue_names, group_name, consumer_name, count=1, block=block)
+
+    def queue_consumer(self, queue_name, group_name, consumer_name, msg_id=b">") -> RedisMsg:
+        msgs = self.queue_consumer_batch([queue_name], group_name, consumer_name, count=1, msg_id=msg_id)
+        return msgs[0] if msgs else None
 
     def get_unacked_iterator(self, queue_names: list[str], group_name, consumer_name):
         try:
@@ -18,16 +18,18 @@ import logging
 import boto3
 from botocore.exceptions import ClientError
 from botocore.config import Config
-import time
+from functools import partial
 from io import BytesIO
 from common.decorator import singleton
 from common import settings
+from rag.utils.storage_retry import KnownBuckets, retry
 
 
 @singleton
 class RAGFlowS3:
     def __init__(self):
         self.conn = None
+        self._buckets = KnownBuckets()
         self.s3_config = settings.S3
         self.access_key = self.s3_config.get('access_key', None)
         self.secret_key = self.s3_config.get('secret_key', None)
@@ -127,22 +129,30 @@ class RAGFlowS3:
     def list(self, bucket, dir, recursive=True):
         return []
 
+    def _on_error(self, bucket, e):
+        if isinstance(e, ClientError):
+            # The service answered, the connection is fine.
+            if e.response.get("Error", {}).get("Code") == "NoSuchBucket":
+                self._buckets.discard(bucket)
+            return
+        self.__open__()
+
+    def _ensure_bucket(self, bucket):
+        if bucket in self._buckets:
+            return
+        if not self.bucket_exists(bucket):
+            self.conn[0].create_bucket(Bucket=bucket)
+            logging.info(f"create bucket {bucket} ********")
+        self._buckets.add(bucket)
+
     @use_prefix_path
     @use_default_bucket
     def put(self, bucket, fnm, binary, *args, **kwargs):
         logging.debug(f"bucket name {bucket}; filename :{fnm}:")
-        for _ in range(1):
-            try:
-                if not self.bucket_exists(bucket):
-                    self.conn[0].create_bucket(Bucket=bucket)
-                    logging.info(f"create bucket {bucket} ********")
-                r = self.conn[0].upload_fileobj(BytesIO(binary), bucket, fnm)
-
-                return r
-            except Exception:
-                logging.exception(f"Fail put {bucket}/{fnm}")
-                self.__open__()
-                time.sleep(1)
+        def _put():
+            self._ensure_bucket(bucket)
+            return self.conn[0].upload_fileobj(BytesIO(binary), bucket, fnm)
+        return retry(_put, 1, partial(self._on_error, bucket), f"put {bucket}/{fnm}")
 
     @use_prefix_path
     @use_default_bucket
@@ -155,16 +165,8 @@ class RAGFlowS3:
     @use_prefix_path
     @use_default_bucket
     def get(self, bucket, fnm, *args, **kwargs):
-        for _ in range(1):
-            try:
-                r = self.conn[0].get_object(Bucket=bucket, Key=fnm)
-                object_data = r['Body'].read()
-                return object_data
-            except Exception:
-                logging.exception(f"fail get {bucket}/{fnm}")
-                self.__open__()
-                time.sleep(1)
-        return
+        return retry(lambda: self.conn[0].get_object(Bucket=bucket, Key=fnm)['Body'].read(), 1,
+                     partial(self._on_error, bucket), f"get {bucket}/{fnm}")
 
     @use_prefix_path
     @use_default_bucket
@@ -181,22 +183,13 @@ class RAGFlowS3:
     @use_prefix_path
     @use_default_bucket
     def get_presigned_url(self, bucket, fnm, expires, *args, **kwargs):
-        for _ in range(10):
-            try:
-                r = self.conn[0].generate_presigned_url('get_object',
-                                                     Params={'Bucket': bucket,
-                                                             'Key': fnm},
-                                                     ExpiresIn=expires)
-
-                return r
-            except Exception:
-                logging.exception(f"fail get url {bucket}/{fnm}")
-                self.__open__()
-                time.sleep(1)
-        return
+        def _url():
+            return self.conn[0].generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': fnm}, ExpiresIn=expires)
+        return retry(_url, 10, partial(self._on_error, bucket), f"get url {bucket}/{fnm}")
 
     @use_default_bucket
     def rm_bucket(self, bucket, *args, **kwargs):
+        self._buckets.discard(bucket)
         for conn in self.conn:
             try:
                 if not conn.bucket_exists(bucket):
@@ -0,0 +1,66 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable
+
+STORAGE_RETRY_BASE_DELAY = float(os.environ.get("STORAGE_RETRY_BASE_DELAY", 0.2))
+STORAGE_RETRY_MAX_DELAY = float(os.environ.get("STORAGE_RETRY_MAX_DELAY", 2))
+
+
+def backoff_delay(attempt: int, base: float | int = STORAGE_RETRY_BASE_DELAY, max_delay: float | int = STORAGE_RETRY_MAX_DELAY) -> float:
+    """Seconds to wait after the `attempt`-th failure: doubling from `base` up to `max_delay`, half of it jittered."""
+    delay = min(max_delay, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def retry(fn: Callable[[], Any], attempts: int, on_error: Callable[[Exception], None], what: str) -> Any:
+    """
+    fn() with up to `attempts` tries and exponential backoff in between. `on_error` is told
+    about every failure, e.g. to forget a bucket or reopen a broken client.
+    Returns None when every try failed.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            logging.exception(f"Fail to {what}")
+            on_error(e)
+            if attempt + 1 < attempts:
+                time.sleep(backoff_delay(attempt))
+    return None
+
+
+class KnownBuckets:
+    """Buckets this process has seen to exist, so that object writes don't check for their bucket every time."""
+
+    def __init__(self):
+        self._buckets = set()
+        self._lock = threading.Lock()
+
+    def __contains__(self, bucket) -> bool:
+        return bucket in self._buckets
+
+    def add(self, bucket):
+        with self._lock:
+            self._buckets.add(bucket)
+
+    def discard(self, bucket):
+        with self._lock:
+            self._buckets.discard(bucket)
@@ -14,6 +14,8 @@
 #  limitations under the License.
 #
 
+import re
+
 from .base import Base
 from .document import Document
 
@@ -105,29 +107,59 @@ class DataSet(Base):
     def _get_documents_status(self, document_ids):
         import time
         terminal_states = {"DONE", "FAIL", "CANCEL"}
-        interval_sec = 1
+        # The server waits up to `wait` seconds for a change; between calls, back off while nothing finishes.
+        wait_sec, interval_sec, max_interval_sec = 10, 0.5, 5
         pending = set(document_ids)
         finished = []
+        status_api = True
         while pending:
-            for doc_id in list(pending):
-                def fetch_doc(doc_id: str) -> Document | None:
-                    try:
-                        docs = self.list_documents(id=doc_id)
-                        return docs[0] if docs else None
-                    except Exception:
-                        return None
-                doc = fetch_doc(doc_id)
-                if doc is None:
+            docs = self._fetch_documents_status(list(pending), wait_sec) if status_api else None
+            if docs is None:
+                # The server predates /documents/status.
+                status_api, interval_sec = False, 1
+                docs = self._list_documents_status(pending)
+            done = 0
+            for doc in docs:
+                if doc["id"] not in pending:
+                    continue
+                if isinstance(doc["run"], str) and doc["run"].upper() in terminal_states:
+                    finished.append((doc["id"], doc["run"], doc["chunk_count"], doc["token_count"]))
+                elif float(doc["progress"] or 0.0) >= 1.0:
+                    finished.append((doc["id"], "DONE", doc["chunk_count"], doc["token_count"]))
+                else:
                     continue
-                if isinstance(doc.run, str) and doc.run.upper() in terminal_states:
-                    finished.append((doc_id, doc.run, doc.chunk_count, doc.token_count))
-                    pending.discard(doc_id)
-                elif float(doc.progress or 0.0) >= 1.0:
-                    finished.append((doc_id, "DONE", doc.chunk_count, doc.token_count))
-                    pending.discard(doc_id)
+                pending.discard(doc["id"])
+                done += 1
             if pending:
+                if status_api:
+                    interval_sec = 0.5 if done else min(interval_sec * 2, max_interval_sec)
                 time.sleep(interval_sec)
         return finished
+
+    def _fetch_documents_status(self, document_ids, wait):
+        """Status dicts of the documents, or None if the server has no /documents/status route."""
+        res = self.post(f"/datasets/{self.id}/documents/status", {"ids": document_ids, "wait": wait})
+        if res.status_code in (404, 405):
+            return None
+        res = res.json()
+        if res.get("code") != 0:
+            # Unknown routes come back through the JSON error handler, e.g. "<MethodNotAllowed '405: Method Not Allowed'>".
+            if re.search(r"\b40[45]: (Not Found|Method Not Allowed)\b", str(res.get("message"))):
+                return None
+            raise Exception(res.get("message"))
+        return res["data"]
+
+    def _list_documents_status(self, document_ids):
+        docs = []
+        for doc_id in document_ids:
+            try:
+                found = self.list_documents(id=doc_id)
+            except Exception:
+                continue
+            if found:
+                doc = found[0]
+                docs.append({"id": doc_id, "run": doc.run, "progress": doc.progress, "chunk_count": doc.chunk_count, "token_count": doc.token_count})
+        return docs
     
     def async_parse_documents(self, document_ids):
         res = self.post(f"/datasets/{self.id}/chunks", {"document_ids": document_ids})
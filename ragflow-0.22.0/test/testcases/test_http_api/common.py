@@ -132,6 +132,12 @@ def stop_parse_documents(auth, dataset_id, payload=None):
     return res.json()
 
 
+def documents_status(auth, dataset_id, payload=None):
+    url = f"{HOST_ADDRESS}{FILE_API_URL}/status".format(dataset_id=dataset_id)
+    res = requests.post(url=url, headers=HEADERS, auth=auth, json=payload)
+    return res.json()
+
+
 def bulk_upload_documents(auth, dataset_id, num, tmp_path):
     fps = []
     for i in range(num):
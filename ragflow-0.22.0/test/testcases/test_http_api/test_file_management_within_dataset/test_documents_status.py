@@ -0,0 +1,109 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+from time import monotonic
+
+import pytest
+from common import documents_status, parse_documents
+from configs import INVALID_API_TOKEN
+from libs.auth import RAGFlowHttpApiAuth
+from utils import wait_for
+
+
+@wait_for(30, 1, "Document parsing timeout")
+def condition(_auth, _dataset_id, _document_ids):
+    res = documents_status(_auth, _dataset_id, {"ids": _document_ids})
+    return len(res["data"]) == len(_document_ids) and all([doc["run"] == "DONE" for doc in res["data"]])
+
+
+@pytest.mark.p1
+class TestAuthorization:
+    @pytest.mark.parametrize(
+        "invalid_auth, expected_code, expected_message",
+        [
+            (None, 0, "`Authorization` can't be empty"),
+            (
+                RAGFlowHttpApiAuth(INVALID_API_TOKEN),
+                109,
+                "Authentication error: API key is invalid!",
+            ),
+        ],
+    )
+    def test_invalid_auth(self, invalid_auth, expected_code, expected_message):
+        res = documents_status(invalid_auth, "dataset_id", {"ids": ["document_id"]})
+        assert res["code"] == expected_code
+        assert res["message"] == expected_message
+
+
+class TestDocumentsStatus:
+    @pytest.mark.parametrize(
+        "payload, expected_message",
+        [
+            pytest.param({}, "`ids` is required and must be a list.", marks=pytest.mark.p1),
+            pytest.param({"ids": []}, "`ids` is required and must be a list.", marks=pytest.mark.p3),
+            pytest.param({"ids": "document_id"}, "`ids` is required and must be a list.", marks=pytest.mark.p3),
+            pytest.param(lambda r: {"ids": r, "wait": "soon"}, "`wait` must be a number.", marks=pytest.mark.p3),
+        ],
+    )
+    def test_invalid_payload(self, HttpApiAuth, add_documents, payload, expected_message):
+        dataset_id, document_ids = add_documents
+        if callable(payload):
+            payload = payload(document_ids)
+        res = documents_status(HttpApiAuth, dataset_id, payload)
+        assert res["code"] == 102
+        assert res["message"] == expected_message
+
+    @pytest.mark.p3
+    def test_invalid_dataset_id(self, HttpApiAuth, add_documents):
+        _, document_ids = add_documents
+        res = documents_status(HttpApiAuth, "invalid_dataset_id", {"ids": document_ids})
+        assert res["code"] == 102
+        assert res["message"] == "You don't own the dataset invalid_dataset_id. "
+
+    @pytest.mark.p1
+    def test_unparsed_documents(self, HttpApiAuth, add_documents):
+        dataset_id, document_ids = add_documents
+        res = documents_status(HttpApiAuth, dataset_id, {"ids": document_ids + ["invalid_id"]})
+        assert res["code"] == 0
+        # Unknown ids are left out, the others are sorted by id.
+        assert [doc["id"] for doc in res["data"]] == sorted(document_ids)
+        for doc in res["data"]:
+            assert doc["run"] == "UNSTART"
+            assert doc["chunk_count"] == 0 and doc["token_count"] == 0
+
+    @pytest.mark.p2
+    def test_wait_is_capped(self, HttpApiAuth, add_documents):
+        dataset_id, document_ids = add_documents
+        start = monotonic()
+        res = documents_status(HttpApiAuth, dataset_id, {"ids": document_ids[:1], "wait": 1})
+        assert res["code"] == 0
+        assert monotonic() - start < 10
+
+    @pytest.mark.p1
+    def test_parsed_documents(self, HttpApiAuth, add_documents_func):
+        dataset_id, document_ids = add_documents_func
+        res = parse_documents(HttpApiAuth, dataset_id, {"document_ids": document_ids})
+        assert res["code"] == 0
+
+        condition(HttpApiAuth, dataset_id, document_ids)
+
+        # Finished documents are returned at once, whatever the wait.
+        start = monotonic()
+        res = documents_status(HttpApiAuth, dataset_id, {"ids": document_ids, "wait": 30})
+        assert monotonic() - start < 10
+        for doc in res["data"]:
+            assert doc["run"] == "DONE"
+            assert doc["progress"] == 1
+            assert doc["chunk_count"] > 0 and doc["token_count"] > 0
@@ -160,3 +160,82 @@ def test_concurrent_parse(add_dataset_func, tmp_path):
 
     condition(dataset, count)
     validate_document_details(dataset, document_ids)
+
+
+@pytest.mark.p1
+def test_parse_documents_returns_status(add_documents_func):
+    dataset, documents = add_documents_func
+    document_ids = [doc.id for doc in documents]
+    finished = dataset.parse_documents(document_ids)
+    assert sorted([doc_id for doc_id, _, _, _ in finished]) == sorted(document_ids)
+    for _, run, chunk_count, token_count in finished:
+        assert run == "DONE"
+        assert chunk_count > 0 and token_count > 0
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def json(self):
+        return self.body
+
+
+class FakeRAG:
+    """Answers the status polling of DataSet without a server."""
+
+    def __init__(self, status_responses, docs=None):
+        self.status_responses = list(status_responses)
+        self.docs = docs or {}
+        self.posts = []
+        self.gets = []
+
+    def post(self, path, json=None, stream=False, files=None):
+        self.posts.append((path, json))
+        return self.status_responses.pop(0)
+
+    def get(self, path, params=None):
+        self.gets.append((path, params))
+        doc = self.docs.get(params["id"])
+        return FakeResponse({"code": 0, "data": {"docs": [doc] if doc else []}})
+
+
+def status(doc_id, run, progress=0.0):
+    return {"id": doc_id, "run": run, "progress": progress, "chunk_count": 3 if run == "DONE" else 0, "token_count": 42 if run == "DONE" else 0}
+
+
+@pytest.mark.p2
+class TestDocumentsStatusPolling:
+    def test_status_endpoint(self):
+        rag = FakeRAG([
+            FakeResponse({"code": 0, "data": [status("d1", "DONE", 1.0), status("d2", "RUNNING", 0.5)]}),
+            FakeResponse({"code": 0, "data": [status("d2", "FAIL", 0.5)]}),
+        ])
+        finished = DataSet(rag, {"id": "ds"})._get_documents_status(["d1", "d2"])
+        assert finished == [("d1", "DONE", 3, 42), ("d2", "FAIL", 0, 0)]
+        assert rag.posts[1] == ("/datasets/ds/documents/status", {"ids": ["d2"], "wait": 10})
+        assert not rag.gets
+
+    @pytest.mark.parametrize(
+        "missing_route",
+        [
+            FakeResponse({"code": 100, "message": "<MethodNotAllowed '405: Method Not Allowed'>"}),
+            FakeResponse({"code": 100, "message": "<NotFound '404: Not Found'>"}),
+            FakeResponse(None, status_code=404),
+        ],
+    )
+    def test_falls_back_to_list_documents(self, missing_route):
+        docs = {"d1": {"id": "d1", "run": "DONE", "progress": 1.0, "chunk_count": 3, "token_count": 42}}
+        rag = FakeRAG([missing_route], docs)
+        finished = DataSet(rag, {"id": "ds"})._get_documents_status(["d1"])
+        assert finished == [("d1", "DONE", 3, 42)]
+        assert len(rag.posts) == 1
+        assert rag.gets == [("/datasets/ds/documents", {"id": "d1", "name": None, "keywords": None, "page": 1, "page_size": 30, "orderby": "create_time",
+                                                         "desc": True, "create_time_from": 0, "create_time_to": 0})]
+
+    def test_error_is_raised(self):
+        rag = FakeRAG([FakeResponse({"code": 102, "message": "You don't own the dataset ds. "})])
+        with pytest.raises(Exception) as excinfo:
+            DataSet(rag, {"id": "ds"})._get_documents_status(["d1"])
+        assert "You don't own the dataset ds." in str(excinfo.value)
@@ -0,0 +1,106 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+import threading
+from types import SimpleNamespace
+
+import agent.component.agent_with_tools as agent_with_tools
+from agent.component.agent_with_tools import Agent
+from agent.tools.base import LLMToolPluginCallSession
+from rag.prompts.generator import COMPLETE_TASK
+
+
+class CountingTool:
+    def __init__(self, failures=0):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.failures = failures
+        self._error = None
+
+    def invoke(self, **kwargs):
+        with self.lock:
+            self.calls.append(kwargs)
+            # Like ToolBase.invoke, a failure is returned as a string and kept in _ERROR.
+            if len(self.calls) <= self.failures:
+                self._error = "Function '_invoke' timed out"
+                return self._error
+            self._error = None
+        return f"result of {json.dumps(kwargs, sort_keys=True)}"
+
+    def error(self):
+        return self._error
+
+
+def call(name, **args):
+    return {"name": name, "arguments": args}
+
+
+def run_agent(monkeypatch, rounds, tools, idempotent_tools):
+    rounds = iter(rounds)
+    monkeypatch.setattr(agent_with_tools, "analyze_task", lambda *args: "task")
+    monkeypatch.setattr(agent_with_tools, "next_step", lambda *args: (json.dumps(next(rounds)), 0))
+    monkeypatch.setattr(agent_with_tools, "reflect", lambda chat_mdl, hist, results, *args: f"{len(results)} results")
+
+    trace = []
+    agent = Agent.__new__(Agent)
+    agent._id = "agent"
+    agent._param = SimpleNamespace(max_rounds=5, cite=False)
+    agent.chat_mdl = None
+    agent.tool_meta = []
+    agent.idempotent_tools = idempotent_tools
+    agent.callback = lambda name, args, resp, elapsed_time=None, cached=False: trace.append((name, args, resp, cached))
+    agent.toolcall_session = LLMToolPluginCallSession(tools, agent.callback)
+    monkeypatch.setattr(agent, "check_if_canceled", lambda *args: False, raising=False)
+    monkeypatch.setattr(agent, "_generate_streamly", lambda hist: iter(["answer"]), raising=False)
+
+    use_tools = []
+    history = [{"role": "system", "content": "prompt"}, {"role": "user", "content": "question"}]
+    out = "".join([txt for txt, _ in agent._react_with_tools_streamly("prompt", history, use_tools)])
+    assert out == "answer"
+    return trace, use_tools
+
+
+def test_identical_calls_of_idempotent_tools_run_once(monkeypatch):
+    search, send = CountingTool(), CountingTool()
+    trace, use_tools = run_agent(monkeypatch, [
+        [call("search", query="ragflow", top=3), call("search", top=3, query="ragflow"), call("send", to="a")],
+        [call("search", query="ragflow", top=3), call("search", query="other", top=3), call("send", to="a")],
+        [call(COMPLETE_TASK, answer="")],
+    ], {"search": search, "send": send}, {"search"})
+
+    assert search.calls == [{"query": "ragflow", "top": 3}, {"query": "other", "top": 3}]
+    # Tools that didn't opt in run every time.
+    assert send.calls == [{"to": "a"}, {"to": "a"}]
+    cached = [(name, args) for name, args, _, hit in trace if hit]
+    assert cached == [("search", {"top": 3, "query": "ragflow"}), ("search", {"query": "ragflow", "top": 3})]
+    # Reused results are reported like the others.
+    assert len(use_tools) == 6
+
+
+def test_failed_calls_are_retried(monkeypatch):
+    search = CountingTool(failures=1)
+    trace, use_tools = run_agent(monkeypatch, [
+        [call("search", query="ragflow")],
+        [call("search", query="ragflow")],
+        [call("search", query="ragflow")],
+        [call(COMPLETE_TASK, answer="")],
+    ], {"search": search}, {"search"})
+
+    # The timed out call is run again, the successful one is reused.
+    assert len(search.calls) == 2
+    assert [hit for name, _, _, hit in trace if name == "search"] == [False, False, True]
+    assert use_tools[-1]["results"] == 'result of {"query": "ragflow"}'
@@ -0,0 +1,110 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+import threading
+import time
+
+import pytest
+
+import agent.canvas
+from agent.canvas import Canvas
+from agent.component import component_class
+from agent.component.base import ComponentBase, ComponentParamBase
+
+
+class SleepParam(ComponentParamBase):
+    def __init__(self):
+        super().__init__()
+        self.latency = 0
+
+    def check(self):
+        return True
+
+
+class Sleep(ComponentBase):
+    """Stands for a component waiting on an LLM or a tool for `latency` seconds."""
+    component_name = "Sleep"
+    lock = threading.Lock()
+    events = []
+
+    def _invoke(self, **kwargs):
+        with self.lock:
+            self.events.append(("start", self._id, time.perf_counter()))
+        time.sleep(self._param.latency)
+        self.set_output("result", self._id)
+        with self.lock:
+            self.events.append(("end", self._id, time.perf_counter()))
+
+    def thoughts(self) -> str:
+        return ""
+
+
+def node(latency, upstream, downstream):
+    return {"obj": {"component_name": "Sleep", "params": {"latency": latency}}, "upstream": upstream, "downstream": downstream}
+
+
+def two_branch_dsl():
+    """begin -> a1 (0.1s) -> a2 (0.4s) -> join, begin -> b1 (0.4s) -> b2 (0.1s) -> join."""
+    return json.dumps({
+        "components": {
+            "begin": {"obj": {"component_name": "Begin", "params": {}}, "upstream": [], "downstream": ["a1", "b1"]},
+            "a1": node(0.1, ["begin"], ["a2"]),
+            "a2": node(0.4, ["a1"], ["join"]),
+            "b1": node(0.4, ["begin"], ["b2"]),
+            "b2": node(0.1, ["b1"], ["join"]),
+            "join": node(0, ["a2", "b2"], []),
+        },
+        "history": [],
+        "path": [],
+        "retrieval": [],
+        "globals": {"sys.query": "", "sys.user_id": "", "sys.conversation_turns": 0, "sys.files": []},
+    })
+
+
+@pytest.fixture
+def canvas(monkeypatch):
+    fakes = {"Sleep": Sleep, "SleepParam": SleepParam}
+    monkeypatch.setattr(agent.canvas, "component_class", lambda name: fakes.get(name) or component_class(name))
+    monkeypatch.setattr(Canvas, "is_canceled", lambda self: False)
+    Sleep.events = []
+    return Canvas(two_branch_dsl(), "tenant")
+
+
+def test_branches_run_as_soon_as_their_upstream_is_done(canvas):
+    st = time.perf_counter()
+    events = list(canvas.run(query="hi", inputs={}))
+    elapsed = time.perf_counter() - st
+
+    # Each branch takes 0.5s. Running step by step would take max(a1, b1) + max(a2, b2) = 0.8s.
+    assert elapsed < 0.7
+    assert events[-1]["event"] == "workflow_finished"
+    finished = [e["data"]["component_id"] for e in events if e["event"] == "node_finished"]
+    assert sorted(finished) == ["a1", "a2", "b1", "b2", "begin", "join"]
+    assert finished[-1] == "join"
+
+    at = {(kind, cpn_id): t for kind, cpn_id, t in Sleep.events}
+    assert at[("start", "a2")] < at[("end", "b1")]
+    assert at[("start", "join")] >= max(at[("end", "a2")], at[("end", "b2")])
+    assert [kind for kind, cpn_id, _ in Sleep.events if cpn_id == "join"] == ["start", "end"]
+    assert canvas.path == ["begin", "a1", "b1", "a2", "b2", "join"]
+
+
+def test_pool_is_kept_across_runs(canvas):
+    list(canvas.run(query="hi", inputs={}))
+    executor = canvas._get_executor()
+    list(canvas.run(query="again", inputs={}))
+    assert canvas._get_executor() is executor
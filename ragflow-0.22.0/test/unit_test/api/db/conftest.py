@@ -0,0 +1,74 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+from peewee import SqliteDatabase
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch):
+    """Returns a function binding the given models to a fresh in-memory SQLite database.
+
+    The services keep using the `@DB.connection_context()` of the configured database,
+    so its connect and close are turned into no-ops, and `DB.atomic` runs on SQLite.
+    """
+    from api.db.db_models import DB
+
+    db = SqliteDatabase(":memory:")
+    contexts = []
+    monkeypatch.setattr(DB, "connect", lambda *args, **kwargs: True)
+    monkeypatch.setattr(DB, "close", lambda: True)
+    monkeypatch.setattr(DB, "atomic", db.atomic)
+
+    def bind(*models):
+        ctx = db.bind_ctx(models)
+        ctx.__enter__()
+        contexts.append(ctx)
+        db.create_tables(models)
+        return db
+
+    yield bind
+    for ctx in reversed(contexts):
+        ctx.__exit__(None, None, None)
+    db.close()
+
+
+class FakeStorage:
+    """In-memory stand-in for settings.STORAGE_IMPL."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put(self, bucket, fnm, binary, tenant_id=None):
+        self.objects[(bucket, fnm)] = binary
+
+    def get(self, bucket, fnm, tenant_id=None):
+        return self.objects.get((bucket, fnm))
+
+    def rm(self, bucket, fnm, tenant_id=None):
+        self.objects.pop((bucket, fnm), None)
+
+    def obj_exist(self, bucket, fnm, tenant_id=None):
+        return (bucket, fnm) in self.objects
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    from common import settings
+
+    fake = FakeStorage()
+    monkeypatch.setattr(settings, "STORAGE_IMPL", fake, raising=False)
+    return fake
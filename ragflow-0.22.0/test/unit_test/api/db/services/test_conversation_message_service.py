@@ -0,0 +1,85 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from api.db.services.conversation_message_service import ConversationMessageService as Svc
+
+
+def conversation(n_turns):
+    """A prologue and `n_turns` question/answer pairs, with one reference per answer."""
+    messages = [{"role": "assistant", "content": "Hi! How can I help?"}]
+    references = []
+    for i in range(n_turns):
+        messages.append({"role": "user", "content": f"question {i}", "id": f"q{i}", "created_at": 1700000000.0 + i})
+        messages.append({"role": "assistant", "content": f"answer {i}", "id": f"q{i}", "created_at": 1700000000.5 + i, "thumbup": i % 2 == 0})
+        references.append({"chunks": [{"id": f"chunk{i}"}], "doc_aggs": []})
+    return messages, references
+
+
+def assemble(rows):
+    """What get_conversations builds back from the rows of a conversation."""
+    return [Svc.to_message(r) for r in rows], [r["reference"] for r in rows if r["ref_index"] is not None]
+
+
+def test_round_trip_with_prologue():
+    messages, references = conversation(3)
+    rows = Svc.to_rows("c", messages, references)
+
+    assert [r["seq"] for r in rows] == list(range(7))
+    assert rows[0]["ref_index"] is None
+    assert [r["ref_index"] for r in rows if r["role"] == "assistant"] == [None, 0, 1, 2]
+    assert rows[2]["reference"] == references[0]
+    assert rows[2]["extra"] == {"id": "q0", "thumbup": True}
+    assert assemble(rows) == (messages, references)
+
+
+def test_fewer_references_than_answers():
+    messages, references = conversation(3)
+    references = references[:2]
+    rows = Svc.to_rows("c", messages, references)
+
+    assert rows[6]["ref_index"] is None
+    assert rows[6]["reference"] == {}
+    assert assemble(rows) == (messages, references)
+
+
+def test_deleted_middle_message_shifts_following_rows():
+    messages, references = conversation(3)
+    before = Svc.to_rows("c", messages, references)
+    # Deleting the second question and its answer, as the delete_msg endpoint does.
+    del messages[3:5]
+    del references[1]
+    after = Svc.to_rows("c", messages, references)
+
+    assert [r["seq"] for r in after] == list(range(5))
+    assert assemble(after) == (messages, references)
+    # The prefix is unchanged, the rows after the deleted ones are rewritten.
+    assert [r["digest"] for r in after[:3]] == [r["digest"] for r in before[:3]]
+    assert [r["digest"] for r in after[3:]] != [r["digest"] for r in before[3:5]]
+
+
+def test_more_references_than_answers_keeps_json():
+    messages, references = conversation(2)
+    assert Svc.to_rows("c", messages, references + [{"chunks": []}]) is None
+    assert Svc.to_rows("c", messages, references[:1] + [None]) is None
+    assert Svc.to_rows("c", messages + ["not a message"], references) is None
+
+
+def test_slice_matches_rows():
+    messages, references = conversation(4)
+    rows = Svc.to_rows("c", messages, references)
+    for offset, limit in [(0, None), (0, 3), (1, 2), (2, 4), (5, None), (8, 2)]:
+        page = rows[offset:offset + limit] if limit else rows[offset:]
+        assert Svc.slice_messages(messages, references, offset, limit) == assemble(page)
@@ -0,0 +1,130 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+
+from api.db import FileType
+from api.db.db_models import File
+from api.db.services.file_service import FileService
+
+# (id, parent_id, tenant_id, name, type, size). The root folder is its own parent.
+TREE = [
+    ("root", "root", "t1", "/", FileType.FOLDER.value, 0),
+    ("a", "root", "t1", "docs", FileType.FOLDER.value, 0),
+    ("a1", "a", "t1", "2024", FileType.FOLDER.value, 0),
+    ("a1f", "a1", "t1", "report.pdf", FileType.PDF.value, 100),
+    ("a1g", "a1", "t1", "notes.txt", FileType.DOC.value, 20),
+    ("a2", "a", "t1", "2025", FileType.FOLDER.value, 0),
+    ("a2f", "a2", "t1", "plan.pdf", FileType.PDF.value, 300),
+    ("a3", "a", "t1", "empty", FileType.FOLDER.value, 0),
+    # Same-named siblings: only the one with the smallest id is followed.
+    ("b1", "root", "t1", "shared", FileType.FOLDER.value, 0),
+    ("b2", "root", "t1", "shared", FileType.FOLDER.value, 0),
+    ("b1x", "b1", "t1", "inner", FileType.FOLDER.value, 0),
+    ("b2x", "b2", "t1", "inner", FileType.FOLDER.value, 0),
+    ("b2y", "b2x", "t1", "deep", FileType.FOLDER.value, 0),
+    ("top", "root", "t1", "top.txt", FileType.DOC.value, 5),
+    # Another tenant's file under a t1 folder, and another tenant's root.
+    ("x", "a2", "t2", "foreign.pdf", FileType.PDF.value, 7000),
+    ("root2", "root2", "t2", "/", FileType.FOLDER.value, 0),
+    ("r2f", "root2", "t2", "own.pdf", FileType.PDF.value, 1),
+]
+
+
+@pytest.fixture
+def tree(sqlite_db):
+    sqlite_db(File)
+    File.insert_many([
+        {"id": id, "parent_id": parent_id, "tenant_id": tenant_id, "created_by": tenant_id, "name": name, "type": type, "size": size}
+        for id, parent_id, tenant_id, name, type, size in TREE
+    ]).execute()
+
+
+def ids():
+    return {f.id for f in File.select(File.id)}
+
+
+@pytest.mark.parametrize(
+    "names, expected",
+    [
+        (["/", "docs"], ["a"]),
+        (["/", "docs", "2024", "report.pdf"], ["a", "a1", "a1f"]),
+        # Missing at some depth: the path stops there.
+        (["/", "docs", "2023", "report.pdf"], ["a"]),
+        (["/", "missing", "2024"], []),
+        (["/", "shared", "inner"], ["b1", "b1x"]),
+        (["/", "shared", "inner", "deep"], ["b1", "b1x"]),
+        (["/"], []),
+    ],
+)
+def test_get_id_list_by_id(tree, names, expected):
+    # The API passes the names of a relative upload path after the root, starting at count 1.
+    assert FileService.get_id_list_by_id("root", names, 1, ["root"]) == ["root"] + expected
+
+
+def test_get_id_list_by_id_from_a_folder(tree):
+    assert FileService.get_id_list_by_id("a", ["docs", "2025", "plan.pdf"], 1, []) == ["a2", "a2f"]
+
+
+def test_get_all_innermost_file_ids(tree):
+    assert sorted(FileService.get_all_innermost_file_ids("a", [])) == ["a1f", "a1g", "a2f", "a3", "x"]
+    assert FileService.get_all_innermost_file_ids("a3", []) == ["a3"]
+    assert FileService.get_all_innermost_file_ids("a1f", ["seed"]) == ["seed", "a1f"]
+    # The root is its own parent, its subtree doesn't loop back to it.
+    assert sorted(FileService.get_all_innermost_file_ids("root", [])) == ["a1f", "a1g", "a2f", "a3", "b1x", "b2y", "top", "x"]
+
+
+def test_get_all_parent_folders(tree):
+    assert [f.id for f in FileService.get_all_parent_folders("a1f")] == ["a1f", "a1", "a", "root"]
+    assert [f.id for f in FileService.get_all_parent_folders("root")] == ["root"]
+    assert [f.name for f in FileService.get_all_parent_folders("b2y")] == ["deep", "inner", "shared", "/"]
+    assert FileService.get_all_parent_folders("unknown") == []
+
+
+def test_get_folder_size(tree):
+    assert FileService.get_folder_size("a1") == 120
+    assert FileService.get_folder_size("a") == 7420
+    assert FileService.get_folder_size("a3") == 0
+    assert FileService.get_folder_size("root") == 7425
+    assert FileService.get_folder_size("root2") == 1
+
+
+def test_get_file_count(tree):
+    assert FileService.get_file_count("t1") == 14
+    assert FileService.get_file_count("t2") == 3
+    assert FileService.get_file_count("t3") == 0
+
+
+def test_delete_folder_by_pf_id(tree):
+    before = ids()
+    assert FileService.delete_folder_by_pf_id("t1", "a") == (1,)
+    # The t1 subtree is gone; the t2 file in it stays.
+    assert before - ids() == {"a", "a1", "a1f", "a1g", "a2", "a2f", "a3"}
+    assert "x" in ids()
+
+
+def test_delete_folder_by_pf_id_of_another_tenant(tree):
+    before = ids()
+    # Folders of another tenant are neither deleted nor walked through.
+    assert FileService.delete_folder_by_pf_id("t2", "a") == (0,)
+    assert ids() == before
+    assert FileService.delete_folder_by_pf_id("t2", "a2") == (0,)
+    assert before - ids() == {"x"}
+
+
+def test_delete_folder_by_pf_id_root(tree):
+    FileService.delete_folder_by_pf_id("t2", "root2")
+    assert ids() == {id for id, *_ in TREE if id not in ("root2", "r2f")}
@@ -0,0 +1,110 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from api.db.db_models import Document, File, File2Document, Knowledgebase
+from api.db.services import file_service
+from api.db.services.document_service import DocumentService
+from api.db.services.file_service import FileService
+
+
+class UploadedFile:
+    def __init__(self, filename, blob=b"some text"):
+        self.filename = filename
+        self.blob = blob
+
+    def read(self):
+        return self.blob
+
+
+class InlineExecutor:
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+
+@pytest.fixture
+def kb(sqlite_db, storage, monkeypatch):
+    sqlite_db(File, Document, File2Document, Knowledgebase)
+    monkeypatch.setattr(file_service, "thumbnail_executor", InlineExecutor())
+    kb = Knowledgebase.create(id="kb1", tenant_id="t1", name="manuals", embd_id="bge", created_by="t1", parser_id="naive",
+                              parser_config={"chunk_token_num": 512}, doc_num=0)
+    return kb
+
+
+def stored_locations(storage):
+    return sorted([fnm for bucket, fnm in storage.objects if bucket == "kb1" and not fnm.startswith("thumbnail_")])
+
+
+def test_duplicate_names_within_a_batch(kb, storage):
+    err, files = FileService.upload_document(kb, [UploadedFile("a.txt")], "t1")
+    assert not err
+
+    err, files = FileService.upload_document(kb, [UploadedFile("a.txt"), UploadedFile("a.txt"), UploadedFile("b.txt"), UploadedFile("b.txt")], "t1")
+    assert not err
+    assert [doc["name"] for doc, _ in files] == ["a(1).txt", "a(2).txt", "b.txt", "b(1).txt"]
+    assert sorted([d.name for d in Document.select()]) == ["a(1).txt", "a(2).txt", "a.txt", "b(1).txt", "b.txt"]
+    assert Knowledgebase.get_by_id("kb1").doc_num == 5
+    # Every document has its file in the KB folder and its blob under its own location.
+    assert File2Document.select().count() == 5
+    assert stored_locations(storage) == sorted([d.location for d in Document.select()])
+    for doc, blob in files:
+        assert doc["location"] == doc["id"] + ".txt"
+        assert doc["size"] == len(blob) == 9
+
+
+def test_errors_are_reported_per_file(kb, storage, monkeypatch):
+    put = storage.put
+
+    def failing_put(bucket, fnm, binary, tenant_id=None):
+        if binary == b"boom":
+            raise OSError("storage unavailable")
+        put(bucket, fnm, binary, tenant_id)
+
+    monkeypatch.setattr(storage, "put", failing_put)
+    err, files = FileService.upload_document(kb, [UploadedFile("notes.unknownext"), UploadedFile("c.txt", b"boom"), UploadedFile("d.txt")], "t1")
+
+    assert err == ["notes.unknownext: This type of file has not been supported yet!", "c.txt: storage unavailable"]
+    assert [doc["name"] for doc, _ in files] == ["d.txt"]
+    assert [d.name for d in Document.select()] == ["d.txt"]
+
+
+def test_failed_insert_removes_stored_blobs(kb, storage, monkeypatch):
+    def insert_many(*args, **kwargs):
+        raise RuntimeError("Database error (Document)!")
+
+    monkeypatch.setattr(DocumentService, "insert_many", insert_many)
+    err, files = FileService.upload_document(kb, [UploadedFile("a.txt"), UploadedFile("b.txt")], "t1")
+
+    assert files == []
+    assert err == ["a.txt: Database error (Document)!", "b.txt: Database error (Document)!"]
+    assert stored_locations(storage) == []
+    assert Document.select().count() == 0 and File2Document.select().count() == 0
+
+
+def test_thumbnail_is_rendered_from_storage(kb, storage):
+    buf = BytesIO()
+    Image.new("RGB", (64, 48), (0, 128, 255)).save(buf, format="PNG")
+    err, files = FileService.upload_document(kb, [UploadedFile("chart.png", buf.getvalue())], "t1")
+
+    assert not err
+    doc, _ = files[0]
+    thumbnail = Document.get_by_id(doc["id"]).thumbnail
+    assert thumbnail == f"thumbnail_{doc['id']}.png"
+    assert storage.get("kb1", thumbnail)
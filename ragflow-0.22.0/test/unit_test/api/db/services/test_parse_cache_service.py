@@ -0,0 +1,97 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from api.db.db_models import ParseCache
+from api.db.services.parse_cache_service import PARSE_CACHE_BUCKET, ParseCacheService
+
+
+def parsing_task(**kwargs):
+    task = {
+        "tenant_id": "t1",
+        "parser_id": "naive",
+        "name": "report.pdf",
+        "from_page": 0,
+        "to_page": 12,
+        "language": "English",
+        "img2txt_id": "qwen-vl-max@Tongyi-Qianwen",
+        "parser_config": {"chunk_token_num": 512, "layout_recognize": "DeepDOC", "auto_keywords": 0},
+    }
+    task.update(kwargs)
+    return task
+
+
+@pytest.fixture
+def cache(sqlite_db, storage):
+    sqlite_db(ParseCache)
+    return storage
+
+
+def test_round_trip(cache):
+    task = parsing_task()
+    digest = ParseCacheService.file_digest(b"%PDF-1.7 ...")
+    key = ParseCacheService.cache_key(task, digest)
+    img = Image.new("RGBA", (8, 8), (255, 0, 0, 255))
+    chunks = [
+        {"content_with_weight": "first", "page_num_int": [1], "position_int": [(1, 0, 10, 0, 10)], "image": img},
+        {"content_with_weight": "second", "page_num_int": [2], "position_int": [(2, 0, 10, 0, 10)]},
+    ]
+
+    assert ParseCacheService.get_chunks(key) is None
+    ParseCacheService.put_chunks(key, task, chunks, digest)
+
+    assert (PARSE_CACHE_BUCKET, key) in cache.objects
+    # The chunks handed in are left as they are.
+    assert chunks[0]["image"] is img
+    cached = ParseCacheService.get_chunks(key)
+    assert [ck["content_with_weight"] for ck in cached] == ["first", "second"]
+    assert cached[0]["position_int"] == [[1, 0, 10, 0, 10]]
+    with Image.open(BytesIO(cached[0]["image"])) as decoded:
+        assert decoded.format == "JPEG" and decoded.size == (8, 8)
+    assert "image" not in cached[1]
+
+
+def test_key_covers_vision_model():
+    digest = ParseCacheService.file_digest(b"data")
+    key = ParseCacheService.cache_key(parsing_task(), digest)
+
+    assert ParseCacheService.cache_key(parsing_task(), digest) == key
+    assert ParseCacheService.cache_key(parsing_task(img2txt_id="gpt-4o@OpenAI"), digest) != key
+    assert ParseCacheService.cache_key(parsing_task(img2txt_id=""), digest) != key
+    # Settings applied after chunking don't change the key, parsing settings do.
+    assert ParseCacheService.cache_key(parsing_task(parser_config={"chunk_token_num": 512, "layout_recognize": "DeepDOC", "auto_keywords": 5}), digest) == key
+    assert ParseCacheService.cache_key(parsing_task(parser_config={"chunk_token_num": 256, "layout_recognize": "DeepDOC"}), digest) != key
+
+
+def test_uncached_parsers():
+    digest = ParseCacheService.file_digest(b"data")
+    for parser_id in ["picture", "audio", "table", "resume"]:
+        assert ParseCacheService.cache_key(parsing_task(parser_id=parser_id), digest) is None
+
+
+def test_missing_object_drops_row(cache):
+    task = parsing_task()
+    digest = ParseCacheService.file_digest(b"data")
+    key = ParseCacheService.cache_key(task, digest)
+    ParseCacheService.put_chunks(key, task, [{"content_with_weight": "only"}], digest)
+    cache.objects.clear()
+
+    assert ParseCacheService.get_chunks(key) is None
+    assert ParseCache.get_or_none(ParseCache.id == key) is None
@@ -0,0 +1,124 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+import threading
+import time
+
+from api.utils.stream_utils import answer_segments, speak_segments, sse_answers
+from common.token_utils import num_tokens_from_string
+
+WORDS = [" the", " quick", " brown", " fox", " jumps", " over", " a", " lazy", " dog", " and", " runs", " away"]
+
+
+def fake_llm(n_pieces=4096):
+    """Cumulative answers, as LLMBundle.chat_streamly yields them, one word per piece."""
+    ans = ""
+    for i in range(n_pieces):
+        ans += WORDS[i % len(WORDS)]
+        yield ans
+
+
+def fake_chat(n_pieces=4096):
+    answer = ""
+    for answer, audio in speak_segments(fake_llm(n_pieces)):
+        yield {"answer": answer, "reference": {}, "audio_binary": audio}
+    yield {"answer": answer + " [ID:0]", "reference": {"chunks": [{"id": "c0", "content": "x" * 512}]}, "prompt": "p"}
+
+
+def structure(ans):
+    ans["id"] = "m1"
+    ans["session_id"] = "s1"
+    return ans
+
+
+def events(stream):
+    return [json.loads(ev[len("data:"):]) for ev in stream]
+
+
+def test_segments_cover_the_answer():
+    segments = list(answer_segments(fake_llm(100)))
+    assert "".join([d for _, d in segments]) == segments[-1][0]
+    assert all(num_tokens_from_string(d) >= 16 for _, d in segments[:-1])
+
+
+def test_delta_stream_bytes_of_a_4k_token_answer():
+    answer = list(fake_llm())[-1]
+    assert num_tokens_from_string(answer) >= 4000
+
+    full = list(sse_answers(fake_chat(), structure, "full", "m1", "s1"))
+    delta = list(sse_answers(fake_chat(), structure, "delta", "m1", "s1"))
+    full_bytes = sum([len(ev.encode("utf-8")) for ev in full])
+    delta_bytes = sum([len(ev.encode("utf-8")) for ev in delta])
+    assert delta_bytes * 20 < full_bytes
+
+    evs = [ev["data"] for ev in events(delta)]
+    final = evs[-1]
+    assert final["final"] and final["reference"]["chunks"][0]["id"] == "c0"
+    assert all("reference" not in ev for ev in evs[:-1])
+    text = ""
+    for ev in evs[:-1]:
+        text = ev["answer"] if ev.get("replace") else text + ev["answer"]
+    assert text == answer + " [ID:0]"
+    assert [ev["data"]["answer"] for ev in events(full)][-1] == text
+
+
+def test_background_tts_does_not_block_text():
+    synthesized = []
+    lock = threading.Lock()
+
+    def synthesize(txt):
+        time.sleep(0.05)
+        with lock:
+            synthesized.append(txt)
+        return f"audio:{len(synthesized)}"
+
+    start = time.time()
+    items = speak_segments(fake_llm(200), synthesize, background=True)
+    first = next(items)
+    assert first[1] is None
+    assert time.time() - start < 0.05
+
+    items = [first] + list(items)
+    texts = [a for a, audio in items if audio is None]
+    audios = [audio for _, audio in items if audio]
+    assert len(audios) == len(texts) == len(synthesized)
+    assert audios == [f"audio:{i + 1}" for i in range(len(audios))]
+
+
+def test_closing_the_stream_stops_background_tts():
+    calls = []
+    started = threading.Event()
+
+    def synthesize(txt):
+        calls.append(txt)
+        started.set()
+        time.sleep(0.05)
+        return "audio"
+
+    items = speak_segments(fake_llm(400), synthesize, background=True)
+    # Read enough text to queue many segments, then disconnect.
+    for _ in range(10):
+        next(items)
+    assert started.wait(1)
+    items.close()
+    time.sleep(0.1)
+    n_calls = len(calls)
+    time.sleep(0.3)
+
+    # At most the segment being synthesized when the stream closed finishes, none of the queued ones start.
+    assert n_calls <= 2
+    assert len(calls) == n_calls
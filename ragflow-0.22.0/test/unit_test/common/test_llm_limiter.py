@@ -0,0 +1,214 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import threading
+import time
+
+import pytest
+
+from common.llm_limiter import AdaptiveLimiter, CircuitOpenError, get_limiter, is_overload_error, limiter_key, limiter_metrics, released
+
+
+def new_limiter(**kwargs):
+    conf = {"init_limit": 4, "min_limit": 1, "max_limit": 8, "tpm": 0, "max_wait": 5, "failure_threshold": 3, "open_seconds": 0.3, "shared": False}
+    conf.update(kwargs)
+    return AdaptiveLimiter("test", **conf)
+
+
+class TestOverloadClassification:
+
+    @pytest.mark.parametrize("error", ["Error code: 429 - rate limit", "503 Service Unavailable",
+                                       "**ERROR**: RATE_LIMIT_EXCEEDED - x", "**ERROR**: MAX_RETRIES_EXCEEDED - x"])
+    def test_overload(self, error):
+        assert is_overload_error(error)
+
+    @pytest.mark.parametrize("error", [None, "**ERROR**: AUTH_ERROR - invalid api key", ValueError("bad request"),
+                                       "max_tokens must be <= 4500", "Error code: 400 - request id req_5031a, 15000 bytes",
+                                       "context length 1500429 exceeds the limit"])
+    def test_not_overload(self, error):
+        assert not is_overload_error(error)
+
+    def test_status_code_attribute(self):
+        class APIError(Exception):
+            def __init__(self, message, status_code):
+                super().__init__(message)
+                self.status_code = status_code
+
+        class Response:
+            status_code = 502
+
+        class HTTPError(Exception):
+            response = Response()
+
+        assert is_overload_error(APIError("slow down", 429))
+        assert is_overload_error(APIError("upstream failure", 503))
+        # The status code wins over digits or words in the message.
+        assert not is_overload_error(APIError("max_tokens must be <= 500", 400))
+        assert not is_overload_error(APIError("Service unavailable for this api key", 401))
+        assert is_overload_error(HTTPError("bad gateway"))
+
+    def test_overload_errors_shrink_the_limit_others_do_not(self):
+        limiter = new_limiter(init_limit=4)
+        for error in ["max_tokens must be <= 4500", "Error code: 400 - request id req_5031a"]:
+            limiter.release(limiter.acquire(), error=error)
+        assert limiter.limit == 4
+        limiter.release(limiter.acquire(), error="Error code: 503")
+        assert limiter.limit < 4
+
+
+class TestAdaptiveLimiter:
+
+    def test_concurrency_is_bounded(self):
+        limiter = new_limiter(init_limit=2, max_limit=2)
+        peak, lock = [0], threading.Lock()
+
+        def call():
+            with limiter.slot():
+                with lock:
+                    peak[0] = max(peak[0], limiter.in_flight)
+                time.sleep(0.05)
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert peak[0] == 2
+        assert limiter.in_flight == 0
+        assert limiter.metrics()["throttled"] > 0
+
+    def test_multiplicative_decrease_on_overload(self):
+        limiter = new_limiter(init_limit=8)
+        with pytest.raises(RuntimeError):
+            with limiter.slot():
+                raise RuntimeError("Error code: 429")
+        assert limiter.limit == 4
+
+    def test_request_errors_do_not_shrink_limit(self):
+        limiter = new_limiter(init_limit=4)
+        with limiter.slot() as slot:
+            slot.error = "**ERROR**: AUTH_ERROR - invalid key"
+        assert limiter.limit == 4
+
+    def test_additive_increase_when_saturated(self):
+        limiter = new_limiter(init_limit=1, max_limit=4)
+        for _ in range(3):
+            with limiter.slot():
+                pass
+        assert 1 < limiter.limit <= 4
+
+    def test_circuit_opens_and_recovers(self):
+        limiter = new_limiter(failure_threshold=2, open_seconds=0.2)
+        for _ in range(2):
+            with limiter.slot() as slot:
+                slot.error = "503 Service Unavailable"
+        with pytest.raises(CircuitOpenError):
+            limiter.acquire()
+        assert limiter.metrics()["circuit"] == "open"
+
+        time.sleep(0.25)
+        # Half-open: one probe goes through, a concurrent one is rejected.
+        with limiter.slot():
+            with pytest.raises(CircuitOpenError):
+                limiter.acquire()
+        assert limiter.metrics()["circuit"] == "closed"
+        with limiter.slot():
+            pass
+
+    def test_backoff_is_shared(self):
+        limiter = new_limiter()
+        waiter = threading.Thread(target=limiter.backoff, args=(0.2,))
+        waiter.start()
+        time.sleep(0.02)
+        start = time.monotonic()
+        with limiter.slot():
+            pass
+        assert time.monotonic() - start >= 0.1
+        waiter.join()
+
+    def test_token_bucket(self):
+        limiter = new_limiter(tpm=600)
+        with limiter.slot(tokens=600):
+            pass
+        start = time.monotonic()
+        # 10 tokens/s refill rate: 5 tokens take about half a second.
+        with limiter.slot(tokens=5):
+            pass
+        assert time.monotonic() - start >= 0.4
+
+
+class TestNestedCalls:
+
+    def test_nested_call_on_same_thread_reuses_slot(self):
+        limiter = new_limiter(init_limit=1, max_limit=1, max_wait=0.5)
+        with limiter.slot():
+            with limiter.slot():
+                assert limiter.in_flight == 1
+        assert limiter.in_flight == 0
+
+    def test_tools_run_without_the_slot(self):
+        limiter = new_limiter(init_limit=1, max_limit=1, max_wait=0.5)
+        done = []
+
+        def tool():
+            # A sub-call from another thread, e.g. a retrieval embedding or a sub-agent.
+            with limiter.slot():
+                done.append(limiter.in_flight)
+
+        with limiter.slot():
+            with released():
+                assert limiter.in_flight == 0
+                t = threading.Thread(target=tool)
+                t.start()
+                t.join()
+            assert limiter.in_flight == 1
+        assert done == [1]
+        assert limiter.in_flight == 0
+
+    def test_suspended_time_is_not_latency(self):
+        limiter = new_limiter(init_limit=1, max_limit=1)
+        with limiter.slot() as slot:
+            limiter.suspend(slot)
+            assert limiter.in_flight == 0
+            time.sleep(0.2)
+            limiter.resume(slot, wait=False)
+            assert limiter.in_flight == 1
+        assert limiter._baseline < 0.1
+
+    def test_suspended_slot_released_on_close(self):
+        limiter = new_limiter(init_limit=1, max_limit=1)
+
+        def stream():
+            with limiter.slot() as slot:
+                for i in range(3):
+                    limiter.suspend(slot)
+                    yield i
+                    limiter.resume(slot, wait=False)
+
+        gen = stream()
+        next(gen)
+        gen.close()
+        assert limiter.in_flight == 0
+        with limiter.slot():
+            pass
+
+
+def test_registry():
+    key = limiter_key("VLLM", "http://127.0.0.1:8000/v1/", "qwen")
+    assert key == "VLLM@http://127.0.0.1:8000/v1"
+    assert limiter_key("OpenAI", "", "gpt-4o") == "OpenAI/gpt-4o"
+    assert get_limiter(key) is get_limiter(key)
+    assert key in limiter_metrics()
@@ -0,0 +1,117 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from io import BytesIO
+
+import pytest
+
+pdfplumber = pytest.importorskip("pdfplumber")
+pytest.importorskip("reportlab")
+
+from reportlab.lib.pagesizes import A4  # noqa: E402
+from reportlab.lib.utils import ImageReader  # noqa: E402
+from reportlab.pdfgen import canvas  # noqa: E402
+
+from deepdoc.parser.pdf_text_layer import is_text_layer_page, text_layer_boxes, text_layer_stats  # noqa: E402
+
+LINES = [
+    "Clinical guideline for the management of hypertension",
+    "Recommendation 1: measure blood pressure in both arms.",
+    "Recommendation 2: confirm the diagnosis with ambulatory monitoring.",
+    "Recommendation 3: offer lifestyle advice to every patient.",
+]
+
+
+def make_pdf(draw) -> bytes:
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    draw(c)
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def read_page(pdf: bytes):
+    with pdfplumber.open(BytesIO(pdf)) as pdf:
+        page = pdf.pages[0]
+        return page.dedupe_chars().chars, page.width, page.height, page.images
+
+
+def draw_lines(c, x=72, y=760):
+    c.setFont("Helvetica", 11)
+    for i, ln in enumerate(LINES):
+        c.drawString(x, y - 18 * i, ln)
+
+
+def test_born_digital_page_takes_fast_path():
+    chars, width, height, images = read_page(make_pdf(draw_lines))
+    stats = text_layer_stats(chars, width, height, images)
+    assert stats["cid_ratio"] == 0
+    assert is_text_layer_page(stats)
+
+    boxes = text_layer_boxes(chars, 1)
+    assert [b["text"] for b in boxes] == LINES
+    assert all(b["page_number"] == 1 for b in boxes)
+    assert all(b["x0"] < b["x1"] and b["top"] < b["bottom"] for b in boxes)
+    assert boxes[0]["bottom"] < boxes[1]["top"]
+
+
+def test_columns_are_split_into_boxes():
+    def draw(c):
+        c.setFont("Helvetica", 11)
+        for i in range(10):
+            c.drawString(72, 760 - 18 * i, f"left column line {i}")
+            c.drawString(320, 760 - 18 * i, f"right column line {i}")
+
+    chars, width, height, images = read_page(make_pdf(draw))
+    boxes = text_layer_boxes(chars, 1)
+    texts = [b["text"] for b in boxes]
+    assert "left column line 0" in texts
+    assert "right column line 0" in texts
+    assert len(boxes) == 20
+
+
+def test_sparse_page_goes_to_ocr():
+    def draw(c):
+        c.setFont("Helvetica", 11)
+        c.drawString(72, 760, "Page 3")
+
+    chars, width, height, images = read_page(make_pdf(draw))
+    assert not is_text_layer_page(text_layer_stats(chars, width, height, images))
+
+
+def test_page_covered_by_image_goes_to_ocr():
+    Image = pytest.importorskip("PIL.Image")
+
+    def draw(c):
+        draw_lines(c)
+        c.drawImage(ImageReader(Image.new("RGB", (200, 200), "white")), 50, 50, width=500, height=600)
+
+    chars, width, height, images = read_page(make_pdf(draw))
+    stats = text_layer_stats(chars, width, height, images)
+    assert stats["image_coverage"] > 0.5
+    assert not is_text_layer_page(stats)
+
+
+def test_unmapped_glyphs_go_to_ocr():
+    chars = [{"text": "(cid:17)", "x0": 10 * i, "x1": 10 * i + 8, "top": 100, "bottom": 110, "upright": True} for i in range(50)]
+    assert not is_text_layer_page(text_layer_stats(chars, 600, 800))
+
+
+def test_no_space_between_cjk_chars():
+    chars = [{"text": t, "x0": 100 + 14 * i, "x1": 110 + 14 * i, "top": 100, "bottom": 110, "upright": True}
+             for i, t in enumerate("高血压指南")]
+    assert [b["text"] for b in text_layer_boxes(chars, 1)] == ["高血压指南"]
@@ -0,0 +1,160 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from deepdoc.vision.inference_service import InferenceService
+
+
+class FakeInput:
+    name = "x"
+    shape = ["batch", 3, 8, "width"]
+
+
+class FakeSession:
+    """Doubles its input, or returns one row whatever the batch when `batch_major` is off, like NMS outputs."""
+
+    def __init__(self, batch_major=True, delay=0.):
+        self.batch_major = batch_major
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_inputs(self):
+        return [FakeInput()]
+
+    def run(self, output_names, inputs, run_options=None):
+        x = inputs["x"]
+        with self.lock:
+            self.calls.append((x.shape, threading.get_ident()))
+        time.sleep(self.delay)
+        if not self.batch_major:
+            return [x.sum(axis=0, keepdims=True)]
+        return [x * 2]
+
+
+def tensor(rows, width=8, value=1.):
+    return {"x": np.full((rows, 3, 8, width), value, dtype=np.float32)}
+
+
+def test_queued_requests_are_batched_and_split_back():
+    sess = FakeSession()
+    service = InferenceService("rec", sess, None)
+    futures = [service.submit(tensor(2, value=i)) for i in range(3)]
+
+    for i, fut in enumerate(futures):
+        out = fut.result()[0]
+        assert out.shape == (2, 3, 8, 8)
+        assert np.all(out == 2 * i)
+    assert [shape[0] for shape, _ in sess.calls] == [6]
+    assert (service.batches, service.rows) == (1, 6)
+
+
+def test_batches_are_capped_at_max_batch_size():
+    sess = FakeSession()
+    service = InferenceService("rec", sess, None, max_batch_size=4)
+    futures = [service.submit(tensor(2, value=i)) for i in range(5)]
+
+    assert [fut.result()[0][0, 0, 0, 0] for fut in futures] == [0, 2, 4, 6, 8]
+    assert sorted([shape[0] for shape, _ in sess.calls]) == [2, 4, 4]
+
+
+def test_padding_along_pad_axis():
+    sess = FakeSession()
+    service = InferenceService("rec", sess, None, pad_axis=3)
+    narrow, wide, too_wide = service.submit(tensor(1, width=6)), service.submit(tensor(1, width=8)), service.submit(tensor(1, width=20))
+
+    out = narrow.result()[0]
+    # Zero padded to the widest line of its batch.
+    assert out.shape == (1, 3, 8, 8)
+    assert np.all(out[..., :6] == 2) and np.all(out[..., 6:] == 0)
+    assert wide.result()[0].shape == (1, 3, 8, 8)
+    # More than twice as wide as the narrowest line, it runs on its own.
+    assert too_wide.result()[0].shape == (1, 3, 8, 20)
+    assert sorted([shape for shape, _ in sess.calls]) == [(1, 3, 8, 20), (2, 3, 8, 8)]
+
+
+def test_outputs_not_batch_major_fall_back_to_unbatched_runs():
+    sess = FakeSession(batch_major=False)
+    service = InferenceService("layout", sess, None)
+    futures = [service.submit(tensor(1, value=i)) for i in range(3)]
+
+    assert [fut.result()[0][0, 0, 0, 0] for fut in futures] == [0, 1, 2]
+    assert not service.batchable
+    # The batched run, then one run per request.
+    assert [shape[0] for shape, _ in sess.calls] == [3, 1, 1, 1]
+    service.submit(tensor(2)).result()
+    assert sess.calls[-1][0][0] == 2
+
+
+def test_requests_without_partner_run_concurrently_on_caller_threads():
+    sess = FakeSession(delay=.3)
+    service = InferenceService("det", sess, None, max_wait_ms=1000)
+    results, idents = {}, {}
+
+    def detect(width):
+        idents[width] = threading.get_ident()
+        results[width] = service.run(tensor(1, width=width))
+
+    threads = [threading.Thread(target=detect, args=(w,)) for w in (32, 48, 64)]
+    st = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Each shape ran right away on its own caller's thread, neither queued nor waiting for a partner.
+    assert time.monotonic() - st < .8
+    assert sorted([(shape[3], ident) for shape, ident in sess.calls]) == sorted([(w, idents[w]) for w in (32, 48, 64)])
+    assert all([results[w][0].shape == (1, 3, 8, w) for w in results])
+
+
+def test_requests_of_several_threads_are_batched():
+    sess = FakeSession()
+    service = InferenceService("rec", sess, None, max_wait_ms=500)
+    barrier = threading.Barrier(2)
+    results = {}
+
+    def recognize(i):
+        # Both threads submit this signature once, so the next requests expect a partner.
+        service.run(tensor(1, value=i))
+        barrier.wait()
+        results[i] = service.run(tensor(1, value=i))
+
+    threads = [threading.Thread(target=recognize, args=(i,)) for i in (1, 2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert [shape[0] for shape, _ in sess.calls][-1] == 2
+    assert results[1][0].shape == (1, 3, 8, 8) and np.all(results[1][0] == 2)
+    assert np.all(results[2][0] == 4)
+
+
+def test_exception_is_set_on_every_request_of_the_batch(monkeypatch):
+    sess = FakeSession()
+    service = InferenceService("rec", sess, None)
+    monkeypatch.setattr(service, "_run", lambda inputs: (_ for _ in ()).throw(RuntimeError("onnx failure")))
+    futures = [service.submit(tensor(1)) for _ in range(2)]
+
+    for fut in futures:
+        with pytest.raises(RuntimeError, match="onnx failure"):
+            fut.result()
@@ -0,0 +1,102 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+import threading
+import time
+
+from rag.flow.pipeline_log import PipelineLog, fold_logs
+
+
+class FakeRedis:
+    """The list commands of RedisDB over an in-memory server where each command is atomic."""
+
+    def __init__(self):
+        self.lists = {}
+        self.ttl = {}
+        self.lock = threading.Lock()
+
+    def rpush_obj(self, key, obj, max_len, exp=3600):
+        with self.lock:
+            self.lists.setdefault(key, []).append(json.dumps(obj))
+        time.sleep(0)
+        with self.lock:
+            self.lists[key] = self.lists[key][-max_len:]
+            self.ttl[key] = exp
+        return True
+
+    def lrange_obj(self, key, start=0, end=-1):
+        with self.lock:
+            items = self.lists.get(key, [])
+            items = items[start:] if end == -1 else items[start:end + 1]
+        return [json.loads(v) for v in items]
+
+    def delete(self, key):
+        with self.lock:
+            self.lists.pop(key, None)
+        return True
+
+
+def test_no_event_lost_under_concurrent_callbacks():
+    redis = FakeRedis()
+    log = PipelineLog(redis, "flow-task-log-events", n_components=4)
+    n_threads, n_events = 8, 250
+
+    def callbacks(t):
+        for i in range(n_events):
+            log.append(f"cpn_{t % 4}", i / n_events, f"{t}:{i}")
+
+    threads = [threading.Thread(target=callbacks, args=(t,)) for t in range(n_threads)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    traces = [t for o in log.fetch() for t in o["trace"]]
+    assert len(traces) == n_threads * n_events
+    assert set([t["message"] for t in traces]) == set([f"{t}:{i}" for t in range(n_threads) for i in range(n_events)])
+    for t in range(n_threads):
+        mine = [int(x["message"].split(":")[1]) for x in traces if x["message"].startswith(f"{t}:")]
+        assert mine == list(range(n_events))
+
+
+def test_fold_logs_groups_consecutive_events():
+    events = [
+        {"component_id": "File", "progress": 1, "message": "a", "datetime": "", "timestamp": 1.0},
+        {"component_id": "Parser", "progress": 0.5, "message": "b", "datetime": "", "timestamp": 2.0},
+        {"component_id": "Parser", "progress": 1, "message": "c", "datetime": "", "timestamp": 3.5},
+        {"component_id": "END", "progress": 1, "message": "d", "datetime": "", "timestamp": 4.0, "dsl": {}},
+    ]
+    logs = fold_logs(events)
+    assert [o["component_id"] for o in logs] == ["File", "Parser", "END"]
+    assert [t["elapsed_time"] for t in logs[1]["trace"]] == [0, 1.5]
+    assert logs[2]["trace"][0]["dsl"] == {}
+
+
+def test_progress_and_cap():
+    redis = FakeRedis()
+    log = PipelineLog(redis, "k", n_components=2, max_events=3)
+    assert log.append("File", 1, "") == (0.5, True)
+    assert log.append("Parser", 0.5, "") == (0.75, True)
+    assert log.append("Parser", 1, "") == (1.0, False)
+    assert log.append("Parser", -1, "failed") == (-1, False)
+    assert log.append("Parser", 1, "") == (-1, False)
+    assert [t["progress"] for o in log.fetch() for t in o["trace"]] == [1, -1, 1]
+    assert redis.ttl["k"] == 60 * 30
+
+    log.reset()
+    assert log.fetch() == []
+    assert log.append("File", 1, "") == (0.5, True)
@@ -0,0 +1,108 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from rag.llm.rerank_model import HuggingfaceRerank
+from rag.nlp.rerank_cache import RerankScoreCache
+
+
+class FakeRerankServer(ThreadingHTTPServer):
+    latency = 0.2
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRerankHandler)
+        self.requests = []
+
+
+class FakeRerankHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(req["texts"])
+        time.sleep(self.server.latency)
+        body = json.dumps([{"index": i, "score": len(t) / 100} for i, t in enumerate(req["texts"])]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FakeRerankServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_only_cache_misses_are_sent(server):
+    mdl = HuggingfaceRerank("", "bge-reranker", f"127.0.0.1:{server.server_address[1]}")
+    cache = RerankScoreCache()
+    texts = ["x" * i for i in range(1, 21)]
+    ids = [f"chunk{i}" for i in range(20)]
+
+    scores, _ = cache.similarity(mdl, "query", ids, texts)
+    assert scores.tolist() == [len(t) / 100 for t in texts]
+    assert len(server.requests) == 3
+
+    # The next page and a repeated question only send what wasn't scored yet.
+    scores, _ = cache.similarity(mdl, "query", ids[10:] + ["chunk20"], texts[10:] + ["new"])
+    assert scores.tolist() == [len(t) / 100 for t in texts[10:]] + [0.03]
+    assert server.requests[3:] == [["new"]]
+
+    # Another question, or an edited chunk, is scored again.
+    cache.similarity(mdl, "another query", ids[:1], texts[:1])
+    cache.similarity(mdl, "query", ids[:1], ["edited"])
+    assert server.requests[4:] == [["x"], ["edited"]]
+
+
+def test_batches_are_sent_concurrently(server):
+    mdl = HuggingfaceRerank("", "bge-reranker", f"127.0.0.1:{server.server_address[1]}")
+    texts = [f"text {i}" for i in range(32)]
+    start = time.perf_counter()
+    scores, _ = mdl.similarity("query", texts)
+    elapsed = time.perf_counter() - start
+    assert len(server.requests) == 4
+    assert scores.tolist() == [len(t) / 100 for t in texts]
+    assert elapsed < 4 * server.latency
+
+
+def test_cache_is_bounded():
+    class Model:
+        model_name = "m"
+        calls = 0
+
+        def similarity(self, query, texts):
+            self.calls += len(texts)
+            return [1.0] * len(texts), len(texts)
+
+    mdl, cache = Model(), RerankScoreCache(max_size=2)
+    cache.similarity(mdl, "q", ["a", "b", "c"], ["a", "b", "c"])
+    assert len(cache._scores) == 2
+    _, used_tokens = cache.similarity(mdl, "q", ["b", "c"], ["b", "c"])
+    assert used_tokens == 0 and mdl.calls == 3
@@ -0,0 +1,228 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import re
+from collections import Counter
+
+import pytest
+
+from rag.nlp import rag_tokenizer, tag_feature
+from rag.nlp.search import Dealer
+from rag.nlp.tag_feature import bump_tag_kb_version
+from rag.utils.doc_store_conn import DocStoreConnection, MatchTextExpr
+from rag.utils.redis_conn import REDIS_CONN
+
+TAG_CHUNKS = [
+    ("Cats and dogs are popular pets.", ["pets"], ["animal", "home"]),
+    ("My dog likes to play fetch in the park.", ["dog"], ["animal", "outdoor"]),
+    ("The stock market crash wiped out savings.", ["stock market"], ["finance"]),
+    ("Interest rates and stock prices move together.", [], ["finance", "economy"]),
+    ("Heavy rain flooded the park.", [], ["weather", "outdoor"]),
+    ("A chunk without tags about cats.", [], []),
+]
+
+
+def make_chunk(i, kb_id, content, important_kwd, tags):
+    content_ltks = rag_tokenizer.tokenize(content)
+    return {
+        "id": f"{kb_id}-{i}",
+        "kb_id": kb_id,
+        "title_tks": "",
+        "content_ltks": content_ltks,
+        "content_sm_ltks": rag_tokenizer.fine_grained_tokenize(content_ltks),
+        "important_kwd": important_kwd,
+        "important_tks": rag_tokenizer.tokenize(" ".join(important_kwd)),
+        "tag_kwd": tags,
+    }
+
+
+class FakeDocStore(DocStoreConnection):
+    """
+    Tag KB chunks in memory. Full-text matches are OR-ed over the terms of the match expression,
+    which is what the doc stores do with minimum_should_match 0.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.searches = []
+
+    def add(self, kb_id, content, important_kwd, tags):
+        self.chunks.append(make_chunk(len(self.chunks), kb_id, content, important_kwd, tags))
+
+    @staticmethod
+    def _match(expr: MatchTextExpr, ck):
+        # Phrases only match where all their words do, so the single terms decide.
+        txt = re.sub(r'"[^"]* [^"]*"(~[0-9]+)?', " ", expr.matching_text)
+        terms = set(re.sub(r'\^[0-9.]+|[()"]', " ", txt).split())
+        for fld in [f.split("^")[0] for f in expr.fields]:
+            v = ck.get(fld) or ""
+            if terms & set(v if isinstance(v, list) else v.split()):
+                return True
+        return False
+
+    def search(self, selectFields, highlightFields, condition, matchExprs, orderBy, offset, limit, indexNames, knowledgebaseIds,
+               aggFields=[], rank_feature=None):
+        self.searches.append(matchExprs)
+        hits = [ck for ck in self.chunks if ck["kb_id"] in knowledgebaseIds]
+        for expr in matchExprs:
+            hits = [ck for ck in hits if self._match(expr, ck)]
+        aggs = Counter()
+        for ck in hits:
+            aggs.update(ck["tag_kwd"])
+        return {"total": len(hits), "hits": hits[offset:offset + limit] if limit else [], "aggs": aggs.most_common()}
+
+    def getTotal(self, res):
+        return res["total"]
+
+    def getChunkIds(self, res):
+        return [ck["id"] for ck in res["hits"]]
+
+    def getFields(self, res, fields):
+        return {ck["id"]: {f: ck[f] for f in fields if f in ck} for ck in res["hits"]}
+
+    def getAggregation(self, res, fieldnm):
+        return res["aggs"]
+
+    def dbType(self):
+        return "fake"
+
+    def health(self):
+        return {}
+
+    def createIdx(self, indexName, knowledgebaseId, vectorSize):
+        raise NotImplementedError
+
+    def deleteIdx(self, indexName, knowledgebaseId):
+        raise NotImplementedError
+
+    def indexExist(self, indexName, knowledgebaseId):
+        return True
+
+    def get(self, chunkId, indexName, knowledgebaseIds):
+        raise NotImplementedError
+
+    def insert(self, rows, indexName, knowledgebaseId=None):
+        raise NotImplementedError
+
+    def update(self, condition, newValue, indexName, knowledgebaseId):
+        raise NotImplementedError
+
+    def delete(self, condition, indexName, knowledgebaseId):
+        raise NotImplementedError
+
+    def getHighlight(self, res, keywords, fieldnm):
+        raise NotImplementedError
+
+    def sql(sql, fetch_size, format):
+        raise NotImplementedError
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    kv = {}
+    monkeypatch.setattr(REDIS_CONN, "get", lambda k: kv.get(k))
+    monkeypatch.setattr(REDIS_CONN, "set", lambda k, v, exp=3600: kv.__setitem__(k, v) or True)
+    return kv
+
+
+@pytest.fixture
+def store():
+    store = FakeDocStore()
+    for content, important_kwd, tags in TAG_CHUNKS:
+        store.add("tag_kb", content, important_kwd, tags)
+    store.add("other_kb", "Cats are not tags of this KB.", [], ["ignored"])
+    return store
+
+
+def doc_store_tag_query(store, monkeypatch, question, all_tags, topn_tags=3):
+    dealer = Dealer(store)
+    monkeypatch.setattr(dealer.tag_index, "tag_query", lambda *args: None)
+    return dealer.tag_query(question, "t1", ["tag_kb"], all_tags, topn_tags)
+
+
+QUESTIONS = [
+    "How do cats and dogs play together?",
+    "Is my dog happy at the park?",
+    "stock market crash",
+    "What about interest rates?",
+    "Tell me about quantum physics",
+    "pets",
+]
+
+
+@pytest.mark.parametrize("topn_tags", [1, 3])
+def test_same_tags_as_the_doc_store(redis, store, monkeypatch, topn_tags):
+    dealer = Dealer(store)
+    all_tags = dealer.all_tags_in_portion("t1", ["tag_kb"])
+    expected = [doc_store_tag_query(store, monkeypatch, q, all_tags, topn_tags) for q in QUESTIONS]
+    store.searches.clear()
+
+    assert [dealer.tag_query(q, "t1", ["tag_kb"], all_tags, topn_tags) for q in QUESTIONS] == expected
+    assert any(expected) and {} in expected
+    # One scan to build the posting table, no full-text query.
+    assert store.searches == [[]]
+    # Cached answers are copies.
+    dealer.tag_query(QUESTIONS[0], "t1", ["tag_kb"], all_tags, topn_tags).clear()
+    assert dealer.tag_query(QUESTIONS[0], "t1", ["tag_kb"], all_tags, topn_tags) == expected[0]
+
+
+def test_bumped_tag_kb_is_rebuilt(redis, store, monkeypatch):
+    monkeypatch.setattr(tag_feature, "TAG_INDEX_CHECK_INTERVAL", 0)
+    dealer = Dealer(store)
+    all_tags = dealer.all_tags_in_portion("t1", ["tag_kb"])
+    store.searches.clear()
+    question = "Who won the football match?"
+    assert dealer.tag_query(question, "t1", ["tag_kb"], all_tags) == {}
+
+    store.add("tag_kb", "The football match ended in a draw.", ["football"], ["sport"])
+    # Not bumped: the posting table and its answers are kept.
+    assert dealer.tag_query(question, "t1", ["tag_kb"], all_tags) == {}
+    assert len(store.searches) == 1
+
+    bump_tag_kb_version("tag_kb")
+    tags = dealer.tag_query(question, "t1", ["tag_kb"], all_tags)
+    assert len(store.searches) == 2
+    assert list(tags) == ["sport"]
+    assert tags == doc_store_tag_query(store, monkeypatch, question, all_tags)
+
+
+def test_other_tag_kbs_are_not_rebuilt(redis, store, monkeypatch):
+    monkeypatch.setattr(tag_feature, "TAG_INDEX_CHECK_INTERVAL", 0)
+    dealer = Dealer(store)
+    all_tags = dealer.all_tags_in_portion("t1", ["tag_kb", "other_kb"])
+    store.searches.clear()
+    dealer.tag_query("cats", "t1", ["tag_kb"], all_tags)
+    dealer.tag_query("cats", "t1", ["other_kb"], all_tags)
+    assert len(store.searches) == 2
+
+    bump_tag_kb_version("other_kb")
+    dealer.tag_query("cats", "t1", ["tag_kb"], all_tags)
+    assert len(store.searches) == 2
+    assert dealer.tag_query("cats", "t1", ["other_kb"], all_tags) == {"ignored": 1}
+    assert len(store.searches) == 3
+
+
+def test_too_many_chunks_go_to_the_doc_store(redis, store, monkeypatch):
+    monkeypatch.setattr(tag_feature, "TAG_INDEX_MAX_CHUNKS", 3)
+    dealer = Dealer(store)
+    all_tags = dealer.all_tags_in_portion("t1", ["tag_kb"])
+    expected = doc_store_tag_query(store, monkeypatch, QUESTIONS[0], all_tags)
+    store.searches.clear()
+
+    assert dealer.tag_query(QUESTIONS[0], "t1", ["tag_kb"], all_tags) == expected
+    assert dealer.tag_query(QUESTIONS[0], "t1", ["tag_kb"], all_tags) == expected
+    # The size check once, then full-text queries.
+    assert [len(m) for m in store.searches] == [0, 1, 1]
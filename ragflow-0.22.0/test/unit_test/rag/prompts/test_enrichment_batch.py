@@ -0,0 +1,90 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+
+from common.constants import TAG_FLD
+from rag.prompts.generator import content_tagging_batch, keyword_extraction_batch, question_proposal_batch
+
+
+class FakeChatModel:
+    llm_name = "fake-chat"
+    max_length = 8192
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = []
+
+    def chat(self, system, history, gen_conf):
+        self.calls.append((system, history, gen_conf))
+        return self.answer
+
+
+CONTENTS = ["The cat sat on the mat.", "Stock markets fell on Monday.", "Rain is expected tomorrow."]
+
+
+def test_keywords_are_split_back_per_chunk():
+    chat_mdl = FakeChatModel('{"0": ["cat", " mat "], "1": "stock, market", "2": ["rain", ""]}')
+
+    assert keyword_extraction_batch(chat_mdl, CONTENTS, topn=2) == ["cat,mat", "stock, market", "rain"]
+    # One packed prompt carrying every chunk.
+    assert len(chat_mdl.calls) == 1
+    system, history, gen_conf = chat_mdl.calls[0]
+    assert all([f"## Text Content {i}\n{c}" in system for i, c in enumerate(CONTENTS)])
+    assert history == [{"role": "user", "content": "Output: "}]
+    assert gen_conf == {"temperature": 0.2}
+
+
+def test_questions_are_split_back_per_chunk():
+    chat_mdl = FakeChatModel(('{"0": ["Where did the cat sit?"], "1": ["What fell?", "When?"], "2": "Will it rain?"}', 12))
+
+    assert question_proposal_batch(chat_mdl, CONTENTS) == ["Where did the cat sit?", "What fell?\nWhen?", "Will it rain?"]
+
+
+@pytest.mark.parametrize("batch", [keyword_extraction_batch, question_proposal_batch])
+def test_missing_and_extra_indices(batch):
+    # "1" is missing, "3" and "x" are not chunks of the batch, "2" is neither a string nor a list.
+    chat_mdl = FakeChatModel('{"0": ["a"], "2": 5, "3": ["d"], "x": ["e"]}')
+
+    assert batch(chat_mdl, CONTENTS) == ["a", None, None]
+
+
+@pytest.mark.parametrize(
+    "answer, expected",
+    [
+        ('<think>\n{"0": ["no"]}\n</think>\n```json\n{"0": ["cat"], "1": ["stock"], "2": ["rain"]}\n```\n', ["cat", "stock", "rain"]),
+        # Truncated answers are repaired as far as they go.
+        ('{"0": ["cat"], "1": ["sto', ["cat", "sto", None]),
+        ("**ERROR**: rate limited", [None, None, None]),
+        ("I can't answer that.", [None, None, None]),
+        ('["cat", "stock", "rain"]', [None, None, None]),
+        ("", [None, None, None]),
+    ],
+)
+def test_malformed_answers(answer, expected):
+    assert keyword_extraction_batch(FakeChatModel(answer), CONTENTS) == expected
+
+
+def test_content_tags():
+    chat_mdl = FakeChatModel('{"0": {"animal": 8, "home": "3", "noise": 0}, "1": {"finance": 9.5, "odd": "many"}, "2": "weather"}')
+    examples = [{"content": "A dog barks.", TAG_FLD: {"animal": 9}}]
+
+    tags = content_tagging_batch(chat_mdl, CONTENTS, "animal, home, finance, weather", examples, topn=2)
+
+    # Non-positive and non-numeric counts are dropped; a chunk without an object gets None.
+    assert tags == [{"animal": 8, "home": 3}, {"finance": 9}, None]
+    assert chat_mdl.calls[0][2] == {"temperature": 0.5}
+    assert '"animal": 9' in chat_mdl.calls[0][0]
@@ -0,0 +1,120 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+
+import pytest
+import trio
+
+from common.constants import TAG_FLD
+from rag.svr import task_executor
+
+
+class FakeChatModel:
+    """Answers packed prompts with `batch_answer` and single-chunk prompts from `single_answers`, keyed by content."""
+
+    llm_name = "fake-chat"
+    max_length = 8192
+
+    def __init__(self, batch_answer, single_answers):
+        self.batch_answer = batch_answer
+        self.single_answers = single_answers
+        self.batch_calls = 0
+        self.single_calls = []
+
+    def chat(self, system, history, gen_conf):
+        if "## Text Content 0" in system:
+            self.batch_calls += 1
+            return self.batch_answer
+        content = next(c for c in self.single_answers if c in system)
+        self.single_calls.append(content)
+        return self.single_answers[content]
+
+
+@pytest.fixture
+def llm_cache(monkeypatch):
+    cache = {}
+
+    def get_llm_cache(llmnm, txt, history, genconf):
+        return cache.get((llmnm, txt, str(history), json.dumps(genconf, sort_keys=True)))
+
+    def set_llm_cache(llmnm, txt, v, history, genconf):
+        cache[(llmnm, txt, str(history), json.dumps(genconf, sort_keys=True))] = v
+
+    monkeypatch.setattr(task_executor, "get_llm_cache", get_llm_cache)
+    monkeypatch.setattr(task_executor, "set_llm_cache", set_llm_cache)
+    return cache
+
+
+def chunks(*contents):
+    return [{"content_with_weight": c} for c in contents]
+
+
+def test_chunks_missing_from_the_packed_answer_fall_back_to_single_prompts(llm_cache):
+    batch = chunks("alpha text", "beta text", "gamma text")
+    chat_mdl = FakeChatModel('{"0": ["alpha", "first"], "2": ["gamma"], "7": ["stray"]}', {"beta text": "beta,second"})
+
+    trio.run(task_executor.doc_keyword_extraction_batch, chat_mdl, batch, 3)
+
+    assert chat_mdl.batch_calls == 1
+    assert chat_mdl.single_calls == ["beta text"]
+    assert [d["important_kwd"] for d in batch] == [["alpha", "first"], ["beta", "second"], ["gamma"]]
+    assert all([d["important_tks"] for d in batch])
+    assert len(llm_cache) == 3
+
+
+def test_malformed_packed_answer_falls_back_for_every_chunk(llm_cache):
+    batch = chunks("alpha text", "beta text")
+    chat_mdl = FakeChatModel("**ERROR**: context too long", {"alpha text": "Why alpha?", "beta text": "Why beta?\nHow beta?"})
+
+    trio.run(task_executor.doc_question_proposal_batch, chat_mdl, batch, 2)
+
+    assert chat_mdl.batch_calls == 1
+    assert sorted(chat_mdl.single_calls) == ["alpha text", "beta text"]
+    assert [d["question_kwd"] for d in batch] == [["Why alpha?"], ["Why beta?", "How beta?"]]
+
+
+def test_cached_chunks_are_not_sent_again(llm_cache):
+    batch = chunks("alpha text", "beta text", "gamma text")
+    task_executor.set_llm_cache("fake-chat", "alpha text", "cached,alpha", "keywords", {"topn": 3})
+    chat_mdl = FakeChatModel('{"0": ["beta"], "1": ["gamma"]}', {})
+
+    trio.run(task_executor.doc_keyword_extraction_batch, chat_mdl, batch, 3)
+
+    assert (chat_mdl.batch_calls, chat_mdl.single_calls) == (1, [])
+    assert [d["important_kwd"] for d in batch] == [["cached", "alpha"], ["beta"], ["gamma"]]
+
+
+def test_a_single_uncached_chunk_skips_the_packed_prompt(llm_cache):
+    batch = chunks("alpha text", "beta text")
+    task_executor.set_llm_cache("fake-chat", "alpha text", "cached", "keywords", {"topn": 3})
+    chat_mdl = FakeChatModel("", {"beta text": "beta"})
+
+    trio.run(task_executor.doc_keyword_extraction_batch, chat_mdl, batch, 3)
+
+    assert (chat_mdl.batch_calls, chat_mdl.single_calls) == (0, ["beta text"])
+    assert [d["important_kwd"] for d in batch] == [["cached"], ["beta"]]
+
+
+def test_content_tagging_fallback(llm_cache):
+    batch = chunks("alpha text", "beta text")
+    examples = [{"content": "An example", TAG_FLD: {"greek": 2}}]
+    chat_mdl = FakeChatModel('{"0": {"greek": 5}, "1": "not tags"}', {"beta text": '{"second": 3}'})
+
+    trio.run(task_executor.doc_content_tagging_batch, chat_mdl, batch, 3, "greek, second", examples)
+
+    assert chat_mdl.single_calls == ["beta text"]
+    assert [d[TAG_FLD] for d in batch] == [{"greek": 5}, {"second": 3}]
@@ -0,0 +1,98 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import threading
+from functools import partial
+from io import BytesIO
+
+import pytest
+import trio
+from exceptiongroup import BaseExceptionGroup
+from PIL import Image
+
+from rag.utils.base64_image import encode_image, image2id, images2ids, test_image
+
+
+class CountingStorage:
+    def __init__(self, fail_on=()):
+        self.puts = {}
+        self.fail_on = set(fail_on)
+        self.lock = threading.Lock()
+
+    def put(self, bucket, fnm, binary, tenant_id=None):
+        if fnm in self.fail_on:
+            raise OSError("storage unavailable")
+        with self.lock:
+            assert (bucket, fnm) not in self.puts
+            self.puts[(bucket, fnm)] = (binary, tenant_id)
+
+
+def test_encode_image_converts_to_jpeg():
+    for mode in ("RGB", "RGBA", "P"):
+        binary = encode_image(Image.new(mode, (16, 8)))
+        with Image.open(BytesIO(binary)) as img:
+            assert (img.format, img.mode, img.size) == ("JPEG", "RGB", (16, 8))
+
+
+def test_images2ids_uploads_every_image_once():
+    storage = CountingStorage()
+    rgba = Image.new("RGBA", (20, 10), (255, 0, 0, 128))
+    docs = [
+        {"id": "c0", "image": Image.new("RGB", (10, 10))},
+        {"id": "c1", "image": test_image},
+        {"id": "c2"},
+        {"id": "c3", "image": None},
+        {"id": "c4", "image": rgba},
+    ]
+
+    trio.run(images2ids, docs, partial(storage.put, tenant_id="t1"), [d["id"] for d in docs], "kb1")
+
+    assert sorted(storage.puts) == [("kb1", "c0"), ("kb1", "c1"), ("kb1", "c4")]
+    assert all([tenant_id == "t1" for _, tenant_id in storage.puts.values()])
+    # Bytes pass through untouched, PIL images are encoded and closed.
+    assert storage.puts[("kb1", "c1")][0] is test_image
+    assert storage.puts[("kb1", "c4")][0] == encode_image(Image.new("RGBA", (20, 10), (255, 0, 0, 128)))
+    with pytest.raises(ValueError):
+        rgba.load()
+    assert [d.get("img_id") for d in docs] == ["kb1-c0", "kb1-c1", None, None, "kb1-c4"]
+    assert all(["image" not in d for d in docs])
+
+
+def test_images2ids_matches_image2id():
+    docs = [{"id": f"c{i}", "image": Image.new("RGB", (8, 8), (i, i, i))} for i in range(3)]
+    one_by_one = [{"id": d["id"], "image": d["image"].copy()} for d in docs]
+    batched, single = CountingStorage(), CountingStorage()
+
+    trio.run(images2ids, docs, batched.put, [d["id"] for d in docs])
+
+    async def upload_each():
+        for d in one_by_one:
+            await image2id(d, single.put, d["id"])
+
+    trio.run(upload_each)
+    assert batched.puts == single.puts
+    assert docs == one_by_one
+
+
+def test_failed_upload_is_raised():
+    storage = CountingStorage(fail_on=["c1"])
+    docs = [{"id": f"c{i}", "image": test_image} for i in range(3)]
+
+    # Raised as is, or in an exception group with strict trio nurseries.
+    with pytest.raises((OSError, BaseExceptionGroup)):
+        trio.run(images2ids, docs, storage.put, [d["id"] for d in docs], "kb1")
+
+    assert "img_id" not in docs[1] and docs[1]["image"] is test_image
@@ -0,0 +1,103 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+import threading
+
+from rag.utils.doc_store_bulk import index_actions, parallel_bulk
+
+
+class FakeTransport:
+    """Bulk endpoint answering from a script of per-document statuses, one entry per attempt."""
+
+    def __init__(self, statuses=None, raise_on_calls=()):
+        self.statuses = statuses or {}
+        self.raise_on_calls = set(raise_on_calls)
+        self.calls = []
+        self.sent = {}
+        self.lock = threading.Lock()
+
+    def bulk(self, operations):
+        with self.lock:
+            n = len(self.calls)
+            ids = [json.loads(ln)["index"]["_id"] for ln in operations[0::2]]
+            self.calls.append(ids)
+            for i in ids:
+                self.sent[i] = self.sent.get(i, 0) + 1
+        if n in self.raise_on_calls:
+            raise ConnectionError("connection reset")
+        items, errors = [], False
+        for i in ids:
+            script = self.statuses.get(i, [])
+            status = script[self.sent[i] - 1] if self.sent[i] <= len(script) else 201
+            if status >= 300:
+                errors = True
+                items.append({"index": {"_id": i, "status": status, "error": {"type": f"status_{status}"}}})
+            else:
+                items.append({"index": {"_id": i, "status": status}})
+        return {"errors": errors, "items": items}
+
+
+def make_docs(n, dim=8):
+    return [{"id": f"c{i}", "content_with_weight": f"chunk {i}", f"q_{dim}_vec": [0.1] * dim} for i in range(n)]
+
+
+def test_index_actions_are_shallow():
+    docs = make_docs(2)
+    actions = list(index_actions(docs, "idx", "kb"))
+    assert [a[0] for a in actions] == ["c0", "c1"]
+    assert actions[0][1] == {"index": {"_index": "idx", "_id": "c0"}}
+    assert "id" not in actions[0][2] and actions[0][2]["kb_id"] == "kb"
+    assert actions[0][2]["q_8_vec"] is docs[0]["q_8_vec"]
+    assert docs[0]["id"] == "c0" and "kb_id" not in docs[0]
+
+
+def test_all_documents_sent_once_in_byte_bounded_chunks():
+    fake = FakeTransport()
+    docs = make_docs(50)
+    res = parallel_bulk(fake.bulk, index_actions(docs, "idx", "kb"), chunk_bytes=1024, threads=4, backoff=0)
+    assert res == []
+    assert len(fake.calls) > 1
+    assert sorted(fake.sent) == sorted([d["id"] for d in docs])
+    assert all(n == 1 for n in fake.sent.values())
+
+
+def test_only_failed_items_are_retried():
+    fake = FakeTransport(statuses={"c1": [429], "c3": [503, 503], "c4": [400]})
+    res = parallel_bulk(fake.bulk, index_actions(make_docs(6), "idx"), threads=1, backoff=0)
+    assert fake.calls[0] == ["c0", "c1", "c2", "c3", "c4", "c5"]
+    assert fake.calls[1] == ["c1", "c3"]
+    assert fake.calls[2] == ["c3"]
+    assert len(fake.calls) == 3
+    # A rejected document (mapping error) is reported, not retried.
+    assert res == ["c4:{'type': 'status_400'}"]
+
+
+def test_failed_request_retries_its_chunk_only():
+    fake = FakeTransport(raise_on_calls={0})
+    docs = make_docs(20)
+    res = parallel_bulk(fake.bulk, index_actions(docs, "idx"), chunk_bytes=1024, threads=1, backoff=0)
+    assert res == []
+    first = fake.calls[0]
+    assert fake.calls[-1] == first
+    assert all(fake.sent[i] == (2 if i in first else 1) for i in fake.sent)
+
+
+def test_items_still_failing_are_reported():
+    fake = FakeTransport(statuses={"c2": [429, 429, 429]})
+    res = parallel_bulk(fake.bulk, index_actions(make_docs(4), "idx"), threads=2, attempts=3, backoff=0)
+    assert fake.sent["c2"] == 3
+    assert res == ["c2:{'type': 'status_429'}"]
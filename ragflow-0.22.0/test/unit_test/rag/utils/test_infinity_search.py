@@ -0,0 +1,257 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from infinity.errors import ErrorCode
+
+from common import settings
+from common.constants import PAGERANK_FLD
+from rag.utils import infinity_conn
+from rag.utils.doc_store_conn import MatchTextExpr, OrderByExpr
+from rag.utils.infinity_conn import InfinityConnection, merge_by_score, scatter_gather
+
+
+class SlowTable:
+    def __init__(self, latency, scores):
+        self.latency = latency
+        self.scores = scores
+
+    def search(self):
+        time.sleep(self.latency)
+        df = pd.DataFrame({"id": [f"{s}" for s in self.scores], "_score": self.scores})
+        return df.sort_values(by="_score", ascending=False), len(self.scores)
+
+
+def test_tables_are_searched_concurrently():
+    tables = {
+        "ragflow_kb1": SlowTable(0.3, [0.9, 0.2]),
+        "ragflow_kb2": SlowTable(0.3, [0.5]),
+        "ragflow_kb3": SlowTable(0.3, [0.7, 0.6, 0.1]),
+    }
+
+    def search_table(table_name):
+        return tables[table_name].search() if table_name in tables else None
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        start = time.perf_counter()
+        results = scatter_gather(list(tables) + ["ragflow_missing"], search_table, executor)
+        elapsed = time.perf_counter() - start
+    assert elapsed < 0.6
+    assert [hits for _, hits in results] == [2, 1, 3]
+
+
+def test_merge_by_score_matches_sorting_everything():
+    df_list = [
+        pd.DataFrame({"id": ["a", "b"], "_score": [0.9, 0.2]}),
+        pd.DataFrame({"id": [], "_score": []}),
+        pd.DataFrame({"id": ["c"], "_score": [0.5]}),
+        pd.DataFrame({"id": ["d", "e", "f"], "_score": [0.7, 0.6, 0.1]}),
+    ]
+    res = merge_by_score(df_list, 4)
+    expected = pd.concat(df_list).sort_values(by="_score", ascending=False).head(4)
+    assert res["id"].tolist() == expected["id"].tolist() == ["a", "d", "e", "c"]
+    assert res.index.tolist() == [0, 1, 2, 3]
+    assert merge_by_score(df_list, 100)["id"].tolist() == ["a", "d", "e", "c", "b", "f"]
+    assert merge_by_score(df_list[1:2], 10) is None
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def rows(self):
+        return self._rows
+
+
+class FakeQuery:
+    """The query builder of a table: every call records itself and returns the builder, like Infinity's."""
+
+    def __init__(self, table, output):
+        self.table = table
+        self.calls = [("output", output)]
+
+    def __getattr__(self, name):
+        def call(*args):
+            self.calls.append((name, *args))
+            return self
+        return call
+
+    def to_df(self):
+        self.table.queries.append(self.calls)
+        time.sleep(self.table.latency)
+        if self.table.error:
+            raise self.table.error
+        scores = self.table.scores
+        df = pd.DataFrame({"id": [f"{self.table.name}-{i}" for i in range(len(scores))], "SCORE": scores, PAGERANK_FLD: [0] * len(scores)})
+        return df, {"total_hits_count": str(len(scores))}
+
+
+class FakeTable:
+    def __init__(self, name, scores, latency=0.0, error=None):
+        self.name = name
+        self.scores = scores
+        self.latency = latency
+        self.error = error
+        self.queries = []
+        self.show_columns_calls = 0
+
+    def show_columns(self):
+        self.show_columns_calls += 1
+        return FakeResult([("id", "varchar", "", ""), ("doc_id", "varchar", "", ""), ("important_kwd", "varchar", "", "")])
+
+    def list_indexes(self):
+        return type("ListIndexes", (), {"index_names": []})
+
+    def output(self, output):
+        return FakeQuery(self, output)
+
+    def create_index(self, *args):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def get_table(self, table_name):
+        if table_name not in self.tables:
+            raise Exception(f"Table {table_name} doesn't exist")
+        return self.tables[table_name]
+
+    def create_table(self, table_name, schema, conflict_type):
+        return self.tables.setdefault(table_name, FakeTable(table_name, []))
+
+    def drop_table(self, table_name, conflict_type):
+        self.tables.pop(table_name, None)
+
+    def list_tables(self):
+        return type("ListTables", (), {"table_names": list(self.tables)})
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def get_database(self, db_name):
+        return self.db
+
+    def create_database(self, db_name, conflict_type):
+        return self.db
+
+    def show_current_node(self):
+        return type("Node", (), {"error_code": ErrorCode.OK, "server_status": "started"})
+
+
+class FakeConnectionPool:
+    """Hands out a connection per get_conn, tracking how many are out at once."""
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self.out = set()
+        self.max_out = 0
+        self.gets = 0
+
+    def get_conn(self):
+        conn = FakeConnection(self.db)
+        with self.lock:
+            self.gets += 1
+            self.out.add(conn)
+            self.max_out = max(self.max_out, len(self.out))
+        return conn
+
+    def release_conn(self, conn):
+        with self.lock:
+            self.out.remove(conn)
+
+
+@pytest.fixture
+def tables():
+    return {
+        "ragflow_t1_kb1": FakeTable("kb1", [0.9, 0.2], latency=0.3),
+        "ragflow_t1_kb2": FakeTable("kb2", [0.5], latency=0.3),
+        "ragflow_t1_kb3": FakeTable("kb3", [0.7, 0.6, 0.1], latency=0.3),
+    }
+
+
+@pytest.fixture
+def infinity(monkeypatch, tables):
+    pool = FakeConnectionPool(FakeDatabase(tables))
+    monkeypatch.setattr(settings, "INFINITY", {"uri": "localhost:23817", "db_name": "default_db"}, raising=False)
+    monkeypatch.setattr(infinity_conn, "ConnectionPool", lambda uri, max_size: FakeConnectionPool(FakeDatabase({})))
+    conn = InfinityConnection()
+    # The connection is a per-process singleton: give it this test's pool and an empty column cache.
+    monkeypatch.setattr(conn, "connPool", pool)
+    monkeypatch.setattr(conn, "_columns", {})
+    return conn
+
+
+def text_search(conn, kb_ids, condition=None, limit=4):
+    match = MatchTextExpr(["content_ltks"], "cat", 100, {"minimum_should_match": 0.3})
+    return conn.search(["id"], [], condition or {}, [match], OrderByExpr(), 0, limit, "ragflow_t1", kb_ids)
+
+
+def test_search_queries_tables_in_parallel_on_their_own_connections(infinity, tables):
+    start = time.perf_counter()
+    res, total = text_search(infinity, ["kb1", "kb2", "kb3", "missing"], {"doc_id": ["d1"], "must_not": {"exists": "important_kwd"}})
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.6
+    assert total == 6
+    assert res["id"].tolist() == ["kb1-0", "kb3-0", "kb3-1", "kb2-0"]
+    assert res["_score"].tolist() == [0.9, 0.7, 0.6, 0.5]
+    # One connection for the filter columns, then one per table, the missing one included, all released.
+    pool = infinity.connPool
+    assert pool.gets == 5 and pool.out == set()
+    assert pool.max_out == 4
+    for table in tables.values():
+        query = dict([(c[0], c[1:]) for c in table.queries[0]])
+        assert query["match_text"][1] == "cat"
+        assert query["match_text"][3]["filter"] == "doc_id IN ('d1') AND NOT ( important_kwd!='' )"
+        assert query["limit"] == (4,)
+
+
+def test_connection_is_released_when_a_table_fails(infinity, tables):
+    tables["ragflow_t1_kb2"].error = RuntimeError("query failed")
+
+    with pytest.raises(RuntimeError, match="query failed"):
+        text_search(infinity, ["kb1", "kb2", "kb3"])
+    assert infinity.connPool.out == set()
+
+
+def test_table_columns_are_cached_until_the_table_is_recreated(infinity, tables):
+    condition = {"must_not": {"exists": "important_kwd"}}
+    text_search(infinity, ["kb1"], condition)
+    text_search(infinity, ["kb1"], condition)
+    assert tables["ragflow_t1_kb1"].show_columns_calls == 1
+
+    infinity.createIdx("ragflow_t1", "kb1", 8)
+    text_search(infinity, ["kb1"], condition)
+    assert tables["ragflow_t1_kb1"].show_columns_calls == 2
+
+    # Dropped and created again: the columns of the new table are read.
+    infinity.deleteIdx("ragflow_t1", "kb1")
+    assert "ragflow_t1_kb1" not in infinity._columns
+    tables["ragflow_t1_kb1"] = FakeTable("kb1", [0.4])
+    res, total = text_search(infinity, ["kb1"], condition)
+    assert res["id"].tolist() == ["kb1-0"] and total == 1
+    assert tables["ragflow_t1_kb1"].show_columns_calls == 1
+    assert infinity.connPool.out == set()
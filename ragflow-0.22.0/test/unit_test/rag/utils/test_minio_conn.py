@@ -0,0 +1,116 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from collections import Counter
+
+import pytest
+from minio.error import S3Error
+
+from common import settings
+from rag.utils import minio_conn, storage_retry
+from rag.utils.minio_conn import RAGFlowMinio
+from rag.utils.storage_retry import KnownBuckets
+
+
+class FakeMinio:
+    """Client of a local object store with the Minio calls used by RAGFlowMinio, counting them."""
+    opened = 0
+    buckets = {}
+
+    def __init__(self, *args, **kwargs):
+        FakeMinio.opened += 1
+        self.calls = Counter()
+        self.failures = []
+
+    def _call(self, name):
+        self.calls[name] += 1
+        if self.failures:
+            raise self.failures.pop(0)
+
+    def bucket_exists(self, bucket):
+        self._call("bucket_exists")
+        return bucket in self.buckets
+
+    def make_bucket(self, bucket):
+        self._call("make_bucket")
+        self.buckets[bucket] = {}
+
+    def put_object(self, bucket, fnm, data, length):
+        self._call("put_object")
+        if bucket not in self.buckets:
+            raise S3Error("NoSuchBucket", "The specified bucket does not exist", bucket, "req", "host", None)
+        self.buckets[bucket][fnm] = data.read()
+        return fnm
+
+    def list_objects(self, bucket, recursive=False):
+        self._call("list_objects")
+        return [type("Object", (), {"object_name": fnm}) for fnm in self.buckets[bucket]]
+
+    def remove_object(self, bucket, fnm):
+        self._call("remove_object")
+        self.buckets[bucket].pop(fnm)
+
+    def remove_bucket(self, bucket):
+        self._call("remove_bucket")
+        self.buckets.pop(bucket)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(settings, "MINIO", {"host": "localhost:9000", "user": "u", "password": "p"}, raising=False)
+    monkeypatch.setattr(minio_conn, "Minio", FakeMinio)
+    monkeypatch.setattr(storage_retry.time, "sleep", lambda s: None)
+    monkeypatch.setattr(FakeMinio, "buckets", {})
+    conn = RAGFlowMinio()
+    monkeypatch.setattr(conn, "conn", FakeMinio())
+    monkeypatch.setattr(conn, "_buckets", KnownBuckets())
+    FakeMinio.opened = 0
+    return conn
+
+
+def test_bucket_is_checked_once_per_process(store):
+    for i in range(100):
+        assert store.put("kb", f"img_{i}", b"x")
+    assert store.conn.calls == Counter({"bucket_exists": 1, "make_bucket": 1, "put_object": 100})
+
+
+def test_deleted_bucket_is_created_again(store):
+    store.put("kb", "a", b"x")
+    store.conn.buckets.clear()
+    assert store.put("kb", "b", b"x") == "b"
+    assert store.conn.calls == Counter({"bucket_exists": 2, "make_bucket": 2, "put_object": 3})
+    assert FakeMinio.opened == 0
+
+
+def test_transient_errors_back_off_without_reopening_on_answers(store):
+    store.put("kb", "a", b"x")
+    fake = store.conn
+    fake.failures = [S3Error("SlowDown", "Reduce your request rate", "kb/b", "req", "host", None)]
+    assert store.put("kb", "b", b"x") == "b"
+    assert store.conn is fake and FakeMinio.opened == 0
+
+    fake.failures = [ConnectionResetError("reset")]
+    assert store.put("kb", "c", b"x") == "c"
+    assert FakeMinio.opened == 1
+    assert store.conn.calls == Counter({"put_object": 1})
+
+
+def test_remove_bucket_forgets_it(store):
+    store.put("kb", "a", b"x")
+    store.remove_bucket("kb")
+    assert "kb" not in store._buckets
+    store.put("kb", "b", b"x")
+    assert FakeMinio.buckets == {"kb": {"b": b"x"}}
@@ -0,0 +1,132 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from collections import Counter
+
+import pytest
+from valkey.exceptions import ResponseError
+
+from rag.utils.redis_conn import REDIS_CONN
+
+
+class FakeStreams:
+    """The stream commands used by the task queues, over in-memory streams, counting every command issued."""
+
+    def __init__(self):
+        self.streams = {}
+        self.groups = {}
+        self.commands = Counter()
+        self.blocks = []
+
+    def xadd(self, queue, payload):
+        self.commands["xadd"] += 1
+        entries = self.streams.setdefault(queue, [])
+        entries.append((f"{len(entries) + 1}-0", payload))
+
+    def xinfo_groups(self, queue):
+        self.commands["xinfo_groups"] += 1
+        return [{"name": g} for q, g in self.groups if q == queue]
+
+    def xgroup_create(self, queue, group, id="0", mkstream=False):
+        self.commands["xgroup_create"] += 1
+        if (queue, group) in self.groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        self.streams.setdefault(queue, [])
+        self.groups[(queue, group)] = 0
+
+    def xreadgroup(self, groupname, consumername, streams, count=None, block=None):
+        self.commands["xreadgroup"] += 1
+        self.blocks.append(block)
+        res = []
+        for queue in streams:
+            if (queue, groupname) not in self.groups:
+                raise ResponseError(f"NOGROUP No such key '{queue}' or consumer group '{groupname}'")
+            pos = self.groups[(queue, groupname)]
+            entries = self.streams[queue][pos:pos + count]
+            self.groups[(queue, groupname)] = pos + len(entries)
+            if entries:
+                res.append([queue, entries])
+        return res
+
+    def xack(self, queue, group, msg_id):
+        self.commands["xack"] += 1
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    fake = FakeStreams()
+    monkeypatch.setattr(REDIS_CONN, "REDIS", fake)
+    monkeypatch.setattr(REDIS_CONN, "_queue_groups", set())
+    return fake
+
+
+def produce(streams, queue, n):
+    for i in range(n):
+        assert REDIS_CONN.queue_product(queue, {"id": f"{queue}-{i}"})
+    streams.commands.clear()
+
+
+def test_group_is_created_once_per_process(streams):
+    produce(streams, "q0", 3)
+    msgs = [REDIS_CONN.queue_consumer("q0", "g", "c") for _ in range(4)]
+    assert [m.get_message()["id"] for m in msgs[:3]] == ["q0-0", "q0-1", "q0-2"]
+    assert msgs[3] is None
+    assert streams.commands == Counter({"xgroup_create": 1, "xreadgroup": 4})
+
+
+def test_batch_read_takes_many_tasks_in_one_round_trip(streams):
+    produce(streams, "q0", 10)
+    produce(streams, "q1", 2)
+    msgs = REDIS_CONN.queue_consumer_batch(["q0", "q1"], "g", "c", count=5, block=2000)
+    assert [m.get_message()["id"] for m in msgs] == ["q0-0", "q0-1", "q0-2", "q0-3", "q0-4", "q1-0", "q1-1"]
+    assert streams.commands == Counter({"xgroup_create": 2, "xreadgroup": 1})
+    assert streams.blocks == [2000]
+
+    msgs = REDIS_CONN.queue_consumer_batch(["q0", "q1"], "g", "c", count=5, block=2000)
+    assert len(msgs) == 5
+    assert streams.commands == Counter({"xgroup_create": 2, "xreadgroup": 2})
+
+
+def test_group_is_recreated_on_nogroup(streams):
+    produce(streams, "q0", 1)
+    assert REDIS_CONN.queue_consumer("q0", "g", "c").get_message()["id"] == "q0-0"
+    # The stream was deleted and produced to again.
+    streams.streams.pop("q0")
+    streams.groups.pop(("q0", "g"))
+    produce(streams, "q0", 1)
+
+    assert REDIS_CONN.queue_consumer("q0", "g", "c").get_message()["id"] == "q0-0"
+    assert streams.commands == Counter({"xreadgroup": 2, "xgroup_create": 1})
+
+
+def test_priority_queue_is_read_first_and_batch_is_capped(streams):
+    produce(streams, "q1", 2)
+    produce(streams, "q0", 10)
+    msgs = REDIS_CONN.queue_consumer_by_priority(["q1", "q0"], "g", "c", count=5, block=2000)
+    assert [m.get_message()["id"] for m in msgs] == ["q1-0", "q1-1", "q0-0", "q0-1", "q0-2"]
+    # Nothing waited for while tasks were there.
+    assert streams.blocks == [None, None]
+
+    # A priority task arriving later is served before the normal ones still queued.
+    produce(streams, "q1", 1)
+    msgs = REDIS_CONN.queue_consumer_by_priority(["q1", "q0"], "g", "c", count=2, block=2000)
+    assert [m.get_message()["id"] for m in msgs] == ["q1-0", "q0-3"]
+
+
+def test_priority_read_waits_for_the_first_task_when_idle(streams):
+    produce(streams, "q0", 0)
+    assert REDIS_CONN.queue_consumer_by_priority(["q1", "q0"], "g", "c", count=5, block=2000) == []
+    assert streams.blocks == [None, None, 2000]
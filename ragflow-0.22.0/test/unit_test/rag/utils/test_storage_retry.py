@@ -0,0 +1,55 @@
+#
+#  Copyright 2025 The InfiniFlow Authors. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from rag.utils import storage_retry
+from rag.utils.storage_retry import KnownBuckets, backoff_delay, retry
+
+
+def test_backoff_is_exponential_and_bounded():
+    for attempt in range(10):
+        full = min(2.0, 0.2 * 2 ** attempt)
+        assert full / 2 <= backoff_delay(attempt, 0.2, 2.0) <= full
+    assert backoff_delay(30, 0.2, 2.0) <= 2.0
+
+
+def test_retry_backs_off_between_attempts_only(monkeypatch):
+    sleeps, errors = [], []
+    monkeypatch.setattr(storage_retry.time, "sleep", sleeps.append)
+    calls = iter([ConnectionError("reset"), ConnectionError("reset"), "ok"])
+
+    def fn():
+        r = next(calls)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+    assert retry(fn, 3, errors.append, "put b/f") == "ok"
+    assert len(errors) == 2 and len(sleeps) == 2
+    assert sleeps[0] <= 0.2 < sleeps[1] * 2
+
+    sleeps.clear()
+    assert retry(lambda: 1 / 0, 3, lambda e: None, "get b/f") is None
+    assert len(sleeps) == 2
+
+
+def test_known_buckets():
+    buckets = KnownBuckets()
+    assert "b" not in buckets
+    buckets.add("b")
+    assert "b" in buckets
+    buckets.discard("b")
+    buckets.discard("b")
+    assert "b" not in buckets